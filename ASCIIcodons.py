@@ -1,195 +1,244 @@
-#!/usr/bin/env python
-
-"""
-DNA representation of 256-ASCII Character Encoding
-
-Created 15 July 2013
-Updated 2 August 2013
-
-Copyright 2013 Michael Ting
-https://github.com/michaelting
-Released under the BSD 2-clause license. See LICENSE.
-http://opensource.org/licenses/BSD-2-Clause
-
-DNA is represented alphabetically as base 4:
-    A - 0
-    C - 1
-    G - 2
-    T - 3
-    
-4-base codons will be used to represent the 256 Extended ASCII encodings
-"""
-
-import itertools, os
-
-"""======================================================================="""
-"""Language Translation Table Setup"""
-
-# TEMPORARY FIX, SHOULD FOCUS ON UNIFORM MAPPING OF CHARACTERS
-"""
-basevals = {'A':0,
-            'C':1,
-            'G':2,
-            'T':3}
-"""            
-# Arbitrary mapping to reduce GC content of DNA oligos
-basevals = {'T':0,
-            'A':1,
-            'G':2,
-            'C':3}
-bases = ['A','C','G','T']
-# retrieve all length 4 dna base strings
-codons = []
-CODONSIZE = 4
-for lst in list(itertools.product(bases, repeat=CODONSIZE)):
-    final = ''
-    # using itertools.product, seqlst looks like 
-    # [['A','A','A','A',],['A','A','A','T'],['A','A','A','G'],...] 
-    # convert each sublist into a string like
-    # ['AAAA','AAAT','AAAG',...]
-    for base in lst:
-        final += base
-    codons.append(final)
-
-"""
-ASCII code to ASCII character
-"""
-# ASCII code to ASCII character
-codes = range(0,256)
-# map ASCII numerical code to ASCII character
-# Ex. {65:'A'}
-ind2chr = dict((c, chr(c)) for c in codes)
-"""
-ASCII character to ASCII code
-"""
-chr2ind = dict((v,k) for k,v in ind2chr.items())
-
-# DNA to ASCII code in base 4
-# ex. {'AAAC':1}
-
-"""
-DNA to ASCII code
-DNA (Base 4)
-"""
-# map dna 4-base string to decimal values
-dna2ind = dict((cstr,64*basevals[cstr[0]]+16*basevals[cstr[1]]+4*basevals[cstr[2]]+1*basevals[cstr[3]]) for cstr in codons)
-
-"""
-ASCII code to DNA
-"""
-ind2dna = dict((v,k) for k,v in dna2ind.items())
-
-"""
-DNA to ASCII character table
-"""
-dna2chr = {}
-# map 4-base dna strings to ASCII character
-# Ex. {'CAAC':'A','ATTC':'='}
-for c in codons:
-    index = dna2ind[c]
-    char = ind2chr[index]
-    dna2chr[c] = char
-
-"""
-ASCII character to DNA
-"""
-chr2dna = dict((v,k) for k,v in dna2chr.items())
-
-"""========================================================================="""
-
-class TextToDNA:
-
-    def __init__(self):
-        """
-        Initialize TextToDNA object
-        """
-        print "Initialized TextToDNA object."
-
-    def translate(self, infile, outfile):
-        """
-        Translates input text file to output DNA file
-        """
-        template = open(infile)
-        newfile = open(outfile, "w")
-        
-        print "Translating ASCII text to DNA..."    
-        
-        for line in self.translate_file_dna(template):
-            newfile.write(line+"\n")
-            newfile.flush()
-            os.fsync(newfile.fileno())
-            print line
-            
-        template.close()
-        newfile.close()
-        
-        print "File translation complete."
-        print "See " + outfile + " for results."
-
-    def text_to_dna(self, txtstr):
-        """
-        Converts a string of ASCII characters to DNA
-        """
-        translated = ''
-        for symbol in txtstr:
-            translated += chr2dna[symbol]
-        return translated
-    
-    def translate_file_dna(self, infile):
-        """
-        Generator to yield translated lines from input file
-        """
-        for line in infile:
-            yield self.text_to_dna(line.strip())
-
-class DNAToText:
-
-    def __init__(self):
-        """
-        Initialize DNAToText object
-        """
-        print "Initialized DNAToText object."
-        
-    def translate(self, infile, outfile):
-        """
-        Translates input DNA file to output text file
-        """
-        template = open(infile)
-        newfile = open(outfile, "w")
-        
-        print "Translating DNA to ASCII text..."    
-        
-        for line in self.translate_file_chr(template):
-            newfile.write(line+"\n")
-            newfile.flush()
-            os.fsync(newfile.fileno())
-            print line
-            
-        template.close()
-        newfile.close()
-        
-        print "File translation complete."
-        print "See " + outfile + " for results."
-
-    def chunkify(self, dna, n):
-        """
-        Split DNA into n-base codons
-        """
-        for i in xrange(0, len(dna), n):
-            yield dna[i:i+n]
-    
-    def dna_to_text(self, dnastr):
-        """
-        Translates a single string of DNA codons into ASCII text
-        """
-        translated = ''
-        for codon in self.chunkify(dnastr, CODONSIZE):
-            translated += dna2chr[codon]
-        return translated
-    
-    def translate_file_chr(self, infile):
-        """
-        Generator to yield lines of a DNA file translated into ASCII text
-        """
-        for line in infile:
-            yield self.dna_to_text(line.strip())
\ No newline at end of file
+#!/usr/bin/env python
+
+"""
+DNA representation of 256-ASCII Character Encoding
+
+Created 15 July 2013
+Updated 2 August 2013
+
+Copyright 2013 Michael Ting
+https://github.com/michaelting
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+DNA is represented alphabetically as base 4:
+    A - 0
+    C - 1
+    G - 2
+    T - 3
+    
+4-base codons will be used to represent the 256 Extended ASCII encodings
+"""
+
+import itertools, os
+from profiling import profiled
+
+"""======================================================================="""
+"""Language Translation Table Setup"""
+
+# The tables are empty until load_tables() fills them on first use, by
+# the translators or by frame_detect.py. They are filled in place, so
+# names imported from this module stay valid.
+
+# TEMPORARY FIX, SHOULD FOCUS ON UNIFORM MAPPING OF CHARACTERS
+"""
+basevals = {'A':0,
+            'C':1,
+            'G':2,
+            'T':3}
+"""            
+# Arbitrary mapping to reduce GC content of DNA oligos
+basevals = {'T':0,
+            'A':1,
+            'G':2,
+            'C':3}
+bases = ['A','C','G','T']
+CODONSIZE = 4
+codes = range(0,256)
+
+codons = []
+ind2chr = {}
+chr2ind = {}
+dna2ind = {}
+ind2dna = {}
+dna2chr = {}
+chr2dna = {}
+
+def load_tables():
+    """
+    Builds the translation tables the first time they are needed
+    """
+    if dna2chr:
+        return
+
+    # retrieve all length 4 dna base strings
+    # itertools.product gives tuples like ('A','A','A','A'),('A','A','A','C'),...
+    # which are joined into strings like ['AAAA','AAAC','AAAG',...]
+    codons.extend(''.join(lst) for lst in itertools.product(bases, repeat=CODONSIZE))
+
+    """
+    ASCII code to ASCII character
+    """
+    # map ASCII numerical code to ASCII character
+    # Ex. {65:'A'}
+    ind2chr.update((c, chr(c)) for c in codes)
+    """
+    ASCII character to ASCII code
+    """
+    chr2ind.update((v,k) for k,v in ind2chr.items())
+
+    """
+    DNA to ASCII code
+    DNA (Base 4)
+    """
+    # map dna 4-base string to decimal values
+    # ex. {'AAAC':1}
+    dna2ind.update((cstr,64*basevals[cstr[0]]+16*basevals[cstr[1]]+4*basevals[cstr[2]]+1*basevals[cstr[3]]) for cstr in codons)
+
+    """
+    ASCII code to DNA
+    """
+    ind2dna.update((v,k) for k,v in dna2ind.items())
+
+    """
+    ASCII character to DNA
+    """
+    chr2dna.update((ind2chr[v],k) for k,v in dna2ind.items())
+
+    """
+    DNA to ASCII character table
+    """
+    # map 4-base dna strings to ASCII character, filled last since it
+    # marks the tables as loaded
+    # Ex. {'CAAC':'A','ATTC':'='}
+    dna2chr.update((c, ind2chr[dna2ind[c]]) for c in codons)
+
+"""========================================================================="""
+
+class TextToDNA:
+
+    def __init__(self):
+        """
+        Initialize TextToDNA object
+        """
+        load_tables()
+
+    @profiled("TextToDNA.translate")
+    def translate(self, infile, outfile, packed=False, compressor=None):
+        """
+        Translates input text file to output DNA file
+        With packed set, the DNA is written as a 2-bit packed file with one
+        record per line (see packeddna.py)
+        With a compression.Compressor, each line is compressed before it is
+        translated
+        """
+        from packeddna import PackedDNAWriter
+        template = open(infile)
+        if packed:
+            newfile = PackedDNAWriter(outfile)
+        else:
+            newfile = open(outfile, "w")
+        
+        print "Translating ASCII text to DNA..."    
+        
+        for num, line in enumerate(self.translate_file_dna(template, compressor)):
+            if packed:
+                newfile.add(num, line)
+            else:
+                newfile.write(line+"\n")
+                newfile.flush()
+                os.fsync(newfile.fileno())
+            print line
+            
+        template.close()
+        newfile.close()
+        
+        print "File translation complete."
+        print "See " + outfile + " for results."
+
+    def translate_stream(self, infile, outfile, blocksize=None):
+        """
+        Translates any file, binary or text, to a DNA file of length-framed
+        blocks that decodes back to identical bytes (see bytestream.py).
+        Returns the number of bytes translated.
+        """
+        import bytestream
+        return bytestream.encode_stream(infile, outfile, self.text_to_dna,
+                                        blocksize or bytestream.BLOCKSIZE)
+
+    def text_to_dna(self, txtstr):
+        """
+        Converts a string of ASCII characters to DNA
+        """
+        translated = ''
+        for symbol in txtstr:
+            translated += chr2dna[symbol]
+        return translated
+    
+    def translate_file_dna(self, infile, compressor=None):
+        """
+        Generator to yield translated lines from input file, compressed
+        first if a compressor is given
+        """
+        for line in infile:
+            text = line.strip()
+            if compressor:
+                text = compressor.compress(text)
+            yield self.text_to_dna(text)
+
+class DNAToText:
+
+    def __init__(self):
+        """
+        Initialize DNAToText object
+        """
+        load_tables()
+        
+    @profiled("DNAToText.translate")
+    def translate(self, infile, outfile, dictionary=None):
+        """
+        Translates input DNA file to output text file
+        The input may be plain DNA or a 2-bit packed file (see packeddna.py)
+        Lines compressed by the encoder are decompressed, with the preset
+        dictionary if they were compressed with one (see compression.py)
+        """
+        from packeddna import read_sequences
+        template = read_sequences(infile)
+        newfile = open(outfile, "w")
+        
+        print "Translating DNA to ASCII text..."    
+        
+        for line in self.translate_file_chr(template, dictionary):
+            newfile.write(line+"\n")
+            newfile.flush()
+            os.fsync(newfile.fileno())
+            print line
+            
+        template.close()
+        newfile.close()
+        
+        print "File translation complete."
+        print "See " + outfile + " for results."
+
+    def translate_stream(self, infile, outfile):
+        """
+        Translates a DNA file written by TextToDNA.translate_stream back to
+        the original bytes. Returns the number of bytes translated.
+        """
+        import bytestream
+        return bytestream.decode_stream(infile, outfile, self.dna_to_text, CODONSIZE)
+
+    def chunkify(self, dna, n):
+        """
+        Split DNA into n-base codons
+        """
+        for i in xrange(0, len(dna), n):
+            yield dna[i:i+n]
+    
+    def dna_to_text(self, dnastr):
+        """
+        Translates a single string of DNA codons into ASCII text
+        """
+        translated = ''
+        for codon in self.chunkify(dnastr, CODONSIZE):
+            translated += dna2chr[codon]
+        return translated
+    
+    def translate_file_chr(self, infile, dictionary=None):
+        """
+        Generator to yield lines of a DNA file translated into ASCII text,
+        decompressed if they were compressed
+        """
+        from compression import decode_text
+        for line in infile:
+            yield decode_text(self.dna_to_text(line.strip()), dictionary)
\ No newline at end of file
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+
+"""
+Throughput benchmarks for the encoding and decoding hot paths
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Each benchmark builds synthetic input from a fixed seed, so runs are
+reproducible, and reports the best rate over several repeats in
+bases/sec, chars/sec or reads/sec for each input size.
+
+Steps to replicate:
+$ python benchmark.py --out baseline.json
+$ python benchmark.py --out current.json --compare baseline.json
+
+With --compare, any benchmark whose rate dropped by more than the
+tolerance (default 20%) against the baseline is reported as a regression
+and the exit status is 1.
+"""
+
+import os, sys, json, random, shutil, tempfile
+from timeit import default_timer
+from argparse import ArgumentParser
+
+import ASCIIcodons, binaryDNA, parse_fastq
+import arraychunker, binarraychunker
+import get_unique_oligos
+from simulate_reads import ReadSimulator, write_fastq
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+def random_text(rng, size):
+    """
+    Returns size characters of printable ASCII text
+    """
+    return ''.join(chr(rng.randint(32, 126)) for i in xrange(size))
+
+def random_dna(rng, size):
+    """
+    Returns size random DNA bases
+    """
+    return ''.join(rng.choice('ACGT') for i in xrange(size))
+
+def make_orders(rng, persons, bases):
+    """
+    Returns codon chunker output for persons random sequences of bases
+    """
+    fasta = ''.join('>p%d\n%s\n' % (i, random_dna(rng, bases)) for i in xrange(persons))
+    return arraychunker.process_file(fasta.splitlines(True), 76, 76, 'TGAC')
+
+def make_reads(rng, size, workdir):
+    """
+    Returns (orders, reads, path to FASTQ of reads) for size simulated reads
+    of a small library sequenced at high depth
+    """
+    orders = make_orders(rng, 4, 2000)
+    sim = ReadSimulator(orders, revfrac=0.0, remnant=0.0, sigma=0.1,
+                        seed=rng.randint(0, 1 << 30))
+    reads = list(sim.reads(size))
+    path = os.path.join(workdir, "reads_%d.fastq" % size)
+    write_fastq(iter(reads), path)
+    return orders, reads, path
+
+#=========================================================================#
+# Benchmarks                                                              #
+# Each setup function returns a callable that runs the benchmark once and #
+# returns the number of units processed.                                  #
+#=========================================================================#
+
+def setup_codon_encode(rng, size, workdir):
+    text = random_text(rng, size)
+    t2d = ASCIIcodons.TextToDNA()
+    def run():
+        t2d.text_to_dna(text)
+        return size
+    return run
+
+def setup_codon_decode(rng, size, workdir):
+    dna = ASCIIcodons.TextToDNA().text_to_dna(random_text(rng, size // 4))
+    d2t = ASCIIcodons.DNAToText()
+    def run():
+        d2t.dna_to_text(dna)
+        return len(dna)
+    return run
+
+def setup_binary_encode(rng, size, workdir):
+    text = random_text(rng, size)
+    bt2d = binaryDNA.BinaryTextToDNA()
+    def run():
+        bt2d.text_to_dna(text)
+        return size
+    return run
+
+def setup_binary_decode(rng, size, workdir):
+    dna = binaryDNA.BinaryTextToDNA().text_to_dna(random_text(rng, size // 8))
+    d2bt = binaryDNA.DNAToBinaryText()
+    def run():
+        d2bt.dna_to_text(dna)
+        return len(dna)
+    return run
+
+def setup_readfastq(rng, size, workdir):
+    path = make_reads(rng, size, workdir)[2]
+    def run():
+        with open(path) as fqfile:
+            return sum(1 for rec in parse_fastq.readFastq(fqfile))
+    return run
+
+def setup_parsefastq(rng, size, workdir):
+    path = make_reads(rng, size, workdir)[2]
+    def run():
+        return sum(1 for rec in parse_fastq.ParseFASTQ(path))
+    return run
+
+def setup_sort_oligos(rng, size, workdir):
+    reads = make_reads(rng, size, workdir)[1]
+    tfunc = ASCIIcodons.DNAToText().dna_to_text
+    def run():
+        get_unique_oligos.sort_oligos(iter(reads), tfunc, strand=True)
+        return len(reads)
+    return run
+
+def setup_get_consensus(rng, size, workdir):
+    reads = make_reads(rng, size, workdir)[1]
+    tfunc = ASCIIcodons.DNAToText().dna_to_text
+    def run():
+        # get_consensus replaces the counters in place, so sort each time
+        # and only time the consensus
+        ramdict = get_unique_oligos.sort_oligos(iter(reads), tfunc)
+        start = default_timer()
+        get_unique_oligos.get_consensus(ramdict)
+        return len(reads), default_timer() - start
+    return run
+
+def setup_condense(rng, size, workdir):
+    tfunc = ASCIIcodons.DNAToText().dna_to_text
+    persons = max(1, size // 1000)
+    ramdict = {}
+    for p in xrange(persons):
+        ramdict['%02d' % (p % 100)] = dict(('%03d' % o, random_dna(rng, 76))
+                                           for o in xrange(1000 // 76 + 1))
+    outdir = os.path.join(workdir, "condense_%d" % size)
+    bases = sum(len(s) for oligos in ramdict.values() for s in oligos.values())
+    def run():
+        get_unique_oligos.condense(ramdict, tfunc, outdir)
+        return bases
+    return run
+
+def setup_codon_chunker(rng, size, workdir):
+    fasta = '>p0\n%s\n' % random_dna(rng, size)
+    lines = fasta.splitlines(True)
+    def run():
+        arraychunker.process_file(lines, 76, 76, 'TGAC')
+        return size
+    return run
+
+def setup_binary_chunker(rng, size, workdir):
+    fasta = '>p0\n%s\n' % random_dna(rng, size)
+    lines = fasta.splitlines(True)
+    def run():
+        binarraychunker.process_file(lines, 48, 48, 'ACGACTGT')
+        return size
+    return run
+
+benchmarks = [('TextToDNA.text_to_dna',            'chars/sec', setup_codon_encode),
+              ('DNAToText.dna_to_text',            'bases/sec', setup_codon_decode),
+              ('BinaryTextToDNA.text_to_dna',      'chars/sec', setup_binary_encode),
+              ('DNAToBinaryText.dna_to_text',      'bases/sec', setup_binary_decode),
+              ('parse_fastq.readFastq',            'reads/sec', setup_readfastq),
+              ('parse_fastq.ParseFASTQ',           'reads/sec', setup_parsefastq),
+              ('get_unique_oligos.sort_oligos',    'reads/sec', setup_sort_oligos),
+              ('get_unique_oligos.get_consensus',  'reads/sec', setup_get_consensus),
+              ('get_unique_oligos.condense',       'bases/sec', setup_condense),
+              ('arraychunker.process_file',        'bases/sec', setup_codon_chunker),
+              ('binarraychunker.process_file',     'bases/sec', setup_binary_chunker)]
+
+def run_benchmark(setup, size, repeat, seed, workdir):
+    """
+    Runs one benchmark repeat times and returns the best rate
+    """
+    rng = random.Random("%d-%d" % (seed, size))
+    run = setup(rng, size, workdir)
+    best = None
+    for i in xrange(repeat):
+        start = default_timer()
+        result = run()
+        elapsed = default_timer() - start
+        # benchmarks timing only part of their run return (units, seconds)
+        if isinstance(result, tuple):
+            result, elapsed = result
+        rate = result / max(elapsed, 1e-9)
+        if best is None or rate > best['rate']:
+            best = {'units': result, 'seconds': elapsed, 'rate': rate}
+    return best
+
+def run_all(sizes, repeat=3, seed=0, names=None):
+    """
+    Runs the benchmarks for each input size. Returns a dictionary of
+    {benchmark name: {'unit': unit, 'results': {size: result}}}
+    """
+    workdir = tempfile.mkdtemp(prefix="asciidna_bench_")
+    report = {}
+    try:
+        for name, unit, setup in benchmarks:
+            if names and not any(n in name for n in names):
+                continue
+            report[name] = {'unit': unit, 'results': {}}
+            for size in sizes:
+                result = run_benchmark(setup, size, repeat, seed, workdir)
+                report[name]['results'][str(size)] = result
+                print >> sys.stderr, "%-34s %8d %14.1f %s" % (name, size, result['rate'], unit)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+def compare(report, baseline, tolerance):
+    """
+    Returns a list of (name, size, baseline rate, rate) for benchmarks
+    whose rate dropped by more than tolerance against the baseline
+    """
+    regressions = []
+    for name in sorted(report):
+        if name not in baseline:
+            continue
+        for size, result in sorted(report[name]['results'].items()):
+            base = baseline[name]['results'].get(size)
+            if base is None:
+                continue
+            if result['rate'] < base['rate'] * (1.0 - tolerance):
+                regressions.append((name, size, base['rate'], result['rate']))
+    return regressions
+
+def main():
+
+    parser = ArgumentParser()
+
+    parser.add_argument("--sizes",type=int,nargs="+",default=DEFAULT_SIZES,help="input sizes to benchmark")
+    parser.add_argument("--repeat",type=int,default=3,help="repeats per benchmark, best rate is kept")
+    parser.add_argument("--seed",type=int,default=0,help="seed for synthetic input")
+    parser.add_argument("--only",nargs="+",metavar="name",help="only run benchmarks whose name contains one of these")
+    parser.add_argument("--out",help="write results to this JSON file")
+    parser.add_argument("--compare",metavar="baseline",help="baseline JSON file to compare against")
+    parser.add_argument("--tolerance",type=float,default=0.2,help="allowed fractional drop in rate")
+
+    args = parser.parse_args()
+
+    report = run_all(args.sizes, args.repeat, args.seed, args.only)
+
+    if args.out:
+        with open(args.out, "w") as out:
+            json.dump(report, out, indent=2, sort_keys=True)
+        print "Results written to %s" % args.out
+
+    if args.compare:
+        with open(args.compare) as infile:
+            baseline = json.load(infile)
+        regressions = compare(report, baseline, args.tolerance)
+        for name, size, baserate, rate in regressions:
+            print "REGRESSION %s at size %s: %.1f -> %.1f (%.0f%%)" % (
+                name, size, baserate, rate, 100.0 * (rate - baserate) / baserate)
+        if regressions:
+            sys.exit(1)
+        print "No regressions against %s" % args.compare
+
+if __name__ == "__main__":
+    main()
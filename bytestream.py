@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+"""
+Block-based encoding of arbitrary byte streams to DNA and back
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+The line-based translate() methods strip each line, which loses newlines
+and leading or trailing whitespace, so only text round trips. The stream
+mode reads the input in fixed-size blocks and writes one frame per line:
+
+    encode(4-byte big-endian block length) + encode(block)
+
+followed by a frame with length 0 that marks the end of the stream. The
+decoder checks each block against its recorded length and that the end
+frame is present, so the output is byte-identical to the input or an
+IOError is raised. Only one block is held in memory at a time.
+
+>>> from ASCIIcodons import TextToDNA, DNAToText
+>>> TextToDNA().translate_stream("photo.jpg", "photo_dna.txt")
+>>> DNAToText().translate_stream("photo_dna.txt", "photo_copy.jpg")
+
+Steps to replicate:
+$ python bytestream.py encode photo.jpg photo_dna.txt --scheme binary
+$ python bytestream.py decode photo_dna.txt photo_copy.jpg --scheme binary
+"""
+
+import io, struct
+from argparse import ArgumentParser
+
+BLOCKSIZE = 1 << 16
+LENGTH = struct.Struct(">I")
+
+def read_blocks(infile, blocksize=BLOCKSIZE):
+    """
+    Generator that yields the contents of a binary file in blocks of up to
+    blocksize bytes, reusing a single buffer
+    """
+    buf = bytearray(blocksize)
+    view = memoryview(buf)
+    while True:
+        size = infile.readinto(buf)
+        if not size:
+            return
+        yield view[:size].tobytes()
+
+def encode_stream(inpath, outpath, encode, blocksize=BLOCKSIZE):
+    """
+    Encodes the file inpath to framed DNA in outpath using the text to DNA
+    function encode. Returns the number of bytes encoded.
+    """
+    total = 0
+    with io.open(inpath, "rb") as infile:
+        with open(outpath, "w") as outfile:
+            for block in read_blocks(infile, blocksize):
+                outfile.write(encode(LENGTH.pack(len(block))) + encode(block) + "\n")
+                total += len(block)
+            outfile.write(encode(LENGTH.pack(0)) + "\n")
+    return total
+
+def decode_stream(inpath, outpath, decode, basesperbyte):
+    """
+    Decodes framed DNA in inpath back to the original bytes in outpath
+    using the DNA to text function decode, which reads basesperbyte bases
+    per byte. Returns the number of bytes decoded.
+    """
+    headlen = LENGTH.size * basesperbyte
+    total = 0
+    with open(inpath) as infile:
+        with io.open(outpath, "wb") as outfile:
+            for num, line in enumerate(infile):
+                line = line.rstrip("\r\n")
+                if len(line) < headlen:
+                    raise IOError("Frame %d of %s is too short for its length" % (num, inpath))
+                size, = LENGTH.unpack(decode(line[:headlen]))
+                if size == 0:
+                    return total
+                # checked on bases, since a partial byte may still decode
+                if len(line) != headlen + size * basesperbyte:
+                    raise IOError("Frame %d of %s holds %d bases, expected %d"
+                                  % (num, inpath, len(line) - headlen, size * basesperbyte))
+                block = decode(line[headlen:])
+                outfile.write(block)
+                total += size
+    raise IOError("%s is truncated: no end of stream frame" % inpath)
+
+def main():
+
+    parser = ArgumentParser()
+
+    parser.add_argument("mode",choices=["encode","decode"],help="encode a file to DNA or decode it back")
+    parser.add_argument("infile",metavar="in",help="input file")
+    parser.add_argument("outfile",metavar="out",help="output file")
+    parser.add_argument("--scheme",choices=["codon","binary"],default="codon",help="DNA encoding scheme")
+    parser.add_argument("--block-size",type=int,default=BLOCKSIZE,help="bytes per frame when encoding")
+
+    args = parser.parse_args()
+
+    if args.scheme == "codon":
+        from ASCIIcodons import TextToDNA as Encoder, DNAToText as Decoder
+    else:
+        from binaryDNA import BinaryTextToDNA as Encoder, DNAToBinaryText as Decoder
+
+    if args.mode == "encode":
+        size = Encoder().translate_stream(args.infile, args.outfile, args.block_size)
+        print "Encoded %d bytes to %s" % (size, args.outfile)
+    else:
+        size = Decoder().translate_stream(args.infile, args.outfile)
+        print "Decoded %d bytes to %s" % (size, args.outfile)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+
+"""
+Compression of profile text before it is encoded to DNA
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Every byte of a profile costs 4 bases with the codon scheme and 8 with the
+binary scheme, and English text compresses to about a third of its size.
+Each profile is compressed on its own, so that a person decodes without
+the others, and framed with a header:
+
+    MAGIC ("\\x00Z") + method code + method data
+
+Profile text never starts with a NUL byte, so decoded text that starts
+with MAGIC is decompressed automatically and anything else is passed on
+unchanged. The methods are:
+
+    z - raw deflate (zlib without its 6-byte header and checksum)
+    d - raw deflate with a preset dictionary, followed by the 4-byte
+        adler32 of the dictionary
+    b - bz2
+    x - lzma, when the lzma module (or backports.lzma) is installed
+
+Short profiles are too short for deflate to find many repeats in, so a
+dictionary of phrases common to profiles can be trained from samples.
+zlib in Python 2 has no preset dictionary argument, so the dictionary is
+compressed once and the stream is flushed with Z_SYNC_FLUSH. The
+compressor is then copied for each profile, and only the output after
+the flush is kept. The decompressor is primed the same way, so every
+match against the dictionary still decodes.
+
+A profile cut short by a missing oligo still decompresses as far as its
+deflate stream goes.
+
+>>> from compression import Compressor, decode_text
+>>> compressor = Compressor("zlib", level=9)
+>>> decode_text(compressor.compress("Person 0 likes DNA")) == "Person 0 likes DNA"
+True
+
+Steps to replicate:
+$ python compression.py train profiles.txt profiles.dict --size 2048
+$ python compression.py stats profiles.txt --dictionary profiles.dict
+$ python order_pipeline.py profiles.txt order.txt --compress zlib --dictionary profiles.dict
+$ python get_unique_oligos.py merged.fastq.gz --dictionary profiles.dict
+"""
+
+import bz2, zlib, struct
+from argparse import ArgumentParser
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+MAGIC = "\x00Z"
+DICT_SIZE = 2048
+DICT_ID = struct.Struct(">I")
+WBITS = -15             # raw deflate stream, no header or checksum
+
+codes = {'zlib': 'z', 'bz2': 'b', 'lzma': 'x'}
+methods = sorted(codes) if lzma else ['bz2', 'zlib']
+
+errors = (zlib.error, IOError, EOFError, ValueError)
+if lzma:
+    errors += (lzma.LZMAError,)
+
+def dictionary_id(dictionary):
+    return DICT_ID.pack(zlib.adler32(dictionary) & 0xffffffff)
+
+def primed_compressor(dictionary, level=9):
+    """
+    Returns a raw deflate compressor that has compressed the dictionary and
+    been flushed, with the compressed dictionary
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, WBITS)
+    prefix = compressor.compress(dictionary) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    return compressor, prefix
+
+_primed = {}
+
+def primed_decompressor(dictionary):
+    """
+    Returns a raw deflate decompressor whose window holds the dictionary
+    """
+    key = dictionary_id(dictionary)
+    decompressor = _primed.get(key)
+    if decompressor is None:
+        compressor, prefix = primed_compressor(dictionary)
+        decompressor = zlib.decompressobj(WBITS)
+        decompressor.decompress(prefix)
+        _primed[key] = decompressor
+    return decompressor.copy()
+
+class Compressor:
+
+    def __init__(self, method='zlib', level=9, dictionary=None):
+        """
+        Initialize Compressor object
+        Input:
+            method     - 'zlib', 'bz2' or 'lzma'
+            level      - compression level, 1 (fastest) to 9 (smallest)
+            dictionary - optional preset dictionary text, zlib only
+        """
+        if method not in methods:
+            raise ValueError("Unknown or unavailable compression method %s" % method)
+        if dictionary and method != 'zlib':
+            raise ValueError("A preset dictionary needs the zlib method")
+        self.method = method
+        self.level = level
+        self.dictionary = dictionary
+        self._primed = None
+        if dictionary:
+            self._primed = primed_compressor(dictionary, level)[0]
+            self.header = MAGIC + 'd' + dictionary_id(dictionary)
+        else:
+            self.header = MAGIC + codes[method]
+
+    def compress(self, text):
+        """
+        Returns the framed compressed form of a profile
+        """
+        if self._primed:
+            compressor = self._primed.copy()
+            return self.header + compressor.compress(text) + compressor.flush()
+        if self.method == 'zlib':
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, WBITS)
+            return self.header + compressor.compress(text) + compressor.flush()
+        if self.method == 'bz2':
+            return self.header + bz2.compress(text, self.level)
+        return self.header + lzma.compress(text, preset=self.level)
+
+def is_compressed(data):
+    return data.startswith(MAGIC)
+
+def decompress(data, dictionary=None):
+    """
+    Returns the text of framed compressed data. Raises ValueError if the
+    data is not framed, or needs a dictionary other than the one given.
+    """
+    if not is_compressed(data):
+        raise ValueError("Data does not start with the compression header")
+    code = data[len(MAGIC):len(MAGIC) + 1]
+    body = data[len(MAGIC) + 1:]
+    if code == 'z':
+        decompressor = zlib.decompressobj(WBITS)
+    elif code == 'd':
+        wanted = body[:DICT_ID.size]
+        if dictionary is None or dictionary_id(dictionary) != wanted:
+            raise ValueError("Data was compressed with dictionary %08x, which was not given"
+                             % DICT_ID.unpack(wanted.ljust(DICT_ID.size, "\x00"))[0])
+        decompressor = primed_decompressor(dictionary)
+        body = body[DICT_ID.size:]
+    elif code == 'b':
+        return bz2.BZ2Decompressor().decompress(body)
+    elif code == 'x' and lzma:
+        return lzma.LZMADecompressor().decompress(body)
+    else:
+        raise ValueError("Unknown or unavailable compression code %r" % code)
+    # a truncated stream decompresses as far as it goes
+    return decompressor.decompress(body) + decompressor.flush()
+
+def decode_text(text, dictionary=None):
+    """
+    Returns decoded text decompressed if it is framed compressed data, and
+    unchanged if it is not or cannot be decompressed
+    """
+    if not is_compressed(text):
+        return text
+    try:
+        return decompress(text, dictionary)
+    except errors:
+        return text
+
+def decoding(tfunc, dictionary=None):
+    """
+    Returns a DNA to text function that decompresses the text of tfunc
+    when it is framed compressed data
+    """
+    return lambda dna: decode_text(tfunc(dna), dictionary)
+
+def read_dictionary(path):
+    with open(path, "rb") as infile:
+        return infile.read()
+
+def train_dictionary(samples, size=DICT_SIZE):
+    """
+    Returns a preset dictionary of up to size bytes built from the words
+    and two- and three-word phrases found in more than one sample text,
+    worth the most bytes across the samples first
+    """
+    found = {}
+    for text in samples:
+        words = text.split(" ")
+        phrases = set()
+        for length in (1, 2, 3):
+            for start in xrange(len(words) - length + 1):
+                phrases.add(" ".join(words[start:start + length]) + " ")
+        for phrase in phrases:
+            found[phrase] = found.get(phrase, 0) + 1
+    ranked = sorted((phrase for phrase, count in found.items() if count > 1 and len(phrase) > 3),
+                    key=lambda phrase: (found[phrase] * len(phrase), phrase), reverse=True)
+    picked = []
+    total = 0
+    for phrase in ranked:
+        if total + len(phrase) > size or any(phrase in longer for longer in picked):
+            continue
+        picked.append(phrase)
+        total += len(phrase)
+    # deflate codes nearer matches in fewer bits, so the phrases worth
+    # most go at the end of the dictionary
+    return "".join(reversed(picked))
+
+def main():
+
+    parser = ArgumentParser()
+
+    parser.add_argument("mode",choices=["train","stats"],help="train a dictionary, or compare the methods")
+    parser.add_argument("infile",metavar="in",help="text file with one profile per line")
+    parser.add_argument("outfile",metavar="out",nargs="?",help="dictionary file to write when training")
+    parser.add_argument("--size",type=int,default=DICT_SIZE,help="largest dictionary size in bytes")
+    parser.add_argument("--level",type=int,default=9,help="compression level")
+    parser.add_argument("--dictionary",help="also compare zlib with this dictionary")
+
+    args = parser.parse_args()
+
+    with open(args.infile) as infile:
+        profiles = [line.rstrip("\r\n") for line in infile if line.strip()]
+
+    if args.mode == "train":
+        if not args.outfile:
+            parser.error("train needs an output dictionary file")
+        dictionary = train_dictionary(profiles, args.size)
+        with open(args.outfile, "wb") as out:
+            out.write(dictionary)
+        print "Wrote a %d byte dictionary to %s" % (len(dictionary), args.outfile)
+        return
+
+    compressors = [(method, Compressor(method, args.level)) for method in methods]
+    if args.dictionary:
+        compressors.append(("zlib+dict", Compressor("zlib", args.level,
+                                                    read_dictionary(args.dictionary))))
+    total = sum(len(text) for text in profiles)
+    print "%-10s %8d bytes" % ("none", total)
+    for name, compressor in compressors:
+        size = sum(len(compressor.compress(text)) for text in profiles)
+        print "%-10s %8d bytes  %.2fx" % (name, size, float(total) / size if size else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,174 @@
-#!/usr/bin/env python
-
-"""
-CustomArray to FASTQ converter
-
-Copyright 2013 Michael Ting
-https://github.com/michaelting
-Released under the BSD 2-clause license. See LICENSE.
-http://opensource.org/licenses/BSD-2-Clause
-"""
-
-import os
-
-def convert(infile, outfile):
-	with open(infile,"r") as f:
-		seqnum = 0
-		out = open(outfile,"w")
-		for line in f:
-			out.write("@seq%d\n" % seqnum)
-			out.write("%s" % line)
-			out.write("+seq%d\n" % seqnum)
-			out.write("%s" % line)
-			out.flush()
-			os.fsync(out.fileno())
-			seqnum += 1
-		out.close()
-	print "Conversion compelte!"
\ No newline at end of file
+#!/usr/bin/env python
+
+"""
+CustomArray to FASTQ converter
+
+Copyright 2013 Michael Ting
+https://github.com/michaelting
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Each line of a CustomArray order becomes one FASTQ record with a constant
+Phred quality string. Records are written in batches, and output can be
+compressed as gzip or as BGZF (blocked gzip, readable by gzip and indexable
+by samtools/htslib). With threaded set, compression runs in a background
+thread while the next batch is formatted.
+
+$ python custarr_to_fastq.py order.txt reads.fastq.gz --compress bgzf --threaded
+"""
+
+import gzip, struct, zlib, threading, Queue
+from argparse import ArgumentParser
+
+BGZF_BLOCKSIZE = 65280		# uncompressed bytes per BGZF block
+BGZF_EOF = ("\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43"
+            "\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00")
+
+class BgzfWriter(object):
+	"""Writes a BGZF file: a series of gzip members of at most 64 KB,
+	each recording its compressed size, followed by an empty EOF block"""
+
+	def __init__(self, filename, level=6):
+		self._file = open(filename, "wb")
+		self._level = level
+		self._buffer = []
+		self._buffered = 0
+
+	def write(self, data):
+		self._buffer.append(data)
+		self._buffered += len(data)
+		if self._buffered >= BGZF_BLOCKSIZE:
+			data = "".join(self._buffer)
+			end = len(data) - len(data) % BGZF_BLOCKSIZE
+			for start in xrange(0, end, BGZF_BLOCKSIZE):
+				self._write_block(data[start:start+BGZF_BLOCKSIZE])
+			self._buffer = [data[end:]]
+			self._buffered = len(data) - end
+
+	def _write_block(self, block):
+		compressor = zlib.compressobj(self._level, zlib.DEFLATED, -15)
+		cdata = compressor.compress(block) + compressor.flush()
+		bsize = len(cdata) + 25		# header (18) + crc and isize (8) - 1
+		header = struct.pack("<4BI2BH2BHH", 0x1f, 0x8b, 8, 4, 0, 0, 0xff,
+		                     6, 66, 67, 2, bsize)
+		crc = zlib.crc32(block) & 0xffffffff
+		self._file.write(header + cdata + struct.pack("<II", crc, len(block)))
+
+	def close(self):
+		data = "".join(self._buffer)
+		if data:
+			self._write_block(data)
+		self._buffer = []
+		self._buffered = 0
+		self._file.write(BGZF_EOF)
+		self._file.close()
+
+class ThreadedWriter(object):
+	"""Hands writes to a background thread so that compression overlaps
+	with formatting of the next batch (zlib releases the GIL)"""
+
+	def __init__(self, writer, maxpending=8):
+		self._writer = writer
+		self._queue = Queue.Queue(maxpending)
+		self._error = None
+		self._thread = threading.Thread(target=self._run)
+		self._thread.daemon = True
+		self._thread.start()
+
+	def _run(self):
+		while True:
+			data = self._queue.get()
+			if data is None:
+				break
+			if self._error is None:
+				try:
+					self._writer.write(data)
+				except Exception as exception:
+					self._error = exception
+
+	def write(self, data):
+		if self._error is not None:
+			raise self._error
+		self._queue.put(data)
+
+	def close(self):
+		self._queue.put(None)
+		self._thread.join()
+		self._writer.close()
+		if self._error is not None:
+			raise self._error
+
+def open_output(outfile, compress=None, level=6, threaded=False):
+	"""Opens outfile for writing as plain text, gzip or BGZF.
+	If compress is None, gzip is used for names ending in .gz"""
+	if compress is None and outfile.endswith(".gz"):
+		compress = "gzip"
+	if compress == "gzip":
+		out = gzip.open(outfile, "wb", level)
+	elif compress == "bgzf":
+		out = BgzfWriter(outfile, level)
+	elif compress is None:
+		out = open(outfile, "w")
+	else:
+		raise ValueError("Unknown compression %s" % compress)
+	if threaded:
+		out = ThreadedWriter(out)
+	return out
+
+def fastq_records(lines, quality="I"):
+	"""Generator that yields a FASTQ record string for each sequence line,
+	with a constant quality character (I is Phred 40)"""
+	seqnum = 0
+	for line in lines:
+		seq = line.strip()
+		if not seq:
+			continue
+		yield "@seq%d\n%s\n+seq%d\n%s\n" % (seqnum, seq, seqnum, quality * len(seq))
+		seqnum += 1
+
+def write_batched(records, out, batchsize=10000):
+	"""Writes strings to out, joining batchsize of them per write.
+	Returns the number of strings written"""
+	count = 0
+	batch = []
+	for rec in records:
+		batch.append(rec)
+		if len(batch) >= batchsize:
+			out.write("".join(batch))
+			count += len(batch)
+			batch = []
+	if batch:
+		out.write("".join(batch))
+		count += len(batch)
+	return count
+
+def convert(infile, outfile, quality="I", compress=None, level=6,
+            threaded=False, batchsize=10000):
+	"""Converts a CustomArray order file into a FASTQ file"""
+	with open(infile,"r") as f:
+		out = open_output(outfile, compress, level, threaded)
+		try:
+			write_batched(fastq_records(f, quality), out, batchsize)
+		finally:
+			out.close()
+	print "Conversion complete!"
+
+def main():
+
+	parser = ArgumentParser()
+
+	parser.add_argument("infile",metavar="in",help="CustomArray order file")
+	parser.add_argument("outfile",metavar="out",help="name of output FASTQ file")
+	parser.add_argument("--quality",default="I",help="constant quality character (default I, Phred 40)")
+	parser.add_argument("--compress",choices=["gzip","bgzf"],help="output compression (gzip if out ends in .gz)")
+	parser.add_argument("--level",type=int,default=6,help="compression level")
+	parser.add_argument("--threaded",action="store_true",help="compress in a background thread")
+	parser.add_argument("--batchsize",type=int,default=10000,help="records per write")
+
+	args = parser.parse_args()
+
+	convert(args.infile, args.outfile, args.quality, args.compress, args.level,
+	        args.threaded, args.batchsize)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+
+"""
+Indexed, memory-mapped access to FASTA files
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Builds a .fai index in the samtools format, one line per record:
+
+    name    length    offset    linebases    linewidth
+
+name is the first word after ">", offset is the byte offset of the first
+base, linebases is the number of bases per line and linewidth is the
+number of bytes per line including the line terminator.
+
+With the index, IndexedFasta fetches whole records or base ranges from a
+memory-mapped file without reading the records before them. Records keep
+their position in the file, which is the person ID used by the chunkers.
+
+>>> from fasta_index import IndexedFasta
+>>> fa = IndexedFasta("infile.fasta")
+>>> fa.fetch("person3")
+>>> fa.fetch("person3", 100, 200)
+"""
+
+import os, mmap
+
+class FastaIndexEntry:
+
+    def __init__(self, name, length, offset, linebases, linewidth, pos):
+        """
+        Initialize FastaIndexEntry object
+        """
+        self.name = name
+        self.length = length
+        self.offset = offset
+        self.linebases = linebases
+        self.linewidth = linewidth
+        self.pos = pos          # position of the record in the file
+
+    def byte_offset(self, base):
+        """
+        Returns the byte offset in the file of a base position in the record
+        """
+        if self.linebases == 0:
+            return self.offset
+        return (self.offset + (base // self.linebases) * self.linewidth
+                + base % self.linebases)
+
+def build_index(fastafile, faifile=None):
+    """
+    Scans a FASTA file once and writes its .fai index. Returns the list of
+    index entries. Raises ValueError if the lines of a record differ in
+    length or a record has a blank line between its lines of bases.
+    """
+    if faifile is None:
+        faifile = fastafile + ".fai"
+
+    entries = []
+    name = None
+    with open(fastafile, "rb") as infile:
+        pos = 0
+        for line in infile:
+            if line.startswith(">"):
+                if name is not None:
+                    entries.append(FastaIndexEntry(name, length, start,
+                                                   linebases, linewidth,
+                                                   len(entries)))
+                fields = line[1:].split()
+                name = fields[0] if fields else ""
+                start = pos + len(line)
+                length = 0
+                linebases = linewidth = 0
+                short = False   # a line shorter than linebases has been seen
+                blank = False   # a blank line has been seen
+            elif name is not None:
+                bases = len(line.rstrip("\r\n"))
+                if bases == 0:
+                    blank = True
+                    pos += len(line)
+                    continue
+                if blank:
+                    raise ValueError("Blank line inside record %s" % name)
+                if linebases == 0:
+                    linebases, linewidth = bases, len(line)
+                elif short or bases > linebases:
+                    raise ValueError("Inconsistent line length in record %s" % name)
+                elif bases < linebases:
+                    short = True
+                elif len(line) != linewidth:
+                    raise ValueError("Inconsistent line terminator in record %s" % name)
+                length += bases
+            pos += len(line)
+        if name is not None:
+            entries.append(FastaIndexEntry(name, length, start, linebases,
+                                           linewidth, len(entries)))
+
+    with open(faifile, "w") as out:
+        for e in entries:
+            out.write("%s\t%d\t%d\t%d\t%d\n" % (e.name, e.length, e.offset,
+                                                e.linebases, e.linewidth))
+    return entries
+
+def read_index(faifile):
+    """
+    Reads the entries of a .fai index
+    """
+    entries = []
+    with open(faifile) as infile:
+        for line in infile:
+            fields = line.rstrip("\r\n").split("\t")
+            if len(fields) < 5:
+                continue
+            entries.append(FastaIndexEntry(fields[0], int(fields[1]),
+                                           int(fields[2]), int(fields[3]),
+                                           int(fields[4]), len(entries)))
+    return entries
+
+class IndexedFasta:
+    """
+    Random access to the records of a FASTA file through its .fai index.
+    The index is built if it is missing or older than the FASTA file.
+    """
+
+    def __init__(self, fastafile, faifile=None):
+        if faifile is None:
+            faifile = fastafile + ".fai"
+        if (not os.path.exists(faifile) or
+                os.path.getmtime(faifile) < os.path.getmtime(fastafile)):
+            self.entries = build_index(fastafile, faifile)
+        else:
+            self.entries = read_index(faifile)
+        self.byname = dict((e.name, e) for e in self.entries)
+
+        self._file = open(fastafile, "rb")
+        if os.path.getsize(fastafile) > 0:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._map = ""
+
+    def close(self):
+        if self._map:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def names(self):
+        """
+        Returns the record names in file order
+        """
+        return [e.name for e in self.entries]
+
+    def entry(self, key):
+        """
+        Returns the index entry for a record name or a record position
+        """
+        if isinstance(key, (int, long)):
+            return self.entries[key]
+        if key in self.byname:
+            return self.byname[key]
+        if key.isdigit():
+            return self.entries[int(key)]
+        raise KeyError("No record %s in FASTA index" % key)
+
+    def fetch(self, key, start=0, end=None):
+        """
+        Returns bases [start, end) of a record given by name or position
+        """
+        e = self.entry(key)
+        if end is None or end > e.length:
+            end = e.length
+        if start >= end:
+            return ""
+        raw = self._map[e.byte_offset(start):e.byte_offset(end - 1) + 1]
+        return raw.replace("\n", "").replace("\r", "")
+
+    def records(self, keys=None):
+        """
+        Generator that yields (position, name, seq) for the requested records,
+        or for every record if keys is None
+        """
+        if keys is None:
+            entries = self.entries
+        else:
+            entries = [self.entry(k) for k in keys]
+        for e in entries:
+            yield e.pos, e.name, self.fetch(e.pos)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+"""
+Reading frame detection for codon encoded DNA
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+A read that does not start on a codon boundary, or whose length is not a
+multiple of 4, decodes to garbage in the wrong frame. The read is decoded
+in all four reading frames and each frame is scored by how plausible its
+characters are as profile text, using a 256-entry table: letters, digits
+and spaces score highest, punctuation lower, and control characters and
+extended ASCII are penalised. The frame with the highest mean score wins.
+
+Each frame is decoded with one regex split into codons and one map through
+the codon table, and scored with one str.translate into score classes and
+a count per class, so no step loops over the read in Python.
+
+>>> from ASCIIcodons import TextToDNA
+>>> from frame_detect import best_frame
+>>> best_frame("T" + TextToDNA().text_to_dna("Hello world") + "GA")
+(1, 'Hello world', 3.0)
+"""
+
+import re, string
+
+from ASCIIcodons import dna2chr, CODONSIZE, load_tables
+
+UNKNOWN = "\x00"    # decoded for codons containing anything but ACGT
+
+class CodonTable(dict):
+    """
+    Codon to character table that decodes unknown codons to UNKNOWN
+    """
+    def __missing__(self, codon):
+        return UNKNOWN
+
+load_tables()
+codon2chr = CodonTable(dna2chr)
+
+def char_score(code):
+    """
+    Returns the plausibility score of an ASCII code in profile text
+    """
+    char = chr(code)
+    if char.isalnum() or char == " ":
+        return 3
+    if char in ".,;:'\"-!?()/$#&%@":
+        return 2
+    if char in string.printable:
+        return 1
+    if code < 128:
+        return -4       # control characters and DEL
+    return -2           # extended ASCII
+
+scores = [char_score(code) for code in xrange(256)]
+
+# characters are grouped into classes of equal score, so that a text is
+# scored with a single translate and one count per class
+levels = sorted(set(scores))
+classes = string.maketrans("".join(map(chr, xrange(256))),
+                           "".join(chr(levels.index(score)) for score in scores))
+classchars = [chr(index) for index in xrange(len(levels))]
+
+codonpattern = re.compile(".{%d}" % CODONSIZE, re.S)
+
+def frame_texts(seq):
+    """
+    Returns the text decoded in each of the four reading frames, ignoring
+    partial codons at either end
+    """
+    return ["".join(map(codon2chr.__getitem__, codonpattern.findall(seq, frame)))
+            for frame in xrange(CODONSIZE)]
+
+def score_text(text):
+    """
+    Returns the total plausibility score of a decoded text
+    """
+    text = text.translate(classes)
+    return sum(level * text.count(char) for level, char in zip(levels, classchars))
+
+def best_frame(seq):
+    """
+    Returns a tuple of (frame, decoded text, mean score per character) for
+    the reading frame whose text scores highest. Ties go to the lower frame.
+    """
+    best = (0, "", 0.0)
+    for frame, text in enumerate(frame_texts(seq)):
+        if not text:
+            continue
+        score = score_text(text) / float(len(text))
+        if not best[1] or score > best[2]:
+            best = (frame, text, score)
+    return best
+
+def best_frames(seqs):
+    """
+    Returns the best_frame result of each sequence in a batch
+    """
+    return [best_frame(seq) for seq in seqs]
@@ -1,282 +1,780 @@
-#!/usr/bin/env python
-
-"""
-Processes merged sequencing data from Illumina MiSeq
-
-Created 15 July 2013
-Updated 5 September 2013
-
-Copyright 2013 Michael Ting
-https://github.com/michaelting
-Released under the BSD 2-clause license. See LICENSE.
-http://opensource.org/licenses/BSD-2-Clause
-
-Merged data was produced using SeqPrep on the forward and reverse
-reads from Illumina MiSeq. Reads are merged together into single
-reads for greater accuracy and are stripped of adapter sequences.
-"""
-
-import parse_fastq
-import ASCIIcodons
-import os, re, errno, gzip, time
-
-class Counter(dict):
-    """
-    Counts the number of items placed into dictionary buckets.
-    Values are initialized to 0.
-    Counter class adapted from Pacman AI projects at UC Berkeley, CS188
-    """
-    def __getitem__(self, idx):
-        self.setdefault(idx, 0)
-        return dict.__getitem__(self, idx)
-        
-    def argMax(self):
-        """
-        Returns the key with the highest value
-        """
-        if len(self.keys()) == 0:
-            return None
-        allitems = self.items()
-        values = [v[1] for v in allitems]
-        maxIndex = values.index(max(values))
-        return allitems[maxIndex][0]
-        
-    def maxVal(self):
-        """
-        Returns the maximum value of counts across all keys
-        """
-        if len(self.keys()) == 0:
-            return None
-        allitems = self.items()
-        values = [v[1] for v in allitems]
-        return max(values)
-        
-    def sortedKeys(self):
-        """
-        Returns a list of keys sorted by their values. 
-        Keys with the highest values appear first.
-        """
-        sortedItems = self.items()
-        compare = lambda x,y: sign(y[1] - x[1])
-        sortedItems.sort(cmp=compare)
-        return [x[0] for x in sortedItems]
-        
-    def totalCount(self):
-        """
-        Returns the sum of the counts for all keys.
-        """
-        return sum(self.values())
-        
-    def copy(self):
-        """
-        Returns a copy of the counter
-        """
-        return Counter(dict.copy(self))
-        
-def sign(x):
-    """
-    Returns 1 or -1 depending on the sign of x
-    """
-    if(x >= 0):
-        return 1
-    else:
-        return -1
-        
-def sort_oligos(parser, tfunc):
-    """
-    Stores oligos by person ID and oligo ID in a nested dictionary structure
-    using counts of bases for each base position in each oligo by means of
-    a Counter object.
-    {{[]}}
-    """    
-    
-    TAGLEN = 28
-    
-    badcharpattern  = re.compile('[^ACGT]')
-    tagpattern      = re.compile('TGTC[ACGT]{8}TGAT[ACGT]{12}')
-    tagformat       = re.compile('#\d{2}\$\d{3}')
-    
-    #initialize RAM storage
-    ramdict = {}
-    
-    # look at each read in the sequencing file
-    for rec in parser:
-        
-        seqhead     = rec[0].strip()    # header
-        seqdna      = rec[1].strip()    # dna sequence
-        
-        # if sequence contains non-ATGC characters, skip it
-        findbadchars = badcharpattern.search(seqdna)
-        
-        if findbadchars:
-            continue
-        
-        # search for starting point of information
-        findtag = tagpattern.search(seqdna)
-
-        # exclue bad tags
-        if not findtag:
-            continue
-        
-        # check that tag is translated into correct format
-        tagcheck = tfunc(findtag.group())
-        checkformat = tagformat.match(tagcheck)
-        # exclude bad tags found in translation
-        if not checkformat:
-            continue
-        infostart = findtag.start()
-        
-        # correct the reading frame
-        seqdna = seqdna[infostart:]
-
-        # cap maximum length
-        if len(seqdna) > 104:
-            seqdna = seqdna[:104]
-        
-        # if length is not divisible by 4, throw it out
-        # occurs for sequences shorter than maximum length
-        if (len(seqdna) % 4) != 0:
-            continue
-        
-        # check the tag of the sequence       
-        tagdna  = seqdna[:TAGLEN]
-        msgdna  = seqdna[TAGLEN:]
-        person  = tagdna[4:12]
-        oligo   = tagdna[16:28]        
-        
-        pid     = tfunc(person)
-        oid     = tfunc(oligo)
-   
-        # check if person has been listed
-        if pid not in ramdict:
-            ramdict[pid] = {}
-        # check if oligo has been listed for person
-        if oid not in ramdict[pid]:
-            ramdict[pid][oid] = []
-        
-        for baseindex in range(len(msgdna)):
-            
-            base = msgdna[baseindex]
-            # counter not yet initialized for that position
-            if baseindex >= len(ramdict[pid][oid]):
-                ramdict[pid][oid].insert(baseindex, Counter())  # Counter object holds counts of A,C,G,T
-                
-            ramdict[pid][oid][baseindex][base] += 1
-
-    return ramdict
-
-def get_consensus(ramdict):
-    """
-    Determines consensus sequences using the base with the highest count
-    at each position.
-    """
-
-    COUNT_THRESHOLD = 100
-    badoligos = []
-    
-    for pid in ramdict:
-        for oid in ramdict[pid]:
-            # determine the consensus sequence of a particular pid, oid
-            consensus = ""
-            for poscounter in ramdict[pid][oid]:
-                # Counts below threshold imply erroneous sequences, since correct sequences
-                # are copied 100's-1000's of times
-                if poscounter.maxVal() < COUNT_THRESHOLD:
-                    # throw out the sequence below the threshold
-                    badpair = (pid, oid)
-                    badoligos.append(badpair)
-                    break
-                # Grab the base with the most counts
-                else:
-                    consensus += poscounter.argMax()
-            # replace the list of Counters with a consensus string
-            ramdict[pid][oid] = consensus
-            
-    # remove bad oligos from the dictionary
-    for pair in badoligos:
-        badpers = pair[0]
-        badolig = pair[1]
-        del ramdict[badpers][badolig]            
-            
-    return ramdict
-
-def condense(ramdict, tfunc, outdir):
-    """
-    Condense oligos into a single block of text based on pid,oid order, translates
-    DNA to ASCII, and writes output to files in outdir
-    """
-    
-    # create the output file directory
-    try:
-        os.makedirs(outdir)
-    except OSError as exception:
-        if exception.errno != errno.EEXIST:
-            raise 
-    
-    for pid in ramdict:
-
-        fullseq = ""        
-        condensedfile = outdir + "/" + pid + "_condensed.txt"
-        translatedfile = outdir + "/" + pid + "_translated.txt"
-        
-        old_oid = "000"        
-        
-        for oid in sorted(ramdict[pid]): # sorts from 000,001,002,003,...
-        
-            fullseq += ramdict[pid][oid] # concatenate DNA into one block
-    
-            curr = int(oid)
-            old  = int(old_oid)
-            # numerical skips imply erroneous sequences, since oligos have order
-            if (curr - old) > 1:
-                break
-            old_oid = oid
-        
-        # don't write files with sequences filtered out
-        if fullseq == "":
-            continue            
-            
-        # write to condensed file and translate
-        with open(condensedfile, "w") as condfile:
-            condfile.write(fullseq)
-        
-        with open(translatedfile, "w") as endfile:
-            with open(condensedfile, "r") as basefile:
-                for line in basefile:
-                    dna = line.strip()
-                    text = tfunc(dna)
-                    endfile.write(text+"\n")
-
-def main():
-    
-    fqfile = gzip.open("merged.fastq.gz")
-    parser = parse_fastq.readFastq(fqfile)      # faster with generator
-    
-    translator = ASCIIcodons.DNAToText()
-    translate_dna = translator.dna_to_text
-    
-    treepath = "decodeddna"
-
-    print "Now sorting oligos..."
-    sort_start = time.time()
-    rd = sort_oligos(parser, translate_dna)
-    sort_end = time.time()
-    
-    print "Retrieving consensus DNA sequences..."
-    comb_start = time.time()
-    rd = get_consensus(rd)
-    comb_end = time.time()
-    
-    print "Condensing DNA sequences and translating DNA to readable text..."
-    cond_start = time.time()
-    condense(rd, translate_dna, treepath)
-    cond_end = time.time()
-    
-    print "Run complete. See /condensed.txt and /translated.txt in each subfolder of /%s for results." % treepath
-    
-    print "Elapsed time to sort was %g seconds" % (sort_end - sort_start)
-    print "Elapsed time to combine was %g seconds" % (comb_end - comb_start)
-    print "Elapsed time to condense was %g seconds" % (cond_end - cond_start)
-            
-if __name__ == "__main__":
-    main()
+#!/usr/bin/env python
+
+"""
+Processes merged sequencing data from Illumina MiSeq
+
+Created 15 July 2013
+Updated 5 September 2013
+
+Copyright 2013 Michael Ting
+https://github.com/michaelting
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Merged data was produced using SeqPrep on the forward and reverse
+reads from Illumina MiSeq. Reads are merged together into single
+reads for greater accuracy and are stripped of adapter sequences.
+Unmerged R1 and R2 files can be given instead with --r2, and each pair is
+merged as it is read (see parse_fastq.merge_pairs).
+"""
+
+import parse_fastq
+import os, re, errno, gzip, string, json
+from collections import deque
+from argparse import ArgumentParser
+import profiling
+from oligo_decode import schemes, get_translator
+from pipeline_metrics import PipelineMetrics
+from profiling import profiled
+from packeddna import write_packed
+from profile_archive import ARCHIVE_NAME, write_archive
+from result_cache import ResultCache, stage_key
+
+class Counter(dict):
+    """
+    Counts the number of items placed into dictionary buckets.
+    Values are initialized to 0.
+    Counter class adapted from Pacman AI projects at UC Berkeley, CS188
+    """
+    def __getitem__(self, idx):
+        self.setdefault(idx, 0)
+        return dict.__getitem__(self, idx)
+        
+    def argMax(self):
+        """
+        Returns the key with the highest value
+        """
+        if len(self.keys()) == 0:
+            return None
+        allitems = self.items()
+        values = [v[1] for v in allitems]
+        maxIndex = values.index(max(values))
+        return allitems[maxIndex][0]
+        
+    def maxVal(self):
+        """
+        Returns the maximum value of counts across all keys
+        """
+        if len(self.keys()) == 0:
+            return None
+        allitems = self.items()
+        values = [v[1] for v in allitems]
+        return max(values)
+        
+    def sortedKeys(self):
+        """
+        Returns a list of keys sorted by their values. 
+        Keys with the highest values appear first.
+        """
+        sortedItems = self.items()
+        compare = lambda x,y: sign(y[1] - x[1])
+        sortedItems.sort(cmp=compare)
+        return [x[0] for x in sortedItems]
+        
+    def totalCount(self):
+        """
+        Returns the sum of the counts for all keys.
+        """
+        return sum(self.values())
+        
+    def copy(self):
+        """
+        Returns a copy of the counter
+        """
+        return Counter(dict.copy(self))
+        
+def sign(x):
+    """
+    Returns 1 or -1 depending on the sign of x
+    """
+    if(x >= 0):
+        return 1
+    else:
+        return -1
+        
+TAGLEN = 28
+MAXLEN = 104            # tag and message length of an oligo
+COUNT_THRESHOLD = 100
+MIN_WEIGHT = 8.0        # quality weight of the consensus base, two Q40 reads
+MIN_CONFIDENCE = 0.6    # share of a position's weight the consensus base needs
+MIN_DEPTH_SHARE = 0.05  # share of the typical oligo weight an oligo needs
+PHRED_OFFSET = parse_fastq.PHRED_OFFSET
+
+# weight of a base by its quality character: Q/10, the log10 odds that the
+# base call is correct, so a Q40 base outweighs four Q10 bases
+phred_weights = [max(0, code - PHRED_OFFSET) / 10.0 for code in xrange(256)]
+
+def quality_weights(qual):
+    """
+    Returns the list of base weights of a quality string
+    """
+    return map(phred_weights.__getitem__, bytearray(qual))
+
+badcharpattern  = re.compile('[^ACGT]')
+tagpattern      = schemes['codon']['tagpattern']
+tagformat       = re.compile('#\d{2}\$\d{3}')
+
+# complementary base pairs for batch reverse complements
+complement = string.maketrans('ACGTacgt', 'TGCAtgca')
+
+def rev_comp_batch(seqs):
+    """
+    Reverse complements a list of DNA sequences. The batch is joined into a
+    single string so the complement and reversal each run as one operation
+    over the whole batch rather than base by base.
+    """
+    if not seqs:
+        return []
+    flipped = '\n'.join(seqs).translate(complement)[::-1].split('\n')
+    # reversing the joined string also reverses the order of the reads
+    flipped.reverse()
+    return flipped
+
+@profiled("get_unique_oligos.sort_oligos")
+def sort_oligos(parser, tfunc, strand=False, batchsize=10000, metrics=None,
+                scheme='codon', maxlen=MAXLEN, weighted=False):
+    """
+    Stores oligos by person ID and oligo ID in a nested dictionary structure
+    using counts of bases for each base position in each oligo by means of
+    a Counter object.
+    {{[]}}
+    
+    If strand is True, reads without a forward strand tag are collected in
+    batches of batchsize, reverse complemented together, and sorted if the
+    tag is found on the reverse strand.
+    
+    If metrics is a PipelineMetrics object, reads and bases are counted
+    under the "sort" stage along with the reason each dropped read was
+    rejected.
+    
+    scheme is 'codon' or 'binary' and sets the tag layout, and reads are
+    capped at maxlen bases from the start of the tag.
+    
+    If weighted is True, each base adds its Phred quality divided by 10 (the
+    log10 odds that it was called correctly) instead of a count of one.
+    
+    A record may hold a number of reads as a fourth field, as the clusters
+    of read_clusters.py do, and is then counted as that many reads.
+    """    
+    
+    params = dict(schemes[scheme], maxlen=maxlen)
+    tagsearch = params['tagpattern'].search
+    
+    #initialize RAM storage
+    ramdict = {}
+    # reads awaiting a reverse strand check
+    reverse = []
+    
+    # look at each read in the sequencing file
+    for rec in parser:
+        
+        seqhead     = rec[0].strip()    # header
+        seqdna      = rec[1].strip()    # dna sequence
+        qual        = rec[2].strip() if weighted else None
+        reads       = rec[3] if len(rec) > 3 else 1
+        
+        if metrics:
+            metrics.count("sort", reads, len(seqdna) * reads)
+        
+        # if sequence contains non-ATGC characters, skip it
+        findbadchars = badcharpattern.search(seqdna)
+        
+        if findbadchars:
+            if metrics:
+                metrics.reject("sort", "bad characters", reads)
+            continue
+        
+        # search for starting point of information
+        findtag = tagsearch(seqdna)
+
+        # exclude bad tags, unless the tag may be on the reverse strand
+        if not findtag:
+            if strand:
+                reverse.append((seqdna, qual, reads))
+                if len(reverse) >= batchsize:
+                    sort_reverse(ramdict, reverse, tfunc, metrics, params)
+                    reverse = []
+            elif metrics:
+                metrics.reject("sort", "no tag", reads)
+            continue
+        
+        reason = add_read(ramdict, seqdna, findtag, tfunc, params, qual, reads)
+        if reason and metrics:
+            metrics.reject("sort", reason, reads)
+    
+    if reverse:
+        sort_reverse(ramdict, reverse, tfunc, metrics, params)
+
+    return ramdict
+
+def sort_reverse(ramdict, reads, tfunc, metrics=None, params=None):
+    """
+    Reverse complements a batch of (seq, qual, count) reads that had no
+    forward strand tag and sorts the ones whose tag is found on the reverse
+    strand. qual is None for unweighted counts, and count is the number of
+    reads the sequence stands for.
+    """
+    if params is None:
+        params = dict(schemes['codon'], maxlen=MAXLEN)
+    flipped = rev_comp_batch([seq for seq, qual, count in reads])
+    for seqdna, (fwd, qual, count) in zip(flipped, reads):
+        if qual is not None:
+            qual = qual[::-1]
+        findtag = params['tagpattern'].search(seqdna)
+        if not findtag:
+            reason = "no tag"
+        else:
+            reason = add_read(ramdict, seqdna, findtag, tfunc, params, qual, count)
+        if metrics:
+            if reason:
+                metrics.reject("sort", reason, count)
+            else:
+                metrics.count("reverse strand", count, len(seqdna) * count)
+
+def add_read(ramdict, seqdna, findtag, tfunc, params=None, qual=None, count=1):
+    """
+    Adds the base counts of a single tagged read to ramdict. Returns the
+    reason the read was rejected, or None if it was added.
+    params holds the scheme's unitsize and taglen and the maxlen cap.
+    With a quality string, each base adds its Phred weight instead of 1.
+    count is the number of identical reads the sequence stands for, and
+    multiplies the weight of every base.
+    """
+    if params is None:
+        params = dict(schemes['codon'], maxlen=MAXLEN)
+    unitsize = params['unitsize']
+    maxlen = params['maxlen']
+    
+    # check that tag is translated into correct format
+    tagcheck = tfunc(findtag.group())
+    checkformat = tagformat.match(tagcheck)
+    # exclude bad tags found in translation
+    if not checkformat:
+        return "bad tag format"
+    infostart = findtag.start()
+    
+    # correct the reading frame
+    seqdna = seqdna[infostart:]
+
+    # cap maximum length
+    if len(seqdna) > maxlen:
+        seqdna = seqdna[:maxlen]
+    
+    # trim a partial codon (or byte) from the end, which occurs for
+    # sequences shorter than maximum length, so the read still counts
+    seqdna = seqdna[:len(seqdna) - len(seqdna) % unitsize]
+    
+    # check the tag of the sequence, laid out as $ _ _ # _ _ _
+    tagdna  = seqdna[:params['taglen']]
+    msgdna  = seqdna[params['taglen']:]
+    person  = tagdna[unitsize:3*unitsize]
+    oligo   = tagdna[4*unitsize:7*unitsize]
+    
+    pid     = tfunc(person)
+    oid     = tfunc(oligo)
+
+    # check if person has been listed
+    if pid not in ramdict:
+        ramdict[pid] = {}
+    # check if oligo has been listed for person
+    if oid not in ramdict[pid]:
+        ramdict[pid][oid] = []
+    
+    if qual is None:
+        weights = [count] * len(msgdna)
+    else:
+        start = infostart + params['taglen']
+        weights = quality_weights(qual[start:start + len(msgdna)])
+        if count != 1:
+            weights = [weight * count for weight in weights]
+    
+    for baseindex in range(len(msgdna)):
+        
+        base = msgdna[baseindex]
+        # counter not yet initialized for that position
+        if baseindex >= len(ramdict[pid][oid]):
+            ramdict[pid][oid].insert(baseindex, Counter())  # Counter object holds counts of A,C,G,T
+            
+        ramdict[pid][oid][baseindex][base] += weights[baseindex]
+
+def oligo_consensus(counters, threshold=COUNT_THRESHOLD, confidence=None):
+    """
+    Returns the consensus sequence of one oligo from its list of position
+    Counters, or None if the best base at any position has fewer than
+    threshold counts. With confidence set, the best base must also hold at
+    least that share of the position's counts (for quality-weighted counts).
+    The Counters are left unchanged.
+    """
+    consensus = []
+    for poscounter in counters:
+        # Counts below threshold imply erroneous sequences, since correct sequences
+        # are copied 100's-1000's of times
+        best = poscounter.argMax()
+        if best is None or poscounter[best] < threshold:
+            return None
+        if confidence is not None and poscounter[best] < confidence * poscounter.totalCount():
+            return None
+        # Grab the base with the most counts
+        consensus.append(best)
+    return "".join(consensus)
+
+def typical_weight(ramdict):
+    """
+    Returns the weighted median oligo weight of a sort_oligos result, the
+    weight of the reads covering the first position of an oligo such that
+    half of all the weight is in oligos at least that heavy. Miscalled tags
+    make many light oligos, which pull down the plain median but carry
+    little of the weight.
+    """
+    weights = sorted(counters[0].totalCount() for oligos in ramdict.values()
+                     for counters in oligos.values() if counters)
+    half = sum(weights) / 2.0
+    total = 0
+    for weight in weights:
+        total += weight
+        if total >= half:
+            return weight
+    return 0
+
+@profiled("get_unique_oligos.get_consensus")
+def get_consensus(ramdict, metrics=None, threshold=COUNT_THRESHOLD, confidence=None,
+                  depthshare=None):
+    """
+    Determines consensus sequences using the base with the highest count
+    at each position.
+    If metrics is given, oligos are counted under the "consensus" stage.
+    For quality-weighted counts, threshold is the minimum weight of the
+    consensus base and confidence the minimum share of a position's weight
+    it must hold (see oligo_consensus).
+    With depthshare set, the threshold is raised to that share of the
+    typical oligo weight, so that it scales with the sequencing depth. A
+    fixed weight is only a few reads, which a miscalled tag reaches at
+    high depth.
+    """
+
+    if depthshare:
+        threshold = max(threshold, depthshare * typical_weight(ramdict))
+
+    badoligos = []
+    
+    for pid in ramdict:
+        for oid in ramdict[pid]:
+            if metrics:
+                metrics.count("consensus", 1, len(ramdict[pid][oid]))
+            # determine the consensus sequence of a particular pid, oid
+            consensus = oligo_consensus(ramdict[pid][oid], threshold, confidence)
+            if consensus is None:
+                # throw out the sequence below the threshold
+                badoligos.append((pid, oid))
+                if metrics:
+                    metrics.reject("consensus", "below count threshold")
+                continue
+            # replace the list of Counters with a consensus string
+            ramdict[pid][oid] = consensus
+            
+    # remove bad oligos from the dictionary
+    for pair in badoligos:
+        badpers = pair[0]
+        badolig = pair[1]
+        del ramdict[badpers][badolig]            
+            
+    return ramdict
+
+@profiled("get_unique_oligos.condense")
+def condense(ramdict, tfunc, outdir, metrics=None, fmt="text"):
+    """
+    Condense oligos into a single block of text based on pid,oid order, translates
+    DNA to ASCII, and writes output to files in outdir
+    If metrics is given, oligos are counted under the "condense" stage.
+    With fmt "json", all persons are written to a single decoded.json file
+    instead of a pair of files per person. With fmt "packed", the condensed
+    DNA of all persons is written to a single 2-bit packed condensed.pdna
+    file (see packeddna.py) instead of a _condensed.txt file per person.
+    With fmt "archive", only a single profiles.pdna archive indexed by
+    person and oligo ID is written (see profile_archive.py).
+    Returns a dictionary of condensed DNA by person ID.
+    """
+    
+    # create the output file directory
+    try:
+        os.makedirs(outdir)
+    except OSError as exception:
+        if exception.errno != errno.EEXIST:
+            raise 
+    
+    condensed = {}
+    archived = {}
+    
+    for pid in ramdict:
+
+        fullseq = ""
+        used = []        
+        condensedfile = outdir + "/" + pid + "_condensed.txt"
+        translatedfile = outdir + "/" + pid + "_translated.txt"
+        
+        old_oid = "000"        
+        
+        oids = sorted(ramdict[pid])
+        
+        for index, oid in enumerate(oids): # sorts from 000,001,002,003,...
+        
+            curr = int(oid)
+            old  = int(old_oid)
+            # numerical skips imply erroneous sequences, since oligos have
+            # order, and drop the parity oligos left without an outer code
+            if (curr - old) > 1:
+                if metrics:
+                    metrics.reject("condense", "after oligo gap", len(oids) - index)
+                break
+            old_oid = oid
+            
+            fullseq += ramdict[pid][oid] # concatenate DNA into one block
+            used.append((oid, ramdict[pid][oid]))
+            if metrics:
+                metrics.count("condense", 1, len(ramdict[pid][oid]))
+        
+        # don't write files with sequences filtered out
+        if fullseq == "":
+            if metrics:
+                metrics.reject("condense", "person without oligos")
+            continue            
+        
+        condensed[pid] = fullseq
+        if fmt == "archive":
+            archived[pid] = used
+            continue
+        if fmt == "json":
+            continue
+        if fmt == "packed":
+            with open(translatedfile, "w") as endfile:
+                endfile.write(tfunc(fullseq)+"\n")
+            continue
+            
+        # write to condensed file and translate
+        with open(condensedfile, "w") as condfile:
+            condfile.write(fullseq)
+        
+        with open(translatedfile, "w") as endfile:
+            with open(condensedfile, "r") as basefile:
+                for line in basefile:
+                    dna = line.strip()
+                    text = tfunc(dna)
+                    endfile.write(text+"\n")
+    
+    if fmt == "json":
+        decoded = dict((pid, {'dna': dna, 'text': tfunc(dna)})
+                       for pid, dna in condensed.items())
+        with open(os.path.join(outdir, "decoded.json"), "w") as jsonfile:
+            json.dump(decoded, jsonfile, indent=2, sort_keys=True)
+    elif fmt == "packed":
+        write_packed(os.path.join(outdir, "condensed.pdna"), sorted(condensed.items()))
+    elif fmt == "archive":
+        write_archive(os.path.join(outdir, ARCHIVE_NAME), archived)
+    
+    return condensed
+
+def merge_counts(ramdict, other):
+    """
+    Adds the base counts of another sort_oligos result into ramdict
+    """
+    for pid, oligos in other.items():
+        mine = ramdict.setdefault(pid, {})
+        for oid, counters in oligos.items():
+            target = mine.setdefault(oid, [])
+            for baseindex, counter in enumerate(counters):
+                if baseindex >= len(target):
+                    target.append(Counter())
+                for base, count in counter.items():
+                    target[baseindex][base] += count
+    return ramdict
+
+def plain_counts(ramdict):
+    """
+    Returns the base counts of a sort_oligos result as plain dictionaries,
+    which can be pickled and restored with merge_counts({}, counts)
+    """
+    return dict((pid, dict((oid, [dict(counter) for counter in counters])
+                           for oid, counters in oligos.items()))
+                for pid, oligos in ramdict.items())
+
+def read_batches(parser, batchsize, quality=False):
+    """
+    Generator that yields lists of batchsize read sequences, or of
+    (sequence, quality) pairs if quality is set
+    """
+    batch = []
+    for rec in parser:
+        batch.append((rec[1], rec[2]) if quality else rec[1])
+        if len(batch) >= batchsize:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+_worker_translators = {}
+
+def sort_batch(args):
+    """
+    Sorts one batch of reads in a worker process. Returns the partial
+    ramdict and the metrics counts if counting is set.
+    """
+    seqs, scheme, strand, maxlen, counting, weighted = args
+    if scheme not in _worker_translators:
+        _worker_translators[scheme] = get_translator(scheme)
+    metrics = PipelineMetrics() if counting else None
+    if weighted:
+        records = (('', seq, qual) for seq, qual in seqs)
+    else:
+        records = (('', seq) for seq in seqs)
+    ramdict = sort_oligos(records, _worker_translators[scheme], strand,
+                          len(seqs), metrics, scheme, maxlen, weighted)
+    if metrics:
+        return ramdict, metrics.counts()
+    return ramdict, None
+
+def parallel_sort_oligos(parser, scheme='codon', workers=2, batchsize=10000,
+                         strand=True, maxlen=MAXLEN, metrics=None,
+                         maxpending=None, weighted=False):
+    """
+    Sorts reads like sort_oligos, with batches of batchsize reads sorted in
+    worker processes and the partial counts merged. At most maxpending
+    batches are in flight at once, which bounds memory use.
+    """
+    import multiprocessing
+    if maxpending is None:
+        maxpending = 2 * workers
+    pool = multiprocessing.Pool(workers)
+    ramdict = {}
+    pending = deque()
+    try:
+        for batch in read_batches(parser, batchsize, weighted):
+            pending.append(pool.apply_async(sort_batch,
+                ((batch, scheme, strand, maxlen, metrics is not None, weighted),)))
+            while len(pending) >= maxpending:
+                merge_batch(ramdict, pending.popleft().get(), metrics)
+        while pending:
+            merge_batch(ramdict, pending.popleft().get(), metrics)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return ramdict
+
+def merge_batch(ramdict, result, metrics):
+    """
+    Merges the result of sort_batch into ramdict and metrics
+    """
+    partial, counts = result
+    merge_counts(ramdict, partial)
+    if metrics and counts:
+        metrics.merge_counts(counts)
+
+BYTES_PER_READ = 500    # rough memory cost of a queued read
+
+def sort_reads(args, metrics):
+    """
+    Sorts the reads of the FASTQ file named in the command line arguments.
+    With --r2, the fastq argument holds the R1 reads and each pair is
+    merged as it is read, so no merged file is written.
+    """
+    fqfiles = [gzip.open(path) if path.endswith(".gz") else open(path)
+               for path in [args.fastq] + ([args.r2] if args.r2 else [])]
+    if args.r2:
+        reads = parse_fastq.merge_pairs(parse_fastq.readPairs(*fqfiles),
+                                        args.min_overlap, args.max_mismatch, metrics)
+    else:
+        reads = parse_fastq.readFastq(fqfiles[0])      # faster with generator
+    if args.min_mean_quality is not None or args.min_base_quality is not None:
+        reads = parse_fastq.quality_filter(reads, args.min_mean_quality,
+                                           args.min_base_quality, metrics)
+    if args.screen:
+        import library_screen
+        bloom = library_screen.build_filter(args.screen, args.screen_k, args.screen_fpr)
+        reads = library_screen.screen_reads(reads, bloom, args.screen_k,
+                                            minhits=args.screen_hits, metrics=metrics)
+    if args.cluster:
+        # the clusters are few, so they are always sorted in this process
+        import read_clusters
+        reads = read_clusters.cluster_records(reads, args.cluster_dist,
+                                              args.cluster_ratio, metrics)
+    
+    if args.workers > 1 and not args.cluster:
+        maxpending = None
+        if args.memory_budget:
+            maxpending = max(1, args.memory_budget * 1024 * 1024 //
+                                (args.batch_size * BYTES_PER_READ))
+        rd = parallel_sort_oligos(reads, args.scheme, args.workers,
+                                  args.batch_size, args.strand, args.maxlen,
+                                  metrics, maxpending, args.weighted)
+    else:
+        rd = sort_oligos(reads, get_translator(args.scheme), args.strand,
+                         args.batch_size, metrics, args.scheme, args.maxlen,
+                         args.weighted)
+    for fqfile in fqfiles:
+        fqfile.close()
+    return rd
+
+def consensus_params(args):
+    """
+    Returns the (threshold, confidence, depthshare) consensus settings of
+    the command line arguments
+    """
+    if args.weighted:
+        return args.min_weight, args.confidence, args.depth_share
+    return args.threshold, None, None
+
+def cached_stages(args, metrics, cache):
+    """
+    Runs the sort and consensus stages, reusing results cached for the same
+    input file and parameters. The sorted counts are keyed by the input and
+    the sort parameters, and the consensus by the sort key and threshold,
+    so a new threshold only recomputes the consensus.
+    """
+    threshold, confidence, depthshare = consensus_params(args)
+    sortkey = stage_key("sort", cache.digest(args.fastq), args.scheme,
+                        args.strand, args.maxlen, args.weighted,
+                        args.r2 and [cache.digest(args.r2), args.min_overlap,
+                                     args.max_mismatch],
+                        args.cluster and [args.cluster_dist, args.cluster_ratio],
+                        args.min_mean_quality, args.min_base_quality,
+                        args.screen and [cache.digest(args.screen), args.screen_k,
+                                         args.screen_fpr, args.screen_hits])
+    conskey = stage_key("consensus", sortkey, threshold, confidence, depthshare)
+    
+    hit, value = cache.get(conskey)
+    if hit:
+        print "Using cached consensus DNA sequences..."
+        rd, sortcounts, conscounts = value
+        metrics.merge_counts(sortcounts)
+        metrics.merge_counts(conscounts)
+        return rd
+    
+    print "Now sorting oligos..."
+    with metrics.timed("sort"):
+        hit, value = cache.get(sortkey)
+        if hit:
+            print "Using cached oligo counts..."
+            counts, sortcounts = value
+            metrics.merge_counts(sortcounts)
+            rd = merge_counts({}, counts)
+        else:
+            rd = sort_reads(args, metrics)
+            sortcounts = metrics.counts()
+            cache.put(sortkey, (plain_counts(rd), sortcounts))
+    
+    print "Retrieving consensus DNA sequences..."
+    consmetrics = PipelineMetrics()
+    with metrics.timed("consensus"):
+        rd = get_consensus(rd, consmetrics, threshold, confidence, depthshare)
+    metrics.merge_counts(consmetrics.counts())
+    cache.put(conskey, (rd, sortcounts, consmetrics.counts()))
+    return rd
+
+def main():
+    
+    parser = ArgumentParser()
+    
+    parser.add_argument("fastq",nargs="?",default="merged.fastq.gz",help="merged FASTQ file of reads, or R1 reads with --r2, gzipped if it ends in .gz")
+    parser.add_argument("--r2",metavar="FASTQ",help="R2 reads of a paired-end run, merged with the R1 reads as they are read")
+    parser.add_argument("--min-overlap",type=int,default=10,help="with --r2, minimum overlap of a read pair in bases")
+    parser.add_argument("--max-mismatch",type=float,default=0.1,help="with --r2, maximum share of mismatched bases in the overlap")
+    parser.add_argument("--outdir",default="decodeddna",help="directory for decoded output")
+    parser.add_argument("--scheme",choices=sorted(schemes),default="codon",help="DNA encoding scheme")
+    parser.add_argument("--threshold",type=int,default=COUNT_THRESHOLD,help="minimum base count for a consensus position")
+    parser.add_argument("--min-mean-quality",type=float,metavar="Q",help="drop reads with a lower mean Phred quality before sorting")
+    parser.add_argument("--min-base-quality",type=int,metavar="Q",help="drop reads with any base of lower Phred quality before sorting")
+    parser.add_argument("--screen",metavar="ORDERFILE",help="drop reads sharing too few k-mers with the oligos in this order file")
+    parser.add_argument("--screen-k",type=int,default=16,help="k-mer length of the library screen")
+    parser.add_argument("--screen-hits",type=int,default=3,help="library k-mers a read needs to pass the screen")
+    parser.add_argument("--screen-fpr",type=float,default=0.01,help="false positive rate of the library screen")
+    parser.add_argument("--cluster",action="store_true",help="cluster near-duplicate reads and sort each cluster once")
+    parser.add_argument("--cluster-dist",type=int,default=2,help="with --cluster, largest edit distance from a centroid to its members")
+    parser.add_argument("--cluster-ratio",type=float,default=16.0,help="with --cluster, reads in a centroid per read of a sequence one edit away")
+    parser.add_argument("--weighted",action="store_true",help="weight each base by its Phred quality")
+    parser.add_argument("--min-weight",type=float,default=MIN_WEIGHT,help="with --weighted, minimum weight of a consensus base")
+    parser.add_argument("--confidence",type=float,default=MIN_CONFIDENCE,help="with --weighted, minimum share of a position's weight for the consensus base")
+    parser.add_argument("--depth-share",type=float,default=MIN_DEPTH_SHARE,help="with --weighted, minimum weight of an oligo as a share of the typical oligo weight")
+    parser.add_argument("--maxlen",type=int,default=MAXLEN,help="maximum tag and message length in bases")
+    parser.add_argument("--no-strand",dest="strand",action="store_false",help="do not look for tags on the reverse strand")
+    parser.add_argument("--workers",type=int,default=1,help="number of sorting processes")
+    parser.add_argument("--batch-size",type=int,default=10000,help="reads per batch")
+    parser.add_argument("--memory-budget",type=int,metavar="MB",help="memory for reads queued to workers, in MB")
+    parser.add_argument("--outer-code",metavar="MANIFEST",help="recover missing oligos with the parity oligos described in this outer code manifest")
+    parser.add_argument("--dictionary",help="preset dictionary the profiles were compressed with (see compression.py)")
+    parser.add_argument("--format",choices=["text","json","packed","archive"],default="text",help="per-person text files, a single JSON file, packed DNA with per-person text, or an indexed archive")
+    parser.add_argument("--metrics",help="metrics JSON file (default OUTDIR/metrics.json)")
+    parser.add_argument("--progress",type=int,default=1000000,help="reads between progress lines, 0 for none")
+    parser.add_argument("--profile",metavar="DIR",help="write cProfile output for each stage to DIR")
+    parser.add_argument("--cache-dir",help="reuse sort and consensus results cached in this directory")
+    parser.add_argument("--cache-size",type=int,default=2048,metavar="MB",help="size limit of the cache")
+    
+    args = parser.parse_args()
+    
+    if args.profile:
+        profiling.enable(args.profile)
+    
+    # profiles compressed by order_pipeline.py --compress are recognized by
+    # their header and decompressed after translation
+    from compression import decoding, read_dictionary
+    dictionary = read_dictionary(args.dictionary) if args.dictionary else None
+    translate_dna = decoding(get_translator(args.scheme), dictionary)
+    
+    manifest = None
+    if args.outer_code:
+        from outer_code import read_manifest, recover_oligos
+        manifest = read_manifest(args.outer_code)
+        if manifest['scheme'] != args.scheme:
+            parser.error("%s is for the %s scheme" % (args.outer_code, manifest['scheme']))
+    
+    treepath = args.outdir
+    metrics = PipelineMetrics(progress=args.progress)
+
+    if args.cache_dir:
+        cache = ResultCache(args.cache_dir, args.cache_size * 1024 * 1024)
+        rd = cached_stages(args, metrics, cache)
+    else:
+        print "Now sorting oligos..."
+        with metrics.timed("sort"):
+            rd = sort_reads(args, metrics)
+        
+        print "Retrieving consensus DNA sequences..."
+        with metrics.timed("consensus"):
+            rd = get_consensus(rd, metrics, *consensus_params(args))
+    
+    if manifest:
+        print "Recovering missing oligos with the outer code..."
+        with metrics.timed("outer code"):
+            rd = recover_oligos(rd, manifest, metrics)
+    
+    print "Condensing DNA sequences and translating DNA to readable text..."
+    with metrics.timed("condense"):
+        condense(rd, translate_dna, treepath, metrics, args.format)
+    
+    metricsfile = args.metrics or os.path.join(treepath, "metrics.json")
+    metrics.write_json(metricsfile)
+    
+    if args.format == "json":
+        print "Run complete. See %s for results." % os.path.join(treepath, "decoded.json")
+    elif args.format == "archive":
+        print "Run complete. Read profiles from %s with profile_archive.py." % os.path.join(treepath, ARCHIVE_NAME)
+    else:
+        print "Run complete. See /condensed.txt and /translated.txt in each subfolder of /%s for results." % treepath
+    
+    if "sort" in metrics.stages:
+        print "Elapsed time to sort was %g seconds" % metrics.stages["sort"]["seconds"]
+    if "consensus" in metrics.stages:
+        print "Elapsed time to combine was %g seconds" % metrics.stages["consensus"]["seconds"]
+    print "Elapsed time to condense was %g seconds" % metrics.stages["condense"]["seconds"]
+    if "outer code recovered" in metrics.stages:
+        print "Outer code recovered %d oligos" % metrics.stages["outer code recovered"]["reads"]
+    if "quality filter" in metrics.stages:
+        removed = metrics.stages["quality filter removed"]
+        print "Quality filter removed %d of %d reads (%d bases)" % (
+            removed["reads"], metrics.stages["quality filter"]["reads"], removed["bases"])
+    print "Read counts and rejection reasons written to %s" % metricsfile
+            
+if __name__ == "__main__":
+    main()
+
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+
+"""
+Bloom filter screen of sequencing reads against the ordered oligo library
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+PhiX spike-in and other off-target reads go through all of the regex and
+translation work in sort_oligos before they are rejected. The screen drops
+them first: every k-mer of the tag and payload of each oligo in the
+chunker's order file, on both strands, is added to a Bloom filter, and a
+read is kept only if at least minhits of the k-mers sampled along it are
+found in the filter.
+
+The filter is a bytearray of bits, sized for the number of k-mers and the
+requested false positive rate:
+
+    bits   = -n ln(p) / ln(2)^2
+    hashes = bits / n * ln(2)
+
+Each k-mer is hashed with crc32 and adler32 from zlib, and the hash
+positions are h1 + i*h2 (double hashing). At a 1% false positive rate this
+is about 10 bits per k-mer, compared with the 50 or more bytes each k-mer
+would take in a set.
+
+Steps to replicate:
+$ python library_screen.py order.txt merged.fastq.gz screened.fastq
+$ python get_unique_oligos.py merged.fastq.gz --screen order.txt
+"""
+
+import math, gzip
+from zlib import crc32, adler32
+from argparse import ArgumentParser
+
+from oligo_decode import strip_adapters
+from get_unique_oligos import rev_comp_batch
+
+KMER = 16
+STRIDE = 8
+MIN_HITS = 3
+FP_RATE = 0.01
+
+class BloomFilter:
+
+    def __init__(self, capacity, fprate=FP_RATE):
+        """
+        Initialize BloomFilter object
+        Input:
+            capacity - number of items the filter is sized for
+            fprate   - false positive rate at that capacity
+        """
+        capacity = max(1, capacity)
+        self.nbits = max(8, int(math.ceil(-capacity * math.log(fprate) / math.log(2) ** 2)))
+        self.nhashes = max(1, int(round(float(self.nbits) / capacity * math.log(2))))
+        self.bits = bytearray((self.nbits + 7) // 8)
+        self.count = 0
+
+    def positions(self, item):
+        """
+        Returns the bit positions of an item
+        """
+        h1 = crc32(item) & 0xffffffff
+        h2 = (adler32(item) & 0xffffffff) | 1
+        nbits = self.nbits
+        return [(h1 + i * h2) % nbits for i in xrange(self.nhashes)]
+
+    def add(self, item):
+        bits = self.bits
+        for pos in self.positions(item):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        # positions are computed one at a time, since most misses are
+        # found at the first
+        bits = self.bits
+        nbits = self.nbits
+        pos = crc32(item) & 0xffffffff
+        if not bits[(pos % nbits) >> 3] & (1 << ((pos % nbits) & 7)):
+            return False
+        step = (adler32(item) & 0xffffffff) | 1
+        for i in xrange(1, self.nhashes):
+            pos += step
+            bit = pos % nbits
+            if not bits[bit >> 3] & (1 << (bit & 7)):
+                return False
+        return True
+
+    def nbytes(self):
+        return len(self.bits)
+
+def read_oligos(orderfile):
+    """
+    Returns the oligos of a chunker order file, plain or 2-bit packed
+    """
+    from packeddna import read_sequences
+    return [seq.strip() for seq in read_sequences(orderfile) if seq.strip()]
+
+def kmers(seq, k=KMER, stride=1):
+    """
+    Returns the k-mers of a sequence, starting every stride bases
+    """
+    return [seq[i:i+k] for i in xrange(0, len(seq) - k + 1, stride)]
+
+def build_filter(orderfile, k=KMER, fprate=FP_RATE):
+    """
+    Returns a BloomFilter of the k-mers of the tag and payload of every
+    oligo in an order file, on both strands
+    """
+    payloads = [strip_adapters(oligo) for oligo in read_oligos(orderfile)]
+    payloads += rev_comp_batch(payloads)
+    total = sum(max(0, len(seq) - k + 1) for seq in payloads)
+    bloom = BloomFilter(total, fprate)
+    for seq in payloads:
+        for kmer in kmers(seq, k):
+            bloom.add(kmer)
+    return bloom
+
+def library_hits(seq, bloom, k=KMER, stride=STRIDE, minhits=MIN_HITS):
+    """
+    Returns the number of sampled k-mers of a read found in the filter,
+    stopping once minhits are found
+    """
+    hits = 0
+    for kmer in kmers(seq, k, stride):
+        if kmer in bloom:
+            hits += 1
+            if hits >= minhits:
+                break
+    return hits
+
+def screen_reads(records, bloom, k=KMER, stride=STRIDE, minhits=MIN_HITS,
+                 metrics=None):
+    """
+    Generator that passes on the (header, seq, ...) records sharing at
+    least minhits sampled k-mers with the library. If metrics is given,
+    reads are counted under the "library screen" stage and dropped reads
+    are recorded as "off library".
+    """
+    for rec in records:
+        seq = rec[1].strip()
+        if metrics:
+            metrics.count("library screen", 1, len(seq))
+        if library_hits(seq, bloom, k, stride, minhits) >= minhits:
+            yield rec
+        elif metrics:
+            metrics.reject("library screen", "off library")
+
+def main():
+
+    parser = ArgumentParser()
+
+    parser.add_argument("orderfile",help="chunker order file, plain or packed")
+    parser.add_argument("fastq",help="FASTQ file of reads, gzipped if it ends in .gz")
+    parser.add_argument("outfile",help="FASTQ file of reads that pass the screen")
+    parser.add_argument("-k",type=int,default=KMER,help="k-mer length")
+    parser.add_argument("--stride",type=int,default=STRIDE,help="bases between sampled k-mers of a read")
+    parser.add_argument("--min-hits",type=int,default=MIN_HITS,help="library k-mers a read needs to pass")
+    parser.add_argument("--fp-rate",type=float,default=FP_RATE,help="Bloom filter false positive rate")
+
+    args = parser.parse_args()
+
+    from parse_fastq import readFastq
+    from custarr_to_fastq import open_output
+    from pipeline_metrics import PipelineMetrics
+
+    bloom = build_filter(args.orderfile, args.k, args.fp_rate)
+    print "Bloom filter of %d k-mers: %d bytes, %d hashes" % (bloom.count, bloom.nbytes(), bloom.nhashes)
+
+    if args.fastq.endswith(".gz"):
+        fqfile = gzip.open(args.fastq)
+    else:
+        fqfile = open(args.fastq)
+    metrics = PipelineMetrics()
+    out = open_output(args.outfile)
+    kept = 0
+    for rec in screen_reads(readFastq(fqfile), bloom, args.k, args.stride, args.min_hits, metrics):
+        out.write("@%s\n%s\n+\n%s\n" % rec)
+        kept += 1
+    out.close()
+    fqfile.close()
+
+    total = metrics.stages["library screen"]["reads"] if metrics.stages else 0
+    print "Kept %d of %d reads. See %s for results." % (kept, total, args.outfile)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+#!/usr/bin/env python
+
+"""
+Live decoding of sequencing output while the run is still in progress
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Follows a growing (uncompressed) FASTQ file, or a directory that FASTQ
+chunks are being written to, and sorts new reads into the running base
+counts as they arrive. At each update the consensus is recomputed only for
+the tags (person and oligo IDs) that received reads since the last update.
+
+A person is decodable once all of its data oligos pass the count
+threshold. The number of data oligos of each person is read from the
+order file given with --order (or from the outer code manifest next to
+it), or from the manifest given with --outer-code. With the outer code,
+missing oligos are recovered from the parity oligos as soon as enough of
+the others pass, as in get_unique_oligos.py. Without either, a person is
+taken to be decodable once its oligos 000 to n pass and no later data
+oligo has, so a profile may be written before its last oligos arrive.
+The translated text of each decodable person is written to the output
+directory as soon as it is complete and rewritten whenever its consensus
+changes.
+
+Files in a chunk directory are read once their size has stopped changing
+between two polls. Following stops after --idle seconds without new reads,
+or on Ctrl-C, and the remaining data is read before exiting.
+
+Steps to replicate:
+$ python live_decode.py run/merged.fastq --order order.txt --outdir livedna --interval 30
+$ python live_decode.py run/chunks/ --scheme binary --outer-code order.txt.rs.json --idle 600
+"""
+
+import os, sys, gzip, time, errno
+from itertools import islice
+from argparse import ArgumentParser
+
+from parse_fastq import readFastq
+from get_unique_oligos import (sort_oligos, merge_counts, oligo_consensus,
+                               COUNT_THRESHOLD, MAXLEN)
+from oligo_decode import schemes, get_translator, frame_payload
+from outer_code import PARITY_OID, MANIFEST_SUFFIX, read_manifest, recover_oligos
+
+FASTQ_SUFFIXES = (".fastq", ".fq", ".fastq.gz", ".fq.gz")
+# at most 256 data and parity oligos fit the outer code, so parity oligos
+# have IDs from here up and data oligos below
+PARITY_FLOOR = PARITY_OID - 255
+
+class FastqTail:
+    """
+    Reads the complete records appended to a growing FASTQ file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._partial = ""      # text after the last newline
+        self._lines = []        # lines of an incomplete record
+
+    def poll(self, final=False):
+        """
+        Generator that yields the records completed since the last poll.
+        With final set, a last line without a newline is also read.
+        """
+        if self._file is None:
+            if not os.path.exists(self.path):
+                return
+            self._file = open(self.path, "rb")
+        data = self._partial + self._file.read()
+        lines = data.split("\n")
+        self._partial = "" if final else lines.pop()
+        self._lines.extend(line.rstrip("\r") for line in lines if line.strip())
+        complete = len(self._lines) // 4 * 4
+        records, self._lines = self._lines[:complete], self._lines[complete:]
+        done = 0
+        try:
+            for rec in readFastq(records):
+                done += 4
+                yield rec
+        finally:
+            # an interrupted poll keeps the records it has not yielded
+            self._lines[:0] = records[done:]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+class ChunkDirectory:
+    """
+    Reads each FASTQ chunk written to a directory once it is complete
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self.sizes = {}
+        self.read = {}          # records yielded from partly read chunks
+
+    def poll(self, final=False):
+        """
+        Generator that yields the records of chunks whose size has not
+        changed since the last poll, or of every unread chunk if final
+        """
+        for name in sorted(os.listdir(self.path)):
+            if name in self.done or not name.endswith(FASTQ_SUFFIXES):
+                continue
+            path = os.path.join(self.path, name)
+            size = os.path.getsize(path)
+            if not final and self.sizes.get(name) != size:
+                self.sizes[name] = size
+                continue
+            if name.endswith(".gz"):
+                chunk = gzip.open(path)
+            else:
+                chunk = open(path)
+            with chunk:
+                done = self.read.get(name, 0)
+                try:
+                    for rec in islice(readFastq(chunk), done, None):
+                        done += 1
+                        yield rec
+                finally:
+                    # an interrupted chunk is read again from here
+                    self.read[name] = done
+            self.done.add(name)
+            del self.read[name]
+
+    def close(self):
+        pass
+
+def open_source(path):
+    """
+    Returns a ChunkDirectory for a directory, or a FastqTail for a file
+    """
+    if os.path.isdir(path):
+        return ChunkDirectory(path)
+    if path.endswith(".gz"):
+        raise IOError("Cannot follow a growing gzip file, write chunks to a directory instead")
+    return FastqTail(path)
+
+def order_lengths(orderfile, scheme='codon'):
+    """
+    Returns a dictionary of the number of data oligos of each person ID in
+    a chunker order file, plain or packed, read from their tags
+    """
+    from packeddna import read_sequences
+    tfunc = get_translator(scheme)
+    taglen = schemes[scheme]['taglen']
+    lengths = {}
+    for seq in read_sequences(orderfile):
+        payload = frame_payload(seq.strip(), scheme)
+        if payload is None:
+            continue
+        tag = tfunc(payload[:taglen])
+        pid, oid = tag[1:3], int(tag[4:7])
+        if oid < PARITY_FLOOR:
+            lengths[pid] = max(lengths.get(pid, 0), oid + 1)
+    return lengths
+
+class LiveDecoder:
+
+    def __init__(self, scheme='codon', threshold=COUNT_THRESHOLD, strand=True,
+                 maxlen=MAXLEN, metrics=None, dictionary=None, lengths=None,
+                 manifest=None):
+        """
+        Initialize LiveDecoder object
+        Compressed profiles are decompressed, with the preset dictionary if
+        one is given (see compression.py)
+        Input:
+            lengths  - optional dictionary of the number of data oligos of
+                       each person ID (see order_lengths)
+            manifest - optional outer code manifest, used for the number
+                       of data oligos and to recover missing ones
+        """
+        from compression import decoding
+        self.scheme = scheme
+        self.threshold = threshold
+        self.strand = strand
+        self.maxlen = maxlen
+        self.metrics = metrics
+        self.tfunc = decoding(get_translator(scheme), dictionary)
+        self.manifest = manifest
+        if manifest:
+            lengths = manifest['persons']
+        self.lengths = lengths
+        self.counts = {}        # pid -> oid -> list of position Counters
+        self.consensus = {}     # pid -> oid -> consensus DNA
+        self.changed = set()    # (pid, oid) tags with new reads
+        self.reads = 0
+
+    def add_reads(self, records):
+        """
+        Sorts a batch of (header, seq, ...) records into the running counts
+        """
+        partial = sort_oligos(records, self.tfunc, self.strand,
+                              metrics=self.metrics, scheme=self.scheme,
+                              maxlen=self.maxlen)
+        for pid, oligos in partial.items():
+            for oid in oligos:
+                self.changed.add((pid, oid))
+        merge_counts(self.counts, partial)
+        self.reads += len(records)
+
+    def update(self):
+        """
+        Recomputes the consensus of tags that received reads since the last
+        update. Returns the set of persons whose consensus changed.
+        """
+        persons = set()
+        for pid, oid in self.changed:
+            dna = oligo_consensus(self.counts[pid][oid], self.threshold)
+            oligos = self.consensus.setdefault(pid, {})
+            if dna is not None and oligos.get(oid) != dna:
+                oligos[oid] = dna
+                persons.add(pid)
+        self.changed = set()
+        return persons
+
+    def contiguous(self, pid):
+        """
+        Returns the consensus of a person's oligos from 000 up to the first
+        missing one
+        """
+        oligos = self.consensus.get(pid, {})
+        found = []
+        while "%03d" % len(found) in oligos:
+            found.append(oligos["%03d" % len(found)])
+        return found
+
+    def recovered(self, pid):
+        """
+        Returns the consensus of a person's data oligos with missing ones
+        recovered by the outer code, or None if too few are known
+        """
+        k = self.lengths.get(pid)
+        if k is None:
+            return None
+        ramdict = {pid: dict(self.consensus.get(pid, {}))}
+        recover_oligos(ramdict, dict(self.manifest, persons={pid: k}))
+        oligos = ramdict[pid]
+        oids = ["%03d" % x for x in xrange(k)]
+        chunksize = self.manifest['chunksize']
+        if not all(len(oligos.get(oid, "")) == chunksize for oid in oids):
+            return None
+        return [oligos[oid] for oid in oids]
+
+    def complete(self, pid):
+        """
+        Returns the consensus of all of a person's data oligos, or None if
+        the profile is not complete yet
+        """
+        if self.manifest:
+            return self.recovered(pid)
+        found = self.contiguous(pid)
+        if not found:
+            return None
+        if self.lengths is not None:
+            k = self.lengths.get(pid)
+            if k is None or len(found) < k:
+                return None
+            return found[:k]
+        # without the number of oligos, a later data oligo with a
+        # consensus means one in between is still missing
+        for oid in self.consensus[pid]:
+            if len(found) <= int(oid) < PARITY_FLOOR:
+                return None
+        return found
+
+    def is_decodable(self, pid):
+        """
+        Returns True if all of a person's data oligos have a consensus
+        """
+        return self.complete(pid) is not None
+
+    def decodable(self):
+        """
+        Returns the sorted IDs of the persons that are decodable so far
+        """
+        return sorted(pid for pid in self.consensus if self.is_decodable(pid))
+
+    def dna(self, pid):
+        return "".join(self.complete(pid) or self.contiguous(pid))
+
+    def text(self, pid):
+        return self.tfunc(self.dna(pid))
+
+def batches(records, batchsize):
+    """
+    Generator that yields lists of batchsize records. The records read
+    before a KeyboardInterrupt are yielded before it is raised again.
+    """
+    while True:
+        batch = []
+        try:
+            batch.extend(islice(records, batchsize))
+        except KeyboardInterrupt as interrupt:
+            if batch:
+                yield batch
+            raise interrupt
+        if not batch:
+            return
+        yield batch
+
+def follow(source, decoder, interval=10.0, idle=None, batchsize=10000,
+           callback=None):
+    """
+    Polls source for new reads every interval seconds and updates the
+    decoder. callback(decoder, changed persons) is called after each update
+    that saw new reads. Stops after idle seconds without new reads (never if
+    idle is None) or on KeyboardInterrupt, even during a poll or update,
+    then reads what is left and updates the decoder a last time.
+    """
+    lastread = time.time()
+    final = False
+    while True:
+        try:
+            got = 0
+            for batch in batches(source.poll(final), batchsize):
+                decoder.add_reads(batch)
+                got += len(batch)
+            # reads sorted before an interrupt are still waiting for update
+            if got or decoder.changed:
+                lastread = time.time()
+                changed = decoder.update()
+                if callback:
+                    callback(decoder, changed)
+            if final:
+                return decoder
+            if idle is not None and time.time() - lastread >= idle:
+                final = True
+            else:
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            # a second interrupt stops the final pass too
+            if final:
+                raise
+            final = True
+
+def write_person(decoder, pid, outdir):
+    """
+    Writes the condensed DNA and translated text of a decodable person
+    """
+    dna = decoder.dna(pid)
+    with open(os.path.join(outdir, pid + "_condensed.txt"), "w") as condfile:
+        condfile.write(dna)
+    with open(os.path.join(outdir, pid + "_translated.txt"), "w") as endfile:
+        endfile.write(decoder.tfunc(dna) + "\n")
+
+def main():
+
+    parser = ArgumentParser()
+
+    parser.add_argument("source",help="growing FASTQ file, or directory of FASTQ chunks")
+    parser.add_argument("--outdir",default="livedna",help="directory for decoded output")
+    parser.add_argument("--scheme",choices=sorted(schemes),default="codon",help="DNA encoding scheme")
+    parser.add_argument("--threshold",type=int,default=COUNT_THRESHOLD,help="minimum base count for a consensus position")
+    parser.add_argument("--maxlen",type=int,default=MAXLEN,help="maximum tag and message length in bases")
+    parser.add_argument("--no-strand",dest="strand",action="store_false",help="do not look for tags on the reverse strand")
+    parser.add_argument("--interval",type=float,default=10.0,help="seconds between polls")
+    parser.add_argument("--idle",type=float,help="stop after this many seconds without new reads")
+    parser.add_argument("--batch-size",type=int,default=10000,help="reads sorted per batch")
+    parser.add_argument("--dictionary",help="preset dictionary the profiles were compressed with")
+    parser.add_argument("--order",metavar="ORDERFILE",help="chunker order file, for the number of oligos of each person")
+    parser.add_argument("--outer-code",metavar="MANIFEST",help="recover missing oligos with the parity oligos described in this outer code manifest")
+
+    args = parser.parse_args()
+
+    try:
+        os.makedirs(args.outdir)
+    except OSError as exception:
+        if exception.errno != errno.EEXIST:
+            raise
+
+    source = open_source(args.source)
+    dictionary = None
+    if args.dictionary:
+        from compression import read_dictionary
+        dictionary = read_dictionary(args.dictionary)
+    lengths = None
+    manifest = None
+    if args.outer_code:
+        manifest = read_manifest(args.outer_code)
+    elif args.order and os.path.exists(args.order + MANIFEST_SUFFIX):
+        manifest = read_manifest(args.order + MANIFEST_SUFFIX)
+    elif args.order:
+        lengths = order_lengths(args.order, args.scheme)
+    if manifest and manifest['scheme'] != args.scheme:
+        parser.error("The outer code manifest is for the %s scheme" % manifest['scheme'])
+    decoder = LiveDecoder(args.scheme, args.threshold, args.strand, args.maxlen,
+                          dictionary=dictionary, lengths=lengths, manifest=manifest)
+
+    def report(decoder, changed):
+        ready = decoder.decodable()
+        for pid in sorted(changed):
+            if pid in ready:
+                write_person(decoder, pid, args.outdir)
+        print "%d reads, %d persons updated, %d decodable: %s" % (
+            decoder.reads, len(changed), len(ready), " ".join(ready))
+        sys.stdout.flush()
+
+    try:
+        follow(source, decoder, args.interval, args.idle, args.batch_size, report)
+    finally:
+        source.close()
+
+    print "Stopped following %s. Decoded persons are in %s." % (args.source, args.outdir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+
+"""
+Adapter-aware decoding of chunker output and sequencing reads
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Oligos from the chunkers have the layout written by stuff_ends:
+
+    universalA + tag + chunk + RC_universalB + AA
+
+Instead of trimming the adapters by hand into an intermediate file, each
+line is decoded in a single pass:
+
+1. universalA and RC_universalB are located and stripped if present
+2. the reading frame is set by the start of the tag
+3. the payload is trimmed to whole codons (4 bases) or bytes (8 bases)
+   and translated
+
+With --detect-frame, codon lines without a recognisable tag are decoded in
+the reading frame that gives the most plausible text (see frame_detect.py)
+instead of being skipped.
+
+Steps to replicate:
+$ python arraychunker.py infile.fasta outfile.txt 76 76 TGAC
+$ python oligo_decode.py outfile.txt trans.txt --scheme codon
+
+$ python binarraychunker.py infile.fasta outfile.txt 48 48 ACGACTGT
+$ python oligo_decode.py outfile.txt trans.txt --scheme binary
+
+FASTQ reads (plain or gzipped) are decoded with --fastq.
+"""
+
+import re, gzip
+from argparse import ArgumentParser
+
+MIN_FRAME_SCORE = 2.0   # mean character score to accept a detected frame
+
+universalA = "CTACACGACGCTCTTCCGATCT"
+RC_universalB = "AGATCGGAAGAGCGGTTCAGCA"
+
+# Tag patterns for each encoding. Binary tags are matched on bits, since
+# each bit may be written as either of two bases.
+schemes = {'codon':  {'unitsize': 4,
+                      'taglen': 28,
+                      'tagpattern': re.compile('TGTC[ACGT]{8}TGAT[ACGT]{12}')},
+           'binary': {'unitsize': 8,
+                      'taglen': 56,
+                      'tagpattern': re.compile('[AC][AC][GT][AC][AC][AC][GT][GT][ACGT]{16}'
+                                               '[AC][AC][GT][AC][AC][GT][AC][AC][ACGT]{24}')}}
+
+def get_translator(scheme):
+    """
+    Returns the DNA to text function for an encoding scheme
+    """
+    if scheme == 'codon':
+        from ASCIIcodons import DNAToText
+        return DNAToText().dna_to_text
+    elif scheme == 'binary':
+        from binaryDNA import DNAToBinaryText
+        return DNAToBinaryText().dna_to_text
+    raise ValueError("Unknown encoding scheme %s" % scheme)
+
+def strip_adapters(seq):
+    """
+    Removes universalA and RC_universalB (and anything outside of them)
+    from a sequence. Adapters that are not found are left alone.
+    """
+    start = seq.find(universalA)
+    if start < 0:
+        start = 0
+    else:
+        start += len(universalA)
+    end = seq.find(RC_universalB, start)
+    if end < 0:
+        end = len(seq)
+    return seq[start:end]
+
+def frame_payload(seq, scheme='codon'):
+    """
+    Strips adapters from a sequence and returns the payload starting at the
+    tag and trimmed to whole codons or bytes, or None if no tag is found
+    """
+    params = schemes[scheme]
+    payload = strip_adapters(seq)
+    findtag = params['tagpattern'].search(payload)
+    if not findtag:
+        return None
+    payload = payload[findtag.start():]
+    unitsize = params['unitsize']
+    return payload[:len(payload) - len(payload) % unitsize]
+
+def detect_frame(seq):
+    """
+    Returns the text of the best scoring reading frame of a codon sequence
+    without adapters, or None if no frame looks like text
+    """
+    from frame_detect import best_frame
+    frame, text, score = best_frame(strip_adapters(seq))
+    if score < MIN_FRAME_SCORE:
+        return None
+    return text
+
+def decode_lines(lines, tfunc, scheme='codon', detect=False):
+    """
+    Generator that yields the decoded text of each line, or None for lines
+    without a tag. With detect set, codon lines without a tag are decoded
+    in their best reading frame instead.
+    """
+    detect = detect and scheme == 'codon'
+    for line in lines:
+        payload = frame_payload(line.strip(), scheme)
+        if payload is not None:
+            yield tfunc(payload)
+        elif detect:
+            yield detect_frame(line.strip())
+        else:
+            yield None
+
+def read_seqs(infile, fastq=False):
+    """
+    Generator that yields the sequences of a chunker output file or, with
+    fastq set, of a FASTQ file
+    """
+    if fastq:
+        import parse_fastq
+        for rec in parse_fastq.readFastq(infile):
+            yield rec[1]
+    else:
+        for line in infile:
+            if line.strip():
+                yield line
+
+def decode_file(infile, outfile, scheme='codon', fastq=False, detect=False):
+    """
+    Decodes chunker output or reads from infile into text in outfile in a
+    single pass. Lines without a tag are skipped, unless detect is set and
+    a reading frame decodes them to plausible text. Returns a tuple of
+    (decoded, skipped) line counts.
+    """
+    tfunc = get_translator(scheme)
+    if infile.endswith('.gz'):
+        template = gzip.open(infile)
+    else:
+        template = open(infile)
+
+    decoded = skipped = 0
+    with open(outfile, "w") as newfile:
+        for text in decode_lines(read_seqs(template, fastq), tfunc, scheme, detect):
+            if text is None:
+                skipped += 1
+                continue
+            newfile.write(text + "\n")
+            decoded += 1
+    template.close()
+    return decoded, skipped
+
+def main():
+
+    parser = ArgumentParser()
+
+    parser.add_argument("infile",metavar="in",help="chunker output or FASTQ file")
+    parser.add_argument("outfile",metavar="out",help="name of output text file")
+    parser.add_argument("--scheme",choices=sorted(schemes),default="codon",help="DNA encoding scheme")
+    parser.add_argument("--fastq",action="store_true",help="input is a FASTQ file")
+    parser.add_argument("--detect-frame",dest="detect",action="store_true",help="decode codon lines without a tag in their best reading frame")
+    parser.add_argument("--cache-dir",help="reuse output cached for the same input in this directory")
+
+    args = parser.parse_args()
+
+    if args.cache_dir:
+        from result_cache import ResultCache, cached_file_stage
+        decoded, skipped = cached_file_stage(ResultCache(args.cache_dir), "oligo_decode.decode_file",
+                                             decode_file, args.infile, args.outfile,
+                                             args.scheme, args.fastq, args.detect)
+    else:
+        decoded, skipped = decode_file(args.infile, args.outfile, args.scheme, args.fastq,
+                                       args.detect)
+
+    print "Decoded %d lines, skipped %d lines without a tag" % (decoded, skipped)
+    print "See " + args.outfile + " for results."
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+
+"""
+Quality control of CustomArray oligo orders
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Checks every oligo produced by the chunkers (arraychunker.py or
+binarraychunker.py) before ordering:
+
+- GC content of the full oligo
+- longest homopolymer run
+- whether the tag is unique, and how many of the payload k-mers also
+  occur in other oligos
+
+Each oligo has the layout written by stuff_ends:
+
+    universalA (22) + tag + chunk + RC_universalB (22) + AA
+
+The tag is 28 bases for codons and 56 bases for binary.
+
+Tags share their person and oligo digits with many other tags, so tags
+are counted whole and exactly. Payload k-mers are counted in a hashed
+table sized from the number of k-mers in the library, so the library is
+read three times (to size the table, to count, and to report) and oligos
+are never compared pairwise.
+
+Some sharing is by design and is not counted: the first overlap bases of
+each chunk repeat the end of the chunk before it (chunksize - stepsize
+bases), and the last chunk of each person is padded with repeats of the
+stuffer sequence.
+
+Steps to replicate:
+$ python oligo_qc.py outfile.txt --taglen 28 --overlap 30 --stuffer TGAC
+"""
+
+import re, math
+from argparse import ArgumentParser
+
+ADAPTLEN = 22                   # length of universalA and RC_universalB
+TAILLEN = ADAPTLEN + 2          # RC_universalB plus the AA padding
+SLOTS_PER_KMER = 8              # a unique k-mer collides about 1 time in 8
+MIN_BITS = 16
+
+homopolymers = re.compile('A+|C+|G+|T+')
+
+def gc_content(seq):
+    """
+    Returns the fraction of G and C bases in seq
+    """
+    if not seq:
+        return 0.0
+    return float(seq.count('G') + seq.count('C')) / len(seq)
+
+def max_homopolymer(seq):
+    """
+    Returns the length of the longest single-base run in seq
+    """
+    runs = homopolymers.findall(seq)
+    if not runs:
+        return 0
+    return max(map(len, runs))
+
+def split_oligo(oligo, taglen):
+    """
+    Splits a chunker oligo into its tag and payload
+    """
+    start = ADAPTLEN + taglen
+    return oligo[ADAPTLEN:start], oligo[start:-TAILLEN]
+
+def table_bits(nkmers):
+    """
+    Returns the log2 size of a k-mer table with SLOTS_PER_KMER slots for
+    each of nkmers k-mers
+    """
+    return max(MIN_BITS, int(math.ceil(math.log(max(1, nkmers * SLOTS_PER_KMER), 2))))
+
+def stuffer_kmers(stuffer, k):
+    """
+    Returns the set of k-mers of a run of repeated stuffer sequence
+    """
+    if not stuffer:
+        return set()
+    run = stuffer * (k // len(stuffer) + 2)
+    return set(run[i:i+k] for i in xrange(len(stuffer)))
+
+class KmerIndex:
+    """
+    Hashed k-mer count table. Counts saturate at 255, and distinct k-mers
+    may share a slot, so counts are an upper bound. Larger tables (more
+    bits) give fewer false collisions.
+    K-mers lying within the first skip bases of a sequence, or in the
+    ignore set, are neither counted nor scored.
+    """
+
+    def __init__(self, k, bits=24, skip=0, ignore=()):
+        self.k = k
+        self.mask = (1 << bits) - 1
+        self.table = bytearray(1 << bits)
+        self.skip = skip
+        self.ignore = ignore
+
+    def slots(self, seq):
+        """
+        Returns the set of hashed slots of the counted k-mers of seq
+        """
+        k = self.k
+        mask = self.mask
+        ignore = self.ignore
+        first = max(0, self.skip - k + 1)
+        kmers = set(seq[i:i+k] for i in xrange(first, len(seq) - k + 1))
+        return set(hash(kmer) & mask for kmer in kmers if kmer not in ignore)
+
+    def add(self, seq):
+        """
+        Counts each distinct k-mer of seq once
+        """
+        table = self.table
+        for slot in self.slots(seq):
+            if table[slot] < 255:
+                table[slot] += 1
+
+    def shared(self, seq):
+        """
+        Returns the fraction of k-mers in seq that also occur elsewhere in
+        the library. seq must already have been added to the index.
+        """
+        slots = self.slots(seq)
+        if not slots:
+            return 0.0
+        table = self.table
+        return float(sum(1 for slot in slots if table[slot] > 1)) / len(slots)
+
+def read_oligos(infile):
+    """
+    Generator that yields the oligos in a chunker output file
+    """
+    for line in infile:
+        oligo = line.strip()
+        if oligo:
+            yield oligo
+
+def check_library(path, taglen, k=12, bits=None, mingc=0.3, maxgc=0.7,
+                  maxhomo=6, maxshared=0.5, overlap=0, stuffer=None):
+    """
+    Computes QC metrics for every oligo in the chunker output file at path.
+    bits is the log2 size of the payload k-mer table, by default sized
+    from the library. overlap is the number of bases each chunk shares
+    with the chunk before it, and stuffer the padding sequence, whose
+    k-mers are expected to repeat and are not counted as shared.
+    Returns a tuple (summary, violations) where violations is a list of
+    (line number, oligo, list of failed checks).
+    """
+    tags = {}
+    nkmers = 0
+
+    # first pass: count tags exactly and size the payload k-mer table
+    with open(path) as infile:
+        for oligo in read_oligos(infile):
+            tag, payload = split_oligo(oligo, taglen)
+            tags[tag] = tags.get(tag, 0) + 1
+            nkmers += max(0, len(payload) - k + 1)
+
+    payindex = KmerIndex(k, bits or table_bits(nkmers), overlap,
+                         stuffer_kmers(stuffer, k))
+
+    # second pass: build the payload k-mer index
+    with open(path) as infile:
+        for oligo in read_oligos(infile):
+            payindex.add(split_oligo(oligo, taglen)[1])
+
+    summary = {'oligos': 0,
+               'violations': 0,
+               'mingc': None,
+               'maxgc': None,
+               'maxhomopolymer': 0}
+    violations = []
+
+    # third pass: score each oligo against the indexes
+    with open(path) as infile:
+        for lineno, oligo in enumerate(read_oligos(infile)):
+            tag, payload = split_oligo(oligo, taglen)
+            gc = gc_content(oligo)
+            homo = max_homopolymer(oligo)
+            payshared = payindex.shared(payload)
+
+            failed = []
+            if gc < mingc or gc > maxgc:
+                failed.append("gc=%.2f" % gc)
+            if homo > maxhomo:
+                failed.append("homopolymer=%d" % homo)
+            if tags[tag] > 1:
+                failed.append("duplicate tag")
+            if payshared > maxshared:
+                failed.append("payload kmers shared=%.2f" % payshared)
+            if failed:
+                violations.append((lineno, oligo, failed))
+
+            summary['oligos'] += 1
+            if summary['mingc'] is None or gc < summary['mingc']:
+                summary['mingc'] = gc
+            if summary['maxgc'] is None or gc > summary['maxgc']:
+                summary['maxgc'] = gc
+            summary['maxhomopolymer'] = max(summary['maxhomopolymer'], homo)
+
+    summary['violations'] = len(violations)
+    return summary, violations
+
+def main():
+
+    parser = ArgumentParser()
+
+    parser.add_argument("infile",metavar="in",help="chunker output file of oligos")
+    parser.add_argument("--taglen",type=int,default=28,help="tag length in bp (28 codon, 56 binary)")
+    parser.add_argument("--k",type=int,default=12,help="k-mer length for uniqueness checks")
+    parser.add_argument("--bits",type=int,help="log2 size of the hashed k-mer table (default: sized from the library)")
+    parser.add_argument("--mingc",type=float,default=0.3,help="minimum GC fraction")
+    parser.add_argument("--maxgc",type=float,default=0.7,help="maximum GC fraction")
+    parser.add_argument("--maxhomo",type=int,default=6,help="maximum homopolymer length")
+    parser.add_argument("--maxshared",type=float,default=0.5,help="maximum fraction of payload k-mers shared with other oligos")
+    parser.add_argument("--overlap",type=int,default=0,help="bases each chunk repeats from the chunk before it (chunksize - stepsize)")
+    parser.add_argument("--stuffer",help="stuffer sequence padding the last chunk of each person")
+
+    args = parser.parse_args()
+
+    summary, violations = check_library(args.infile, args.taglen, args.k, args.bits,
+                                        args.mingc, args.maxgc, args.maxhomo,
+                                        args.maxshared, args.overlap, args.stuffer)
+
+    for lineno, oligo, failed in violations:
+        print "%d\t%s\t%s" % (lineno + 1, oligo, ", ".join(failed))
+
+    print "Checked %d oligos, %d with violations" % (summary['oligos'], summary['violations'])
+    print "GC content ranged from %.2f to %.2f" % (summary['mingc'] or 0.0, summary['maxgc'] or 0.0)
+    print "Longest homopolymer was %d bases" % summary['maxhomopolymer']
+
+if __name__ == "__main__":
+    main()
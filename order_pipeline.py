@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+
+"""
+Encodes, chunks and verifies an array order in a single pass
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Each record (one person's profile) is translated to DNA, split into
+chunks, padded with the tag and adapters by stuff_ends, and written to the
+order file. Before moving to the next record, every oligo is decoded back
+the way oligo_decode.py reads it: adapters stripped, reading frame set at
+the tag, tag checked against the person and oligo IDs, and the chunks
+reassembled and compared with the encoded DNA (and with the original text
+when the input is text). Only the order file (and optionally a check file
+of decoded oligos) is written.
+
+>>> from order_pipeline import build_order, read_text_records
+>>> report = build_order(read_text_records("profiles.txt"), "order.txt", "codon")
+>>> report['mismatches']
+[]
+
+With a compression.Compressor, each profile is compressed before it is
+encoded, and the round trip check also decompresses it back to the text.
+
+Steps to replicate:
+$ python order_pipeline.py profiles.txt order.txt --scheme codon
+$ python order_pipeline.py infile.fasta order.txt --scheme binary --fasta
+$ python order_pipeline.py profiles.txt order.txt --compress zlib --dictionary profiles.dict
+"""
+
+from argparse import ArgumentParser
+
+import arraychunker, binarraychunker
+from oligo_decode import schemes, get_translator, frame_payload
+
+# chunker settings for each scheme, as given in the README
+defaults = {'codon':  {'chunker': arraychunker,
+                       'stepsize': 76, 'chunksize': 76, 'stuffer': 'TGAC'},
+            'binary': {'chunker': binarraychunker,
+                       'stepsize': 48, 'chunksize': 48, 'stuffer': 'ACGACTGT'}}
+
+def get_encoder(scheme):
+    """
+    Returns the text to DNA function for an encoding scheme
+    """
+    if scheme == 'codon':
+        from ASCIIcodons import TextToDNA
+        return TextToDNA().text_to_dna
+    elif scheme == 'binary':
+        from binaryDNA import BinaryTextToDNA
+        return BinaryTextToDNA().text_to_dna
+    raise ValueError("Unknown encoding scheme %s" % scheme)
+
+def read_text_records(path):
+    """
+    Generator that yields (name, text) for each line of a text file, one
+    person per line
+    """
+    with open(path) as infile:
+        for num, line in enumerate(infile):
+            text = line.rstrip("\r\n")
+            if text:
+                yield "person%d" % num, text
+
+def read_fasta_records(path):
+    """
+    Generator that yields (name, dna) for each record of a FASTA file
+    """
+    with open(path) as infile:
+        for name, seq in arraychunker.process_seq(infile):
+            yield name, seq
+
+def reassemble(chunks, stepsize, length):
+    """
+    Rebuilds a DNA sequence of the given length from overlapping chunks
+    taken every stepsize bases
+    """
+    pieces = [chunk[:stepsize] for chunk in chunks[:-1]]
+    if chunks:
+        pieces.append(chunks[-1])
+    return ''.join(pieces)[:length]
+
+def verify_oligos(oligos, pid, dna, scheme, stepsize, tfunc):
+    """
+    Decodes a record's oligos and checks their tags and payloads against
+    the encoded DNA. Returns a tuple of (ok, decoded text of each oligo).
+    """
+    taglen = schemes[scheme]['taglen']
+    chunks = []
+    decoded = []
+    ok = True
+    for oid, oligo in enumerate(oligos):
+        payload = frame_payload(oligo, scheme)
+        if payload is None:
+            return False, decoded
+        text = tfunc(payload)
+        decoded.append(text)
+        if text[:7] != "#%02d$%03d" % (pid, oid):
+            ok = False
+        chunks.append(payload[taglen:])
+    return ok and reassemble(chunks, stepsize, len(dna)) == dna, decoded
+
+def verify_parity(chunks, parityoligos, pid, scheme, tfunc):
+    """
+    Checks the tags of a record's outer code parity oligos and that they
+    recover its first data chunks when those are left out
+    """
+    from outer_code import parity_oids, parity_x, recover
+    taglen = schemes[scheme]['taglen']
+    known = dict(enumerate(tfunc(chunk) for chunk in chunks))
+    data = [known[x] for x in xrange(len(chunks))]
+    for index, (oid, oligo) in enumerate(zip(parity_oids(len(parityoligos)), parityoligos)):
+        payload = frame_payload(oligo, scheme)
+        if payload is None:
+            return False
+        text = tfunc(payload)
+        if text[:7] != "#%02d$%03d" % (pid, oid):
+            return False
+        known[parity_x(index)] = tfunc(payload[taglen:])
+    for x in xrange(min(len(parityoligos), len(chunks))):
+        del known[x]
+    return recover(known, len(chunks)) == data
+
+def build_order(records, orderfile, scheme='codon', stepsize=None,
+                chunksize=None, stuffer=None, encoded=False, verify=True,
+                checkfile=None, parity=0, compressor=None):
+    """
+    Encodes, chunks and verifies records in one pass, writing the oligos to
+    orderfile.
+    Input:
+        records   - iterable of (name, text), or (name, dna) if encoded
+        orderfile - name of the order file to write
+        scheme    - 'codon' or 'binary'
+        stepsize, chunksize, stuffer - chunker settings, by default those
+                    of the scheme
+        checkfile - optional file for the decoded text of each oligo
+        parity    - number of outer code parity oligos per record, with
+                    a manifest written to orderfile + MANIFEST_SUFFIX
+                    (see outer_code.py)
+        compressor - optional compression.Compressor applied to each
+                    text record before it is encoded
+    Output:
+        Dictionary with the number of records and oligos written and the
+        names of records that did not round trip, and the text and
+        compressed sizes if a compressor is given
+    """
+    settings = defaults[scheme]
+    chunker = settings['chunker']
+    stepsize = stepsize or settings['stepsize']
+    chunksize = chunksize or settings['chunksize']
+    stuffer = stuffer or settings['stuffer']
+    if stepsize > chunksize:
+        raise IOError("Stepsize must be smaller than chunk size to allow for overlap")
+    if compressor and encoded:
+        raise ValueError("Only text records can be compressed")
+
+    encode = None if encoded else get_encoder(scheme)
+    tfunc = get_translator(scheme) if verify else None
+
+    report = {'records': 0, 'oligos': 0, 'mismatches': []}
+    if compressor:
+        report['text bytes'] = report['compressed bytes'] = 0
+    manifest = {}
+    check = open(checkfile, "w") if checkfile else None
+    with open(orderfile, "w") as out:
+        for pid, (name, data) in enumerate(records):
+            if encoded:
+                dna = data
+            elif compressor:
+                packed = compressor.compress(data)
+                report['text bytes'] += len(data)
+                report['compressed bytes'] += len(packed)
+                dna = encode(packed)
+            else:
+                dna = encode(data)
+            chunklist = chunker.get_chunks(dna, stepsize, chunksize, stuffer)
+            oligos = chunker.stuff_ends(chunklist, chunksize, pid)
+            parityoligos = chunker.add_parity(chunklist, chunksize, pid, parity, manifest)
+
+            if verify:
+                ok, decoded = verify_oligos(oligos, pid, dna, scheme, stepsize, tfunc)
+                if ok and compressor:
+                    from compression import decompress
+                    ok = decompress(tfunc(dna), compressor.dictionary) == data
+                elif ok and not encoded:
+                    ok = tfunc(dna) == data
+                if ok and parity:
+                    ok = verify_parity(chunklist, parityoligos, pid, scheme, tfunc)
+                if not ok:
+                    report['mismatches'].append(name)
+                if check:
+                    check.write(''.join(text + "\n" for text in decoded))
+
+            oligos += parityoligos
+            out.write(''.join(oligo + "\n" for oligo in oligos))
+            report['records'] += 1
+            report['oligos'] += len(oligos)
+    if check:
+        check.close()
+    if parity:
+        from outer_code import MANIFEST_SUFFIX, write_manifest
+        write_manifest(orderfile + MANIFEST_SUFFIX, scheme, parity, chunksize, manifest)
+    return report
+
+def main():
+
+    parser = ArgumentParser()
+
+    parser.add_argument("infile",metavar="in",help="text file with one profile per line, or FASTA with --fasta")
+    parser.add_argument("outfile",metavar="out",help="name of order file")
+    parser.add_argument("--scheme",choices=sorted(schemes),default="codon",help="DNA encoding scheme")
+    parser.add_argument("--fasta",action="store_true",help="input is a FASTA file of already encoded DNA")
+    parser.add_argument("--step",type=int,help="stepsize for chunk overlap")
+    parser.add_argument("--chunk",type=int,help="length of chunks in bp")
+    parser.add_argument("--stuffer",help="stuffer sequence")
+    parser.add_argument("--check",help="write the decoded text of each oligo to this file")
+    parser.add_argument("--parity",type=int,default=0,help="outer code parity oligos per record, with a manifest written to OUTFILE.rs.json")
+    parser.add_argument("--compress",choices=["zlib","bz2","lzma"],help="compress each profile before encoding it")
+    parser.add_argument("--level",type=int,default=9,help="with --compress, compression level from 1 to 9")
+    parser.add_argument("--dictionary",help="with --compress zlib, preset dictionary file from compression.py train")
+    parser.add_argument("--no-verify",dest="verify",action="store_false",help="skip the round trip check")
+
+    args = parser.parse_args()
+
+    compressor = None
+    if args.compress:
+        from compression import Compressor, read_dictionary
+        dictionary = read_dictionary(args.dictionary) if args.dictionary else None
+        try:
+            compressor = Compressor(args.compress, args.level, dictionary)
+        except ValueError as error:
+            parser.error(str(error))
+    elif args.dictionary:
+        parser.error("--dictionary needs --compress zlib")
+    if compressor and args.fasta:
+        parser.error("--compress needs text input")
+
+    if args.fasta:
+        records = read_fasta_records(args.infile)
+    else:
+        records = read_text_records(args.infile)
+
+    report = build_order(records, args.outfile, args.scheme, args.step, args.chunk,
+                         args.stuffer, args.fasta, args.verify, args.check, args.parity,
+                         compressor)
+
+    print "Wrote %d oligos for %d records to %s" % (report['oligos'], report['records'], args.outfile)
+    if compressor:
+        print "Compressed %d bytes of text to %d bytes" % (report['text bytes'], report['compressed bytes'])
+    if not args.verify:
+        return
+    if report['mismatches']:
+        print "Round trip FAILED for: %s" % ", ".join(report['mismatches'])
+    else:
+        print "Round trip matched for all records."
+
+if __name__ == "__main__":
+    main()
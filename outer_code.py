@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+
+"""
+Reed-Solomon outer code across the oligos of each person
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+An oligo that falls below the count threshold, or is never sequenced,
+leaves a gap that truncates the person's profile in condense. With an
+outer code, the chunker adds nparity parity oligos to each person's k data
+oligos, and any k of the k + nparity oligos recover all of the data.
+
+The code works column by column over GF(256): byte c of the payload of
+every oligo is one codeword. It is in evaluation form, so data oligo i
+holds the values at x = i of the polynomial of degree < k through the
+data, and parity oligo j (oligo ID 999 - j) holds its values at
+x = 255 - j. A missing oligo is recovered from any k known ones by Lagrange
+interpolation:
+
+    y(x) = sum over i of y_i * prod over j != i of (x - x_j) / (x_i - x_j)
+
+The coefficient of each known oligo is a single field element, so the
+recovered payload is a sum of whole payloads scaled by constants. Scaling
+a payload is one str.translate through that constant's 256-byte
+multiplication table, and addition in GF(256) is XOR, done on the payloads
+as long integers, so no step loops over the columns in Python.
+
+The chunker writes a manifest next to the order file with the number of
+data oligos of each person, so the decoder knows which are missing even
+at the end of a profile.
+
+Steps to replicate:
+$ python order_pipeline.py profiles.txt order.txt --parity 4
+$ python get_unique_oligos.py merged.fastq.gz --outer-code order.txt.rs.json
+"""
+
+import os, json
+from binascii import hexlify, unhexlify
+
+PARITY_OID = 999        # oligo ID of the first parity oligo, counting down
+MANIFEST_SUFFIX = ".rs.json"
+POLY = 0x11d            # x^8 + x^4 + x^3 + x^2 + 1, with 2 as generator
+
+# exponent and logarithm tables of GF(256), with the exponents repeated so
+# that a product never needs a modulo
+EXP = [0] * 512
+LOG = [0] * 256
+_value = 1
+for _power in xrange(255):
+    EXP[_power] = _value
+    LOG[_value] = _power
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= POLY
+for _power in xrange(255, 512):
+    EXP[_power] = EXP[_power - 255]
+
+def gf_mul(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return EXP[LOG[a] + LOG[b]]
+
+def gf_div(a, b):
+    if b == 0:
+        raise ZeroDivisionError("division by zero in GF(256)")
+    if a == 0:
+        return 0
+    return EXP[LOG[a] + 255 - LOG[b]]
+
+_mul_tables = {}
+
+def mul_table(scalar):
+    """
+    Returns the str.translate table that multiplies every byte by scalar
+    """
+    table = _mul_tables.get(scalar)
+    if table is None:
+        table = "".join(chr(gf_mul(scalar, byte)) for byte in xrange(256))
+        _mul_tables[scalar] = table
+    return table
+
+def scale(payload, scalar):
+    """
+    Returns a payload with every byte multiplied by scalar in GF(256)
+    """
+    if scalar == 1:
+        return payload
+    return payload.translate(mul_table(scalar))
+
+def add(payloads, size):
+    """
+    Returns the sum (XOR) of payloads of size bytes each
+    """
+    total = 0
+    for payload in payloads:
+        total ^= long(hexlify(payload), 16)
+    return unhexlify("%0*x" % (2 * size, total))
+
+def lagrange(xs, x):
+    """
+    Returns the coefficient of each of the points xs in the value at x of
+    the polynomial through them
+    """
+    coefficients = []
+    for i, xi in enumerate(xs):
+        num = den = 1
+        for j, xj in enumerate(xs):
+            if j != i:
+                num = gf_mul(num, x ^ xj)
+                den = gf_mul(den, xi ^ xj)
+        coefficients.append(gf_div(num, den))
+    return coefficients
+
+def interpolate(points, x):
+    """
+    Returns the payload at x of the code through the (x, payload) points
+    """
+    xs = [xi for xi, payload in points]
+    size = len(points[0][1])
+    return add([scale(payload, coefficient) for (xi, payload), coefficient
+                in zip(points, lagrange(xs, x))], size)
+
+def parity_x(index):
+    return 255 - index
+
+def parity_oids(nparity):
+    """
+    Returns the oligo IDs of nparity parity oligos
+    """
+    return [PARITY_OID - index for index in xrange(nparity)]
+
+def encode_parity(payloads, nparity):
+    """
+    Returns nparity parity payloads for a list of equal-length data payloads
+    """
+    if len(payloads) + nparity > 256:
+        raise ValueError("At most 256 data and parity oligos fit in GF(256), got %d"
+                         % (len(payloads) + nparity))
+    if len(set(map(len, payloads))) > 1:
+        raise ValueError("Data payloads must all be the same length")
+    points = list(enumerate(payloads))
+    return [interpolate(points, parity_x(index)) for index in xrange(nparity)]
+
+def recover(known, k):
+    """
+    Returns the k data payloads of a codeword from a dictionary of the
+    known payloads by x, or None if fewer than k are known
+    """
+    if len(known) < k:
+        return None
+    missing = [x for x in xrange(k) if x not in known]
+    if not missing:
+        return [known[x] for x in xrange(k)]
+    # data points sort before parity points, so as few as possible are used
+    points = sorted(known.items())[:k]
+    data = [known.get(x) for x in xrange(k)]
+    for x in missing:
+        data[x] = interpolate(points, x)
+    return data
+
+def get_codec(scheme):
+    """
+    Returns the (text to DNA, DNA to text) functions of an encoding scheme
+    """
+    from order_pipeline import get_encoder
+    from oligo_decode import get_translator
+    return get_encoder(scheme), get_translator(scheme)
+
+def parity_chunks(chunks, nparity, scheme):
+    """
+    Returns the DNA of nparity parity chunks for a person's data chunks
+    """
+    encode, decode = get_codec(scheme)
+    parity = [encode(payload) for payload in
+              encode_parity([decode(chunk) for chunk in chunks], nparity)]
+    if parity and len(parity[0]) != len(chunks[0]):
+        raise ValueError("Chunk size must be a whole number of encoded characters")
+    return parity
+
+def write_manifest(path, scheme, nparity, chunksize, counts, merge=False):
+    """
+    Writes the outer code manifest, with the number of data oligos of each
+    person ID in counts. With merge, the persons of an existing manifest at
+    path are kept unless counts replaces them, and its scheme, parity and
+    chunk size must match.
+    """
+    manifest = {'scheme': scheme, 'parity': nparity, 'chunksize': chunksize,
+                'persons': dict(("%02d" % pid, k) for pid, k in counts.items())}
+    if merge and os.path.exists(path):
+        old = read_manifest(path)
+        for key in ('scheme', 'parity', 'chunksize'):
+            if old[key] != manifest[key]:
+                raise ValueError("Manifest %s has %s %s, not %s"
+                                 % (path, key, old[key], manifest[key]))
+        old['persons'].update(manifest['persons'])
+        manifest['persons'] = old['persons']
+    with open(path, "w") as out:
+        json.dump(manifest, out, indent=2, sort_keys=True)
+
+def read_manifest(path):
+    with open(path) as infile:
+        return json.load(infile)
+
+def recover_oligos(ramdict, manifest, metrics=None):
+    """
+    Replaces missing data oligos in a get_consensus result with oligos
+    recovered from the parity oligos, and removes the parity oligos and any
+    oligo ID past the data oligos, such as one from a miscalled tag, so only
+    the k data oligos of each person are left.
+    Oligos whose consensus is not the full chunk length count as missing.
+    If metrics is given, persons are counted under the "outer code" stage,
+    persons with too few oligos left are rejected as "unrecoverable", and
+    recovered oligos are counted under "outer code recovered".
+    """
+    encode, decode = get_codec(manifest['scheme'])
+    nparity = manifest['parity']
+    chunksize = manifest['chunksize']
+    for pid, k in sorted(manifest['persons'].items()):
+        oligos = ramdict.get(pid, {})
+        known = {}
+        for oid, dna in oligos.items():
+            x = int(oid)
+            if x >= PARITY_OID - nparity + 1:
+                x = parity_x(PARITY_OID - x)
+            elif x >= k:
+                continue
+            if len(dna) == chunksize:
+                known[x] = decode(dna)
+        oligos = dict((oid, dna) for oid, dna in oligos.items() if int(oid) < k)
+        if pid in ramdict:
+            ramdict[pid] = oligos
+        if metrics:
+            metrics.count("outer code", 1, sum(map(len, oligos.values())))
+        missing = [x for x in xrange(k) if x not in known]
+        if not missing:
+            continue
+        data = recover(known, k)
+        if data is None:
+            if metrics:
+                metrics.reject("outer code", "unrecoverable")
+            continue
+        ramdict[pid] = oligos
+        for x in missing:
+            oligos["%03d" % x] = encode(data[x])
+        if metrics:
+            metrics.count("outer code recovered", len(missing), len(missing) * chunksize)
+    return ramdict
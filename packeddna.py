@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+
+"""
+Compact 2-bit packed storage for DNA sequences
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Bases are packed four to a byte (A:0, C:1, G:2, T:3, first base in the
+high bits), which is a quarter of the size of plain text. Anything other
+than upper-case ACGT is stored as a packed A plus a mask run holding the
+original characters, so any sequence is restored exactly.
+
+File layout (little-endian):
+
+    header:  "PDNA", version (u16), reserved (u16), record count (u32),
+             index offset (u64)
+    data:    packed bytes of each record, one after another
+    index:   for each record:
+             name length (u16), name, base count (u64), data offset (u64),
+             mask run count (u32), and for each run:
+             start (u64), length (u32), original characters
+
+The index is written last, so records are streamed to disk as they are
+added. Readers memory-map the file and unpack only the records (or base
+ranges) they are asked for.
+
+>>> from packeddna import PackedDNAWriter, PackedDNAReader
+>>> with PackedDNAWriter("seqs.pdna") as out:
+...     out.add("p0", "ACGTNACGT")
+>>> PackedDNAReader("seqs.pdna")["p0"]
+'ACGTNACGT'
+"""
+
+import os, re, mmap, struct, string
+from binascii import hexlify, unhexlify
+
+MAGIC = "PDNA"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIQ")
+
+base2digit = string.maketrans("ACGT", "0123")
+nonacgt = re.compile("[^ACGT]+")
+
+# byte value to the four bases it holds
+byte2bases = ["".join(b) for b in
+              [(x, y, z, w) for x in "ACGT" for y in "ACGT"
+                            for z in "ACGT" for w in "ACGT"]]
+
+def pack(seq):
+    """
+    Packs a sequence of upper-case ACGT into bytes. The sequence is padded
+    with A to a multiple of 4 bases.
+    """
+    if not seq:
+        return ""
+    seq += "A" * (-len(seq) % 4)
+    # read the bases as one base-4 number and write it out in hex
+    value = int(seq.translate(base2digit), 4)
+    return unhexlify("%0*x" % (len(seq) // 2, value))
+
+def unpack(data, length):
+    """
+    Unpacks length bases from packed bytes
+    """
+    return "".join(map(byte2bases.__getitem__, bytearray(data)))[:length]
+
+def is_packed(path):
+    """
+    Returns True if the file at path is a packed DNA file
+    """
+    with open(path, "rb") as infile:
+        return infile.read(len(MAGIC)) == MAGIC
+
+class PackedRecord:
+
+    def __init__(self, name, length, offset, masks):
+        """
+        Initialize PackedRecord object
+        """
+        self.name = name
+        self.length = length
+        self.offset = offset
+        self.masks = masks          # list of (start, original characters)
+
+    def nbytes(self):
+        return (self.length + 3) // 4
+
+class PackedDNAWriter:
+    """
+    Writes sequences to a packed DNA file
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+        self.records = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, name, seq):
+        """
+        Appends a sequence under name
+        """
+        masks = [(m.start(), m.group()) for m in nonacgt.finditer(seq)]
+        if masks:
+            seq = nonacgt.sub(lambda m: "A" * len(m.group()), seq)
+        offset = self._file.tell()
+        self._file.write(pack(seq))
+        self.records.append(PackedRecord(str(name), len(seq), offset, masks))
+
+    def close(self):
+        """
+        Writes the index and header and closes the file
+        """
+        if self._file.closed:
+            return
+        indexoffset = self._file.tell()
+        parts = []
+        for rec in self.records:
+            parts.append(struct.pack("<H", len(rec.name)) + rec.name)
+            parts.append(struct.pack("<QQI", rec.length, rec.offset, len(rec.masks)))
+            for start, chars in rec.masks:
+                parts.append(struct.pack("<QI", start, len(chars)) + chars)
+        self._file.write("".join(parts))
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, VERSION, 0, len(self.records), indexoffset))
+        self._file.close()
+
+class PackedDNAReader:
+    """
+    Memory-mapped random access to the records of a packed DNA file
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, reserved, count, indexoffset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise IOError("%s is not a packed DNA file" % path)
+        if version != VERSION:
+            raise IOError("Unsupported packed DNA version %d" % version)
+
+        self.records = []
+        pos = indexoffset
+        for i in xrange(count):
+            namelen, = struct.unpack_from("<H", self._map, pos)
+            name = self._map[pos+2:pos+2+namelen]
+            pos += 2 + namelen
+            length, offset, nmasks = struct.unpack_from("<QQI", self._map, pos)
+            pos += 20
+            masks = []
+            for j in xrange(nmasks):
+                start, runlen = struct.unpack_from("<QI", self._map, pos)
+                pos += 12
+                masks.append((start, self._map[pos:pos+runlen]))
+                pos += runlen
+            self.records.append(PackedRecord(name, length, offset, masks))
+        self.byname = dict((rec.name, rec) for rec in self.records)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        for rec in self.records:
+            yield self.fetch(rec)
+
+    def __getitem__(self, key):
+        return self.fetch(key)
+
+    def names(self):
+        return [rec.name for rec in self.records]
+
+    def record(self, key):
+        """
+        Returns the PackedRecord for a record name or position
+        """
+        if isinstance(key, PackedRecord):
+            return key
+        if isinstance(key, (int, long)):
+            return self.records[key]
+        return self.byname[key]
+
+    def fetch(self, key, start=0, end=None):
+        """
+        Returns bases [start, end) of a record given by name or position
+        """
+        rec = self.record(key)
+        if end is None or end > rec.length:
+            end = rec.length
+        if start >= end:
+            return ""
+        # unpack only the bytes holding the requested bases
+        first = start // 4
+        last = (end + 3) // 4
+        data = self._map[rec.offset+first:rec.offset+last]
+        seq = unpack(data, (last - first) * 4)
+        seq = seq[start - first*4:end - first*4]
+        for mstart, chars in rec.masks:
+            mend = mstart + len(chars)
+            if mend <= start or mstart >= end:
+                continue
+            lo = max(mstart, start)
+            hi = min(mend, end)
+            seq = seq[:lo-start] + chars[lo-mstart:hi-mstart] + seq[hi-start:]
+        return seq
+
+    def fetch_batch(self, keys):
+        """
+        Returns the sequences of several records, unpacking their bytes in
+        one pass
+        """
+        recs = [self.record(k) for k in keys]
+        if any(rec.masks for rec in recs):
+            return [self.fetch(rec) for rec in recs]
+        data = "".join(self._map[rec.offset:rec.offset+rec.nbytes()] for rec in recs)
+        bases = unpack(data, len(data) * 4)
+        seqs = []
+        pos = 0
+        for rec in recs:
+            seqs.append(bases[pos:pos+rec.length])
+            pos += rec.nbytes() * 4
+        return seqs
+
+def write_packed(path, records):
+    """
+    Writes (name, seq) records to a packed DNA file
+    """
+    with PackedDNAWriter(path) as out:
+        for name, seq in records:
+            out.add(name, seq)
+
+def read_sequences(path):
+    """
+    Generator that yields each sequence of a packed DNA file, or each line
+    of a plain DNA file, so that callers can accept either
+    """
+    if is_packed(path):
+        with PackedDNAReader(path) as reader:
+            for seq in reader:
+                yield seq
+    else:
+        with open(path) as infile:
+            for line in infile:
+                yield line
@@ -1,132 +1,348 @@
-#!/usr/bin/env python
-
-"""
-FASTQ file parser
-
-Created 15 July 2013
-Updated 20 August 2013
-
-Copyright 2013 Michael Ting
-https://github.com/michaelting
-Released under the BSD 2-clause license. See LICENSE.
-http://opensource.org/licenses/BSD-2-Clause
-"""
-
-import os, sys, gzip
-from itertools import ifilter, islice
-from ASCIIcodons import *
-from binaryDNA import *
-
-def translate_bin(infile, outfile):
-	"""Translates the pure sequence binary encoding information 
-	from a FASTQ file into human-readable text"""
-	parser = ParseFASTQ(infile)
-	bintranslator = DNAToBinaryText()
-	out = open(outfile,"w")
-	for rec in parser:
-		header = rec[0]
-		seq = rec[1]
-		text = bintranslator.dna_to_text(seq)
-		out.write("%s\n" % header)
-		out.write("%s\n" % text)
-		out.flush()
-		os.fsync(out.fileno())
-		print header
-		print text
-	out.close()
-
-def translate_codon(infile, outfile):
-	"""Translates the codon encoding sequence from a FASTQ file into
-	human-readable text"""
-	parser = ParseFASTQ(infile)
-	codtranslator = DNAToText()
-	out = open(outfile,"w")
-	for rec in parser:
-		header 	= rec[0]
-		seq 	= rec[1]
-		text	= codtranslator.dna_to_text(seq)
-		out.write("%s\n" % header)
-		out.write("%s\n" % text)
-		out.flush()
-		os.fsync(out.fileno())
-		print header
-		print text
-	out.close()
-
-def readFastq(fastqfile):
-    fastqiter = ifilter(lambda l: l, fastqfile)  # skip blank lines
-    fastqiter = (l.strip('\n') for l in fastqiter)  # strip trailing newlines
-    while True:
-        values = list(islice(fastqiter, 4))
-        if len(values) == 4:
-            header1,seq,header2,qual = values
-        elif len(values) == 0:
-            raise StopIteration
-        else:
-            raise EOFError("Failed to parse four lines from fastq file!")
-
-        if header1.startswith('@') and header2.startswith('+'):
-            yield header1[1:], seq, qual
-        else:
-            raise ValueError("Invalid header lines: %s and %s" % (header1, header2))
-
-class ParseFASTQ(object):
-    """Returns a read-by-read fastQ parser analogous to file.readline()
-	By Augustine Dunn"""
-    def __init__(self,filePath,headerSymbols=['@','+']):
-        """Returns a read-by-read fastQ parser analogous to file.readline().
-        Exmpl: parser.next()
-        -OR-
-        Its an iterator so you can do:
-        for rec in parser:
-            ... do something with rec ...
- 
-        rec is tuple: (seqHeader,seqStr,qualHeader,qualStr)
-        """
-        if filePath.endswith('.gz'):
-            self._file = gzip.open(filePath)
-        else:
-            self._file = open(filePath, 'rU')
-        self._currentLineNumber = 0
-        self._hdSyms = headerSymbols
-         
-    def __iter__(self):
-        return self
-     
-    def next(self):
-        """Reads in next element, parses, and does minimal verification.
-        Returns: tuple: (seqHeader,seqStr,qualHeader,qualStr)"""
-        # ++++ Get Next Four Lines ++++
-        elemList = []
-        for i in range(4):
-            line = self._file.readline()
-            self._currentLineNumber += 1 ## increment file position
-            if line:
-                elemList.append(line.strip('\n'))
-            else: 
-                elemList.append(None)
-         
-        # ++++ Check Lines For Expected Form ++++
-        trues = [bool(x) for x in elemList].count(True)
-        nones = elemList.count(None)
-        # -- Check for acceptable end of file --
-        if nones == 4:
-            raise StopIteration
-        # -- Make sure we got 4 full lines of data --
-        assert trues == 4,\
-               "** ERROR: It looks like I encountered a premature EOF or empty line.\n\
-               Please check FastQ file near line number %s (plus or minus ~4 lines) and try again**" % (self._currentLineNumber)
-        # -- Make sure we are in the correct "register" --
-        assert elemList[0].startswith(self._hdSyms[0]),\
-               "** ERROR: The 1st line in fastq element does not start with '%s'.\n\
-               Please check FastQ file near line number %s (plus or minus ~4 lines) and try again**" % (self._hdSyms[0],self._currentLineNumber) 
-        assert elemList[2].startswith(self._hdSyms[1]),\
-               "** ERROR: The 3rd line in fastq element does not start with '%s'.\n\
-               Please check FastQ file near line number %s (plus or minus ~4 lines) and try again**" % (self._hdSyms[1],self._currentLineNumber) 
-        # -- Make sure the seq line and qual line have equal lengths --
-        assert len(elemList[1]) == len(elemList[3]), "** ERROR: The length of Sequence data and Quality data of the last record aren't equal.\n\
-               Please check FastQ file near line number %s (plus or minus ~4 lines) and try again**" % (self._currentLineNumber) 
-         
-        # ++++ Return fatsQ data as tuple ++++
-        return tuple(elemList)
+#!/usr/bin/env python
+
+"""
+FASTQ file parser
+
+Created 15 July 2013
+Updated 20 August 2013
+
+Copyright 2013 Michael Ting
+https://github.com/michaelting
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+"""
+
+import os, sys, gzip, operator
+from itertools import ifilter, islice, compress
+
+PHRED_OFFSET = 33
+
+def translate_bin(infile, outfile):
+	"""Translates the pure sequence binary encoding information 
+	from a FASTQ file into human-readable text"""
+	from binaryDNA import DNAToBinaryText
+	parser = ParseFASTQ(infile)
+	bintranslator = DNAToBinaryText()
+	out = open(outfile,"w")
+	for rec in parser:
+		header = rec[0]
+		seq = rec[1]
+		text = bintranslator.dna_to_text(seq)
+		out.write("%s\n" % header)
+		out.write("%s\n" % text)
+		out.flush()
+		os.fsync(out.fileno())
+		print header
+		print text
+	out.close()
+
+def translate_codon(infile, outfile):
+	"""Translates the codon encoding sequence from a FASTQ file into
+	human-readable text, in the reading frame that gives the most
+	plausible text"""
+	from frame_detect import best_frame
+	parser = ParseFASTQ(infile)
+	out = open(outfile,"w")
+	for rec in parser:
+		header 	= rec[0]
+		seq 	= rec[1]
+		text	= best_frame(seq)[1]
+		out.write("%s\n" % header)
+		out.write("%s\n" % text)
+		out.flush()
+		os.fsync(out.fileno())
+		print header
+		print text
+	out.close()
+
+def readFastq(fastqfile):
+    fastqiter = ifilter(lambda l: l, fastqfile)  # skip blank lines
+    fastqiter = (l.strip('\n') for l in fastqiter)  # strip trailing newlines
+    while True:
+        values = list(islice(fastqiter, 4))
+        if len(values) == 4:
+            header1,seq,header2,qual = values
+        elif len(values) == 0:
+            raise StopIteration
+        else:
+            raise EOFError("Failed to parse four lines from fastq file!")
+
+        if header1.startswith('@') and header2.startswith('+'):
+            yield header1[1:], seq, qual
+        else:
+            raise ValueError("Invalid header lines: %s and %s" % (header1, header2))
+
+def quality_filter(records, minmean=None, minqual=None, metrics=None,
+                   batchsize=10000):
+    """
+    Generator that passes on the (header, seq, qual) records whose mean
+    Phred quality is at least minmean and whose lowest base quality is at
+    least minqual, before any other work is done on them.
+    records may be any iterable, and is handled in batches of batchsize.
+    Each batch is checked with calls that run in C and no Python code per
+    read: the quality sums come from bytearray, and the low quality bases
+    from one translate of the joined quality strings that deletes every
+    passing character, leaving each read's low bases between separators.
+    If metrics is a PipelineMetrics object, all reads and bases are counted
+    under the "quality filter" stage, dropped reads are counted by reason,
+    and their reads and bases are counted under "quality filter removed".
+    """
+    records = iter(records)
+    # compare raw quality characters, so no per-read offset is subtracted
+    if minmean is not None:
+        meanfloor = minmean + PHRED_OFFSET
+    if minqual is not None:
+        passchars = "".join(map(chr, xrange(minqual + PHRED_OFFSET, 256)))
+    while True:
+        batch = list(islice(records, batchsize))
+        if not batch:
+            return
+        quals = [rec[2] for rec in batch]
+        lowmean = lowqual = [False] * len(batch)
+        if minmean is not None:
+            lowmean = map(operator.lt, map(sum, map(bytearray, quals)),
+                          map(meanfloor.__mul__, map(len, quals)))
+        if minqual is not None:
+            lowqual = map(bool, "\n".join(quals).translate(None, passchars).split("\n"))
+        dropped = map(operator.or_, lowmean, lowqual)
+        for rec in compress(batch, map(operator.not_, dropped)):
+            yield rec
+        if metrics:
+            seqlens = [len(rec[1]) for rec in batch]
+            removed = sum(dropped)
+            for reason, reads in [("low mean quality", sum(lowmean)),
+                                  ("low base quality", removed - sum(lowmean))]:
+                if reads:
+                    metrics.reject("quality filter", reason, reads)
+            metrics.count("quality filter", len(batch), sum(seqlens))
+            metrics.count("quality filter removed", removed, sum(compress(seqlens, dropped)))
+
+def _maketable(frm, to):
+    """
+    Returns a str.translate table mapping the characters of frm to to
+    """
+    table = map(chr, xrange(256))
+    for old, new in zip(frm, to):
+        table[ord(old)] = new
+    return "".join(table)
+
+complement = _maketable("ACGTNacgtn", "TGCANtgcan")
+# bases to base 4 digits for mismatch counting, N counted as A
+base2digit = _maketable("ACGTN", "01230")
+
+SEEDLEN = 12
+
+def pair_name(header):
+    """
+    Returns the name of a read, up to the first space and without a /1 or
+    /2 suffix, which is the same for both reads of a pair
+    """
+    name = header.split(None, 1)[0] if header else header
+    if name[-2:] in ("/1", "/2"):
+        return name[:-2]
+    return name
+
+def readPairs(r1file, r2file):
+    """
+    Generator that yields (R1 record, R2 record) from two FASTQ files of
+    paired reads in the same order
+    """
+    r1iter = readFastq(r1file)
+    r2iter = readFastq(r2file)
+    for rec1 in r1iter:
+        try:
+            rec2 = r2iter.next()
+        except StopIteration:
+            raise EOFError("R2 file has fewer reads than R1 file")
+        if pair_name(rec1[0]) != pair_name(rec2[0]):
+            raise ValueError("Read pair names do not match: %s and %s" % (rec1[0], rec2[0]))
+        yield rec1, rec2
+    if next(r2iter, None) is not None:
+        raise EOFError("R2 file has more reads than R1 file")
+
+def overlap_mismatches(n1, len1, n2, len2, start1, start2, length):
+    """
+    Returns the number of mismatched bases between length bases of two
+    sequences packed 2 bits per base into integers n1 and n2, starting at
+    start1 and start2. The overlapping bases are XORed and the 2-bit groups
+    that differ are counted with a single bin().count().
+    """
+    mask = (1 << (2 * length)) - 1
+    a = (n1 >> (2 * (len1 - start1 - length))) & mask
+    b = (n2 >> (2 * (len2 - start2 - length))) & mask
+    diff = a ^ b
+    # fold each 2-bit group onto its low bit
+    diff = (diff | (diff >> 1)) & (mask // 3)
+    return bin(diff).count("1")
+
+def find_overlap(seq1, seq2, minoverlap=10, maxdiff=0.1):
+    """
+    Returns (offset, mismatches) of the best overlap of seq2 against seq1,
+    where offset is the position of seq2's first base in seq1 (negative if
+    seq2 starts before seq1), or None if no overlap of at least minoverlap
+    bases has at most maxdiff mismatches per base. The best overlap has the
+    most matching bases less mismatched ones, so the longest wins among
+    exact matches.
+    Offsets where a seed at the start of either sequence matches exactly
+    are tried first, and every offset is scanned only if none of them fits.
+    """
+    len1 = len(seq1)
+    len2 = len(seq2)
+    if min(len1, len2) < minoverlap:
+        return None
+    n1 = int(seq1.translate(base2digit), 4)
+    n2 = int(seq2.translate(base2digit), 4)
+
+    def best_of(offsets):
+        best = None
+        for offset in offsets:
+            start1 = max(offset, 0)
+            start2 = max(-offset, 0)
+            length = min(len1 - start1, len2 - start2)
+            if length < minoverlap:
+                continue
+            diff = overlap_mismatches(n1, len1, n2, len2, start1, start2, length)
+            if diff > maxdiff * length:
+                continue
+            # most matches less mismatches, so a short exact match in a
+            # repeat does not win over the true, longer overlap
+            key = (length - 2 * diff, length)
+            if best is None or key > best[0]:
+                best = (key, offset, diff)
+        return best
+
+    seeds = set()
+    seedlen = min(SEEDLEN, minoverlap)
+    seed = seq2[:seedlen]
+    pos = seq1.find(seed)
+    while pos >= 0:
+        seeds.add(pos)
+        pos = seq1.find(seed, pos + 1)
+    seed = seq1[:seedlen]
+    pos = seq2.find(seed)
+    while pos >= 0:
+        seeds.add(-pos)
+        pos = seq2.find(seed, pos + 1)
+
+    best = best_of(sorted(seeds))
+    if best is None:
+        best = best_of(xrange(-(len2 - minoverlap), len1 - minoverlap + 1))
+    if best is None:
+        return None
+    return best[1], best[2]
+
+def merge_pair(rec1, rec2, minoverlap=10, maxdiff=0.1):
+    """
+    Merges an R1 and R2 record into a single (header, seq, qual) record, or
+    returns None if the reads do not overlap.
+    R2 is reverse complemented and overlapped with R1. In the overlap, each
+    position takes the base of the read with the higher quality, and the
+    higher of the two qualities. If R2 starts before R1, the fragment was
+    shorter than the reads and only the overlap is kept, which drops the
+    adapter sequence read through on both ends.
+    """
+    header, seq1, qual1 = rec1[0], rec1[1], rec1[2]
+    seq2 = rec2[1].translate(complement)[::-1]
+    qual2 = rec2[2][::-1]
+    found = find_overlap(seq1, seq2, minoverlap, maxdiff)
+    if found is None:
+        return None
+    offset, diff = found
+    start1 = max(offset, 0)
+    start2 = max(-offset, 0)
+    length = min(len(seq1) - start1, len(seq2) - start2)
+
+    bases1 = seq1[start1:start1+length]
+    bases2 = seq2[start2:start2+length]
+    quals1 = qual1[start1:start1+length]
+    quals2 = qual2[start2:start2+length]
+    bases = bases1
+    if diff:
+        # take the base with the higher quality where the reads disagree
+        bases = "".join([b1 if q1 >= q2 else b2 for b1, b2, q1, q2
+                         in zip(bases1, bases2, quals1, quals2)])
+    quals = "".join(map(max, quals1, quals2))
+
+    if offset < 0:
+        return header, bases, quals
+    return (header,
+            seq1[:start1] + bases + seq2[start2+length:] + seq1[start1+length:],
+            qual1[:start1] + quals + qual2[start2+length:] + qual1[start1+length:])
+
+def merge_pairs(pairs, minoverlap=10, maxdiff=0.1, metrics=None):
+    """
+    Generator that merges (R1, R2) record pairs and yields the merged
+    (header, seq, qual) records, ready to be passed to sort_oligos.
+    If metrics is given, pairs are counted under the "merge" stage with the
+    bases of both reads, and pairs that do not overlap are rejected as
+    "no overlap".
+    """
+    for rec1, rec2 in pairs:
+        if metrics:
+            metrics.count("merge", 1, len(rec1[1]) + len(rec2[1]))
+        merged = merge_pair(rec1, rec2, minoverlap, maxdiff)
+        if merged is not None:
+            yield merged
+        elif metrics:
+            metrics.reject("merge", "no overlap")
+
+class ParseFASTQ(object):
+    """Returns a read-by-read fastQ parser analogous to file.readline()
+	By Augustine Dunn"""
+    def __init__(self,filePath,headerSymbols=['@','+']):
+        """Returns a read-by-read fastQ parser analogous to file.readline().
+        Exmpl: parser.next()
+        -OR-
+        Its an iterator so you can do:
+        for rec in parser:
+            ... do something with rec ...
+ 
+        rec is tuple: (seqHeader,seqStr,qualHeader,qualStr)
+        """
+        if filePath.endswith('.gz'):
+            self._file = gzip.open(filePath)
+        else:
+            self._file = open(filePath, 'rU')
+        self._currentLineNumber = 0
+        self._hdSyms = headerSymbols
+         
+    def __iter__(self):
+        return self
+     
+    def next(self):
+        """Reads in next element, parses, and does minimal verification.
+        Returns: tuple: (seqHeader,seqStr,qualHeader,qualStr)"""
+        # ++++ Get Next Four Lines ++++
+        elemList = []
+        for i in range(4):
+            line = self._file.readline()
+            self._currentLineNumber += 1 ## increment file position
+            if line:
+                elemList.append(line.strip('\n'))
+            else: 
+                elemList.append(None)
+         
+        # ++++ Check Lines For Expected Form ++++
+        trues = [bool(x) for x in elemList].count(True)
+        nones = elemList.count(None)
+        # -- Check for acceptable end of file --
+        if nones == 4:
+            raise StopIteration
+        # -- Make sure we got 4 full lines of data --
+        assert trues == 4,\
+               "** ERROR: It looks like I encountered a premature EOF or empty line.\n\
+               Please check FastQ file near line number %s (plus or minus ~4 lines) and try again**" % (self._currentLineNumber)
+        # -- Make sure we are in the correct "register" --
+        assert elemList[0].startswith(self._hdSyms[0]),\
+               "** ERROR: The 1st line in fastq element does not start with '%s'.\n\
+               Please check FastQ file near line number %s (plus or minus ~4 lines) and try again**" % (self._hdSyms[0],self._currentLineNumber) 
+        assert elemList[2].startswith(self._hdSyms[1]),\
+               "** ERROR: The 3rd line in fastq element does not start with '%s'.\n\
+               Please check FastQ file near line number %s (plus or minus ~4 lines) and try again**" % (self._hdSyms[1],self._currentLineNumber) 
+        # -- Make sure the seq line and qual line have equal lengths --
+        assert len(elemList[1]) == len(elemList[3]), "** ERROR: The length of Sequence data and Quality data of the last record aren't equal.\n\
+               Please check FastQ file near line number %s (plus or minus ~4 lines) and try again**" % (self._currentLineNumber) 
+         
+        # ++++ Return fatsQ data as tuple ++++
+        return tuple(elemList)
 		
\ No newline at end of file
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+"""
+Read, base, rejection and timing accounting for the decoding pipeline
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+A PipelineMetrics object is passed to the pipeline stages, which record
+the reads and bases they see and the reason for every read or oligo they
+drop. The report is a dictionary that can be written as JSON:
+
+{"stages":   {"sort": {"reads": ..., "bases": ..., "seconds": ...,
+                       "reads_per_sec": ..., "bases_per_sec": ...}, ...},
+ "rejected": {"sort": {"no tag": ..., ...}, ...},
+ "peak_rss_kb": ...}
+
+With progress set, a line is written to stderr every progress reads
+counted by a stage while it is being timed.
+"""
+
+import sys, json, time
+from contextlib import contextmanager
+
+import profiling
+
+try:
+    import resource
+except ImportError:     # not available on Windows
+    resource = None
+
+def peak_rss_kb():
+    """
+    Returns the peak resident memory of this process in kilobytes, or None
+    if it cannot be measured
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':    # reported in bytes on OS X
+        rss //= 1024
+    return rss
+
+class PipelineMetrics:
+
+    def __init__(self, progress=0, stream=None):
+        """
+        Initialize PipelineMetrics object
+        Input:
+            progress - write a progress line every progress reads of a timed
+                       stage (0 for none)
+            stream   - file for progress lines, stderr by default
+        """
+        self.stages = {}
+        self.rejected = {}
+        self.order = []
+        self.progress = progress
+        self.stream = stream or sys.stderr
+        self._started = {}
+        self._nextprogress = {}
+
+    def _stage(self, stage):
+        if stage not in self.stages:
+            self.stages[stage] = {'reads': 0, 'bases': 0, 'seconds': 0.0}
+            self.rejected[stage] = {}
+            self.order.append(stage)
+            self._nextprogress[stage] = self.progress
+        return self.stages[stage]
+
+    @contextmanager
+    def timed(self, stage):
+        """
+        Context manager that adds the time spent inside it to a stage, and
+        to the profiling timing report when profiling is on
+        """
+        entry = self._stage(stage)
+        start = time.time()
+        self._started[stage] = start
+        try:
+            yield entry
+        finally:
+            elapsed = time.time() - start
+            entry['seconds'] += elapsed
+            del self._started[stage]
+            if profiling.enabled():
+                profiling.record(stage, elapsed)
+
+    def count(self, stage, reads=1, bases=0):
+        """
+        Records reads and bases seen by a stage
+        """
+        entry = self._stage(stage)
+        entry['reads'] += reads
+        entry['bases'] += bases
+        self._check_progress(stage)
+
+    def _check_progress(self, stage):
+        entry = self.stages[stage]
+        if (self.progress and stage in self._started and
+                entry['reads'] >= self._nextprogress[stage]):
+            self._nextprogress[stage] = entry['reads'] + self.progress
+            self.write_progress(stage)
+
+    def reject(self, stage, reason, reads=1):
+        """
+        Records reads (or oligos) dropped by a stage and the reason
+        """
+        self._stage(stage)
+        rejected = self.rejected[stage]
+        rejected[reason] = rejected.get(reason, 0) + reads
+
+    def counts(self):
+        """
+        Returns the read, base and rejection counts as plain dictionaries,
+        for sending from a worker process
+        """
+        return (dict((s, {'reads': e['reads'], 'bases': e['bases']})
+                     for s, e in self.stages.items()),
+                dict((s, dict(r)) for s, r in self.rejected.items()))
+
+    def merge_counts(self, counts):
+        """
+        Adds counts returned by another PipelineMetrics object's counts()
+        """
+        stages, rejected = counts
+        for stage, entry in stages.items():
+            mine = self._stage(stage)
+            mine['reads'] += entry['reads']
+            mine['bases'] += entry['bases']
+            self._check_progress(stage)
+        for stage, reasons in rejected.items():
+            for reason, reads in reasons.items():
+                self.reject(stage, reason, reads)
+
+    def write_progress(self, stage):
+        """
+        Writes a progress line for a stage
+        """
+        entry = self.stages[stage]
+        elapsed = entry['seconds']
+        if stage in self._started:
+            elapsed += time.time() - self._started[stage]
+        dropped = sum(self.rejected[stage].values())
+        rate = entry['reads'] / elapsed if elapsed > 0 else 0.0
+        self.stream.write("%s: %d reads, %.0f reads/sec, %d rejected\n"
+                          % (stage, entry['reads'], rate, dropped))
+        self.stream.flush()
+
+    def report(self):
+        """
+        Returns the metrics as a dictionary
+        """
+        stages = {}
+        for stage in self.order:
+            entry = dict(self.stages[stage])
+            seconds = entry['seconds']
+            entry['reads_per_sec'] = entry['reads'] / seconds if seconds > 0 else None
+            entry['bases_per_sec'] = entry['bases'] / seconds if seconds > 0 else None
+            stages[stage] = entry
+        return {'stages': stages,
+                'stage_order': list(self.order),
+                'rejected': dict((s, dict(r)) for s, r in self.rejected.items()),
+                'peak_rss_kb': peak_rss_kb()}
+
+    def write_json(self, path):
+        """
+        Writes the report to a JSON file
+        """
+        with open(path, "w") as out:
+            json.dump(self.report(), out, indent=2, sort_keys=True)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+"""
+Indexed archive of decoded profiles with per-person retrieval
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+condense(..., fmt="archive") writes the consensus DNA of every person to a
+single profiles.pdna file instead of a pair of files per person. The
+archive is a 2-bit packed DNA file (see packeddna.py) holding one record
+per oligo, named "pid/oid" and sorted by person and oligo ID, so the
+packed index maps each (pid, oid) to the offset of its bases.
+
+ProfileArchive memory-maps the archive and unpacks and translates only the
+oligos of the person asked for:
+
+>>> from profile_archive import ProfileArchive
+>>> archive = ProfileArchive("decodeddna/profiles.pdna", "codon")
+>>> archive.persons()[:3]
+['00', '01', '02']
+>>> archive.text("02")                  # whole profile
+>>> archive.text("02", 3, 5)            # oligos 003 to 005 only
+
+Steps to replicate:
+$ python get_unique_oligos.py merged.fastq.gz --format archive
+$ python profile_archive.py decodeddna/profiles.pdna --list
+$ python profile_archive.py decodeddna/profiles.pdna --person 02 --oligos 3 5
+"""
+
+from argparse import ArgumentParser
+
+from oligo_decode import schemes, get_translator
+from packeddna import PackedDNAReader, PackedDNAWriter
+
+ARCHIVE_NAME = "profiles.pdna"
+
+def record_name(pid, oid):
+    """
+    Returns the archive record name of an oligo
+    """
+    return "%s/%s" % (pid, oid)
+
+def write_archive(path, oligos):
+    """
+    Writes an archive from a dictionary of {pid: [(oid, dna), ...]}, with
+    the oligos of each person already in order
+    """
+    with PackedDNAWriter(path) as out:
+        for pid in sorted(oligos):
+            for oid, dna in oligos[pid]:
+                out.add(record_name(pid, oid), dna)
+
+class ProfileArchive:
+
+    def __init__(self, path, scheme='codon', dictionary=None):
+        """
+        Initialize ProfileArchive object
+        Input:
+            path       - archive written by condense
+            scheme     - 'codon' or 'binary', used to translate DNA to text
+            dictionary - preset dictionary of compressed profiles, if any
+        """
+        from compression import decoding
+        self.reader = PackedDNAReader(path)
+        self.tfunc = decoding(get_translator(scheme), dictionary)
+        # pid -> list of (oligo number, record position), in oligo order
+        self.index = {}
+        for pos, name in enumerate(self.reader.names()):
+            pid, oid = name.split("/")
+            self.index.setdefault(pid, []).append((int(oid), pos))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.reader.close()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, pid):
+        return pid in self.index
+
+    def persons(self):
+        """
+        Returns the sorted person IDs in the archive
+        """
+        return sorted(self.index)
+
+    def oligos(self, pid):
+        """
+        Returns the oligo numbers stored for a person
+        """
+        return [oid for oid, pos in self.index[pid]]
+
+    def dna(self, pid, first=None, last=None):
+        """
+        Returns the condensed DNA of a person, or of oligos first to last
+        (inclusive) only
+        """
+        if pid not in self.index:
+            raise KeyError("Person %s is not in the archive" % pid)
+        positions = [pos for oid, pos in self.index[pid]
+                     if (first is None or oid >= first) and
+                        (last is None or oid <= last)]
+        return "".join(self.reader.fetch_batch(positions))
+
+    def text(self, pid, first=None, last=None):
+        """
+        Returns the decoded text of a person, or of oligos first to last
+        (inclusive) only. A compressed profile only decompresses from its
+        first oligo.
+        """
+        return self.tfunc(self.dna(pid, first, last))
+
+def main():
+
+    parser = ArgumentParser()
+
+    parser.add_argument("archive",help="profiles.pdna written by get_unique_oligos.py --format archive")
+    parser.add_argument("--scheme",choices=sorted(schemes),default="codon",help="DNA encoding scheme")
+    parser.add_argument("--list",action="store_true",help="list person IDs and their oligo counts")
+    parser.add_argument("--person",nargs="+",default=[],metavar="PID",help="person IDs to retrieve")
+    parser.add_argument("--oligos",type=int,nargs=2,metavar=("FIRST","LAST"),help="only retrieve this range of oligo IDs")
+    parser.add_argument("--dictionary",help="preset dictionary the profiles were compressed with")
+    parser.add_argument("--dna",action="store_true",help="print condensed DNA instead of text")
+
+    args = parser.parse_args()
+
+    first, last = args.oligos or (None, None)
+
+    dictionary = None
+    if args.dictionary:
+        from compression import read_dictionary
+        dictionary = read_dictionary(args.dictionary)
+
+    with ProfileArchive(args.archive, args.scheme, dictionary) as archive:
+        if args.list:
+            for pid in archive.persons():
+                print "%s\t%d" % (pid, len(archive.oligos(pid)))
+        for pid in args.person:
+            if args.dna:
+                print archive.dna(pid, first, last)
+            else:
+                print archive.text(pid, first, last)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+"""
+Opt-in profiling of the translators and pipeline stages
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Profiling is off unless the ASCIIDNA_PROFILE environment variable names an
+output directory, or enable() is called (for example from a --profile
+command line flag):
+
+$ ASCIIDNA_PROFILE=profiles python get_unique_oligos.py
+
+Functions decorated with @profiled(stage) are run under cProfile, and each
+stage's profile is written to <directory>/<stage>.prof when the program
+exits. Stages are named module.function or Class.method, so sort_oligos
+is written to profiles/get_unique_oligos.sort_oligos.prof. Read them with
+pstats:
+
+>>> import pstats
+>>> stats = pstats.Stats("profiles/get_unique_oligos.sort_oligos.prof")
+>>> stats.sort_stats("cumulative").print_stats(20)
+
+Only the outermost profiled call is profiled, since cProfile cannot nest;
+inner stages appear inside the outer stage's profile.
+
+Call counts and total time of each stage, along with any blocks timed with
+the timer() context manager, are written to <directory>/timings.json.
+When profiling is off, a decorated function costs one extra call and an
+attribute check per call and timer() records nothing, so only entry points
+that run once per file or stage are decorated, never the per-line
+translation functions they call.
+"""
+
+import os, time, atexit
+from contextlib import contextmanager
+from functools import wraps
+
+class ProfileState:
+
+    def __init__(self):
+        self.outdir = None
+        self.profiles = {}      # stage name -> cProfile.Profile
+        self.timings = {}       # stage name -> {'calls': n, 'seconds': s}
+        self.active = False     # a profiled call is in progress
+
+_state = ProfileState()
+
+def enabled():
+    """
+    Returns True if profiling is on
+    """
+    return _state.outdir is not None
+
+def enable(outdir):
+    """
+    Turns on profiling, with profiles written to outdir at exit
+    """
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    if _state.outdir is None:
+        atexit.register(dump)
+    _state.outdir = outdir
+
+def record(stage, seconds):
+    """
+    Adds one timed call of a stage to the timing report
+    """
+    entry = _state.timings.setdefault(stage, {'calls': 0, 'seconds': 0.0})
+    entry['calls'] += 1
+    entry['seconds'] += seconds
+
+@contextmanager
+def timer(stage):
+    """
+    Context manager that records the time spent inside it under stage when
+    profiling is on
+    """
+    if _state.outdir is None:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        record(stage, time.time() - start)
+
+def profiled(stage):
+    """
+    Decorator that runs a function under cProfile when profiling is on
+    """
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _state.outdir is None or _state.active:
+                return func(*args, **kwargs)
+            profile = _state.profiles.get(stage)
+            if profile is None:
+                import cProfile
+                profile = _state.profiles[stage] = cProfile.Profile()
+            _state.active = True
+            start = time.time()
+            profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                _state.active = False
+                record(stage, time.time() - start)
+        return wrapper
+    return decorate
+
+def dump():
+    """
+    Writes each stage's profile and the timing report to the output
+    directory
+    """
+    if _state.outdir is None:
+        return
+    import json
+    for stage, profile in _state.profiles.items():
+        profile.dump_stats(os.path.join(_state.outdir, stage + ".prof"))
+    with open(os.path.join(_state.outdir, "timings.json"), "w") as out:
+        json.dump(_state.timings, out, indent=2, sort_keys=True)
+
+if os.environ.get("ASCIIDNA_PROFILE"):
+    enable(os.environ["ASCIIDNA_PROFILE"])
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+
+"""
+Near-duplicate clustering of sequencing reads before consensus
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Most distinct reads of a run are exact copies of an oligo or one or two
+errors away from one, yet sort_oligos counts every base of every read.
+Clustering first collapses exact duplicates into distinct sequences with
+their multiplicity. Then, from the most abundant sequence down, each
+sequence joins the nearest centroid within maxdist edits that has at
+least ratio**edits times as many reads, or becomes a centroid itself.
+The ratio grows with the distance so that two true oligos a few bases
+apart, such as stuffer oligos differing only in their oligo ID, are kept
+apart unless one is far rarer than the other. Each cluster is sorted once,
+as its centroid weighted by its number of reads.
+
+Pairs are never compared exhaustively. A centroid is split into
+2*maxdist+1 segments. Each edit touches at most one segment, so by the
+pigeonhole principle a sequence within maxdist edits of the centroid
+contains at least maxdist+1 of them exactly, shifted by at most maxdist
+bases. The segments of every centroid with enough reads to take members
+are indexed in a dictionary, and only centroids sharing enough segments
+with a sequence are checked, with an edit distance that follows just
+2*maxdist+1 diagonals and skips over matching bases with C-level slice
+comparisons.
+
+Steps to replicate:
+$ python read_clusters.py merged.fastq.gz centroids.fastq
+$ python get_unique_oligos.py merged.fastq.gz --cluster
+"""
+
+import gzip
+from itertools import combinations
+from argparse import ArgumentParser
+
+MAX_DIST = 2
+MIN_RATIO = 16.0    # reads in a centroid per read of a sequence one edit away
+
+def collapse(records):
+    """
+    Returns a list of [sequence, reads, quality] of the distinct sequences
+    of (header, seq, qual) records, most abundant first. The quality is
+    that of the first read of each sequence.
+    """
+    distinct = {}
+    for rec in records:
+        seq = rec[1].strip()
+        entry = distinct.get(seq)
+        if entry is None:
+            distinct[seq] = [seq, 1, rec[2].strip()]
+        else:
+            entry[1] += 1
+    return sorted(distinct.itervalues(), key=lambda entry: (-entry[1], entry[0]))
+
+def common_length(a, i, b, j):
+    """
+    Returns the length of the longest common prefix of a[i:] and b[j:],
+    found by binary search over slice comparisons
+    """
+    lo = 0
+    hi = min(len(a) - i, len(b) - j)
+    if a[i:i + hi] == b[j:j + hi]:
+        return hi
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[i:i + mid] == b[j:j + mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def edit_distance(a, b, maxdist=MAX_DIST):
+    """
+    Returns the edit distance between two sequences, or maxdist + 1 if it
+    is larger than maxdist.
+    For each number of edits, only the diagonals within that many of the
+    main diagonal are followed, and each is extended over matching bases
+    with common_length, so the cost depends on maxdist and not on the
+    length of the sequences (Landau-Vishkin).
+    """
+    lena = len(a)
+    lenb = len(b)
+    big = maxdist + 1
+    target = lenb - lena
+    if abs(target) > maxdist:
+        return big
+    unreached = -big - lena
+    prev = {}
+    for edits in xrange(maxdist + 1):
+        # furthest row of a reached on each diagonal with this many edits
+        cur = {}
+        for diag in xrange(-edits, edits + 1):
+            if edits:
+                # substitution, deletion from a, or insertion into a
+                row = max(prev.get(diag, unreached) + 1,
+                          prev.get(diag + 1, unreached) + 1,
+                          prev.get(diag - 1, unreached))
+                row = min(row, lena, lenb - diag)
+            else:
+                row = 0
+            if row < 0 or row + diag < 0:
+                continue
+            row += common_length(a, row, b, row + diag)
+            if diag == target and row == lena:
+                return edits
+            cur[diag] = row
+        prev = cur
+    return big
+
+class ClusterIndex:
+
+    def __init__(self, maxdist=MAX_DIST):
+        """
+        Initialize ClusterIndex object
+        Input:
+            maxdist - largest edit distance from a centroid to its members
+        """
+        self.maxdist = maxdist
+        self.centroids = []
+        self.index = {}     # (segment size, segment number, segment) to centroids
+        self.sizes = set()
+
+    def bounds(self, size):
+        """
+        Returns the (start, end) of the 2*maxdist+1 segments of a centroid
+        with segments of size bases. A few bases at the end of the centroid
+        may be left out of every segment.
+        """
+        return [(num * size, (num + 1) * size) for num in xrange(2 * self.maxdist + 1)]
+
+    def segment_size(self, length):
+        # centroids a few bases apart in length mostly share a segment size,
+        # so a sequence is looked up under one or two sizes
+        return length // (2 * self.maxdist + 1)
+
+    def add(self, seq):
+        """
+        Adds a centroid and returns its number
+        """
+        num = len(self.centroids)
+        self.centroids.append(seq)
+        size = self.segment_size(len(seq))
+        self.sizes.add(size)
+        for segnum, (start, end) in enumerate(self.bounds(size)):
+            self.index.setdefault((size, segnum, seq[start:end]), []).append(num)
+        return num
+
+    def candidates(self, seq):
+        """
+        Returns the sorted numbers of the centroids sharing maxdist+1
+        segments with a sequence, which include every centroid within
+        maxdist edits of it
+        """
+        maxdist = self.maxdist
+        seqlen = len(seq)
+        index = self.index
+        found = set()
+        sizes = set(self.segment_size(length) for length in
+                    xrange(seqlen - maxdist, seqlen + maxdist + 1))
+        for size in sizes & self.sizes:
+            # centroids holding each segment anywhere within the shift
+            holders = []
+            for segnum, (start, end) in enumerate(self.bounds(size)):
+                nums = set()
+                for pos in xrange(max(0, start - maxdist),
+                                  min(start + maxdist, seqlen - size) + 1):
+                    nums.update(index.get((size, segnum, seq[pos:pos + size]), ()))
+                if nums:
+                    holders.append(nums)
+            # centroids in at least maxdist+1 of the sets, by set
+            # intersections rather than counting centroid by centroid
+            for group in combinations(holders, maxdist + 1):
+                found |= set.intersection(*group)
+        return sorted(found)
+
+def cluster_reads(distinct, maxdist=MAX_DIST, ratio=MIN_RATIO):
+    """
+    Returns a list of [centroid, reads, quality] clusters of the collapsed
+    [sequence, reads, quality] list, most abundant first. Each sequence
+    joins the nearest centroid within maxdist edits, the most abundant of
+    those equally near, that has at least ratio**edits times its reads, or
+    becomes a new centroid.
+    """
+    index = ClusterIndex(maxdist)
+    clusters = []
+    indexed = []        # cluster of each centroid in the index
+    for seq, reads, qual in distinct:
+        joined = None
+        best = maxdist + 1
+        for num in index.candidates(seq):
+            # centroids grow as members join, so a later centroid may be
+            # larger than an earlier one and each is checked
+            cluster = indexed[num]
+            if cluster[1] < ratio * reads:
+                continue
+            # only a centroid more abundant than the one joined may be as
+            # near, the rest must be nearer
+            if joined is not None and cluster[1] > joined[1]:
+                limit = best
+            else:
+                limit = best - 1
+            if limit < 1:
+                continue
+            dist = edit_distance(seq, cluster[0], limit)
+            if dist <= limit and cluster[1] >= ratio ** dist * reads:
+                joined = cluster
+                best = dist
+        if joined is not None:
+            joined[1] += reads
+            continue
+        cluster = [seq, reads, qual]
+        clusters.append(cluster)
+        # sequences come in decreasing abundance and need a centroid with
+        # ratio times their reads, so smaller centroids never gain members
+        if reads >= ratio:
+            index.add(seq)
+            indexed.append(cluster)
+    return clusters
+
+def cluster_records(records, maxdist=MAX_DIST, ratio=MIN_RATIO, metrics=None):
+    """
+    Generator that clusters (header, seq, qual) records and yields one
+    (header, centroid, quality, reads) record per cluster, which
+    sort_oligos counts as that many reads.
+    If metrics is given, reads are counted under the "cluster" stage and
+    the clusters under "cluster centroids".
+    """
+    distinct = collapse(records)
+    if metrics:
+        metrics.count("cluster", sum(reads for seq, reads, qual in distinct),
+                      sum(len(seq) * reads for seq, reads, qual in distinct))
+    clusters = cluster_reads(distinct, maxdist, ratio)
+    if metrics:
+        metrics.count("cluster centroids", len(clusters),
+                      sum(len(seq) for seq, reads, qual in clusters))
+    for num, (seq, reads, qual) in enumerate(clusters):
+        yield "centroid%d;size=%d" % (num, reads), seq, qual, reads
+
+def main():
+
+    parser = ArgumentParser()
+
+    parser.add_argument("fastq",help="FASTQ file of reads, gzipped if it ends in .gz")
+    parser.add_argument("outfile",help="FASTQ file of cluster centroids, with the reads of each in its header")
+    parser.add_argument("--max-dist",type=int,default=MAX_DIST,help="largest edit distance from a centroid to its members")
+    parser.add_argument("--ratio",type=float,default=MIN_RATIO,help="reads in a centroid per read of a sequence one edit away")
+
+    args = parser.parse_args()
+
+    from parse_fastq import readFastq
+    from custarr_to_fastq import open_output
+
+    if args.fastq.endswith(".gz"):
+        fqfile = gzip.open(args.fastq)
+    else:
+        fqfile = open(args.fastq)
+    out = open_output(args.outfile)
+    clusters = 0
+    total = 0
+    for header, seq, qual, reads in cluster_records(readFastq(fqfile), args.max_dist, args.ratio):
+        out.write("@%s\n%s\n+\n%s\n" % (header, seq, qual))
+        clusters += 1
+        total += reads
+    out.close()
+    fqfile.close()
+
+    print "Clustered %d reads into %d centroids. See %s for results." % (total, clusters, args.outfile)
+
+if __name__ == "__main__":
+    main()
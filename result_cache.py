@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+"""
+Content-addressed on-disk cache for pipeline stage results
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Each stage result is stored under a key made from a hash of the input
+file's contents and the parameters of that stage and of every stage before
+it, so a result is reused exactly when its inputs are unchanged. For
+get_unique_oligos the keys are chained:
+
+    sort      = hash(input file, scheme, strand, maxlen)
+    consensus = hash(sort key, threshold)
+
+so changing the threshold reuses the sorted counts and only recomputes the
+consensus. condense is not cached: it takes milliseconds and writes its
+files on every run anyway.
+
+Results are pickled to <cachedir>/<key>.pkl. Reading a result marks it as
+recently used, and once the cache grows past its size limit the least
+recently used results are deleted.
+
+>>> from result_cache import ResultCache, file_digest, stage_key
+>>> cache = ResultCache("cache", maxbytes=1 << 30)
+>>> key = stage_key("sort", file_digest("merged.fastq.gz"), "codon")
+>>> hit, value = cache.get(key)
+>>> if not hit:
+...     cache.put(key, compute())
+"""
+
+import os, json, errno, hashlib, tempfile
+import cPickle as pickle
+
+DEFAULT_MAXBYTES = 2 << 30      # 2 GB
+BLOCKSIZE = 1 << 20
+SUFFIX = ".pkl"
+DIGESTS = "digests.json"
+
+def file_digest(path, memo=None):
+    """
+    Returns the SHA-1 hex digest of a file's contents. If memo is a
+    dictionary, digests are remembered by path, size and modification time
+    so that an unchanged file is only hashed once.
+    """
+    stat = os.stat(path)
+    memokey = "%s:%d:%r" % (os.path.abspath(path), stat.st_size, stat.st_mtime)
+    if memo is not None and memokey in memo:
+        return memo[memokey]
+    sha = hashlib.sha1()
+    with open(path, "rb") as infile:
+        block = infile.read(BLOCKSIZE)
+        while block:
+            sha.update(block)
+            block = infile.read(BLOCKSIZE)
+    digest = sha.hexdigest()
+    if memo is not None:
+        memo[memokey] = digest
+    return digest
+
+def stage_key(stage, *params):
+    """
+    Returns the cache key of a stage run with the given parameters, which
+    must be JSON serializable (the key of an earlier stage may be one)
+    """
+    return hashlib.sha1(json.dumps([stage] + list(params), sort_keys=True)).hexdigest()
+
+class ResultCache:
+
+    def __init__(self, cachedir, maxbytes=DEFAULT_MAXBYTES):
+        """
+        Initialize ResultCache object
+        Input:
+            cachedir - directory holding the cached results
+            maxbytes - size limit of the cache, enforced after each put
+        """
+        self.cachedir = cachedir
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        try:
+            os.makedirs(cachedir)
+        except OSError as exception:
+            if exception.errno != errno.EEXIST:
+                raise
+        self._digestfile = os.path.join(cachedir, DIGESTS)
+        try:
+            with open(self._digestfile) as infile:
+                self.digests = json.load(infile)
+        except (IOError, ValueError):
+            self.digests = {}
+
+    def path(self, key):
+        return os.path.join(self.cachedir, key + SUFFIX)
+
+    def digest(self, path):
+        """
+        Returns the content digest of an input file, remembered across runs
+        """
+        known = len(self.digests)
+        digest = file_digest(path, self.digests)
+        if len(self.digests) != known:
+            with open(self._digestfile, "w") as out:
+                json.dump(self.digests, out)
+        return digest
+
+    def get(self, key):
+        """
+        Returns a tuple of (True, value) for a cached key, or (False, None)
+        """
+        path = self.path(key)
+        try:
+            with open(path, "rb") as infile:
+                value = pickle.load(infile)
+        except (IOError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return False, None
+        # the modification time records when a result was last used
+        os.utime(path, None)
+        self.hits += 1
+        return True, value
+
+    def put(self, key, value):
+        """
+        Stores a value under key and evicts old results past the size limit
+        """
+        # write to a temporary file first so a crash never leaves a partial
+        # result under the key
+        handle, tmppath = tempfile.mkstemp(dir=self.cachedir, suffix=".tmp")
+        with os.fdopen(handle, "wb") as out:
+            pickle.dump(value, out, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmppath, self.path(key))
+        self.evict()
+
+    def entries(self):
+        """
+        Returns a list of (last used time, size, path) of cached results,
+        least recently used first
+        """
+        entries = []
+        for name in os.listdir(self.cachedir):
+            if not name.endswith(SUFFIX):
+                continue
+            path = os.path.join(self.cachedir, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        return entries
+
+    def size(self):
+        return sum(size for used, size, path in self.entries())
+
+    def evict(self):
+        """
+        Deletes least recently used results until the cache fits its limit
+        """
+        entries = self.entries()
+        total = sum(size for used, size, path in entries)
+        for used, size, path in entries:
+            if total <= self.maxbytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        for used, size, path in self.entries():
+            os.remove(path)
+
+def cached_file_stage(cache, stage, func, infile, outfile, *params):
+    """
+    Runs func(infile, outfile, *params) unless the same input file and
+    parameters were run before, in which case the cached output file is
+    written instead. Returns func's return value.
+    """
+    key = stage_key(stage, cache.digest(infile), *params)
+    hit, value = cache.get(key)
+    if hit:
+        result, output = value
+        with open(outfile, "wb") as out:
+            out.write(output)
+        return result
+    result = func(infile, outfile, *params)
+    with open(outfile, "rb") as newfile:
+        cache.put(key, (result, newfile.read()))
+    return result
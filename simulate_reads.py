@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+"""
+Simulates MiSeq reads of a CustomArray order for load testing
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Reads are sampled from the oligos written by arraychunker.py or
+binarraychunker.py:
+
+- each oligo gets a log-normal abundance, so some oligos are sequenced
+  far more deeply than others
+- substitutions, insertions and deletions are placed by drawing the gap to
+  the next error from a geometric distribution, so the cost of a read
+  depends on its number of errors rather than its length
+- a fraction of reads come from the reverse strand
+- adapters are trimmed by a random amount, leaving adapter remnants
+- reads may be emitted again as exact duplicates (PCR duplicates)
+
+Base qualities are Phred 40, except Phred 10 at simulated errors.
+
+Steps to replicate:
+$ python simulate_reads.py outfile.txt reads.fastq.gz --depth 200 --seed 1
+"""
+
+import math, random, bisect
+from argparse import ArgumentParser
+
+from custarr_to_fastq import open_output, write_batched
+from get_unique_oligos import rev_comp_batch
+
+ADAPTLEN = 22           # length of universalA
+TAILLEN = 24            # RC_universalB plus the AA padding
+
+HIGHQUAL = 'I'          # Phred 40
+ERRQUAL = '+'           # Phred 10
+
+def read_orders(infile):
+    """
+    Returns the list of oligos in a chunker output file
+    """
+    return [line.strip() for line in infile if line.strip()]
+
+class ReadSimulator:
+
+    def __init__(self, orders, subrate=0.002, insrate=0.0005, delrate=0.0005,
+                 revfrac=0.5, remnant=0.3, duprate=0.05, sigma=0.5, seed=None):
+        """
+        Initialize ReadSimulator object
+        Input:
+            orders  - list of oligos to sample from
+            subrate, insrate, delrate - per-base error rates
+            revfrac - fraction of reads from the reverse strand
+            remnant - fraction of reads keeping part of the adapters
+            duprate - probability that a read is followed by a duplicate
+            sigma   - log-normal spread of oligo abundances
+        """
+        self.orders = orders
+        self.subrate = subrate
+        self.insrate = insrate
+        self.delrate = delrate
+        self.errrate = subrate + insrate + delrate
+        self.revfrac = revfrac
+        self.remnant = remnant
+        self.duprate = duprate
+        self.rng = random.Random(seed)
+
+        # cumulative abundances for weighted sampling of oligos
+        self.cumweights = []
+        total = 0.0
+        for i in xrange(len(orders)):
+            total += self.rng.lognormvariate(0.0, sigma)
+            self.cumweights.append(total)
+
+    def pick_oligo(self):
+        """
+        Returns the index of an oligo, weighted by abundance
+        """
+        x = self.rng.random() * self.cumweights[-1]
+        return bisect.bisect_right(self.cumweights, x)
+
+    def trim_adapters(self, oligo):
+        """
+        Removes the adapters, leaving random remnants on some reads
+        """
+        start = ADAPTLEN
+        end = len(oligo) - TAILLEN
+        if self.rng.random() < self.remnant:
+            start = self.rng.randint(0, ADAPTLEN)
+            end = len(oligo) - self.rng.randint(0, TAILLEN)
+        return oligo[start:end]
+
+    def mutate(self, seq):
+        """
+        Returns (seq, qual) with random substitutions, insertions and
+        deletions
+        """
+        if self.errrate <= 0.0:
+            return seq, HIGHQUAL * len(seq)
+        rng = self.rng
+        logkeep = math.log(1.0 - self.errrate)
+        pieces = []
+        quals = []
+        pos = 0
+        seqlen = len(seq)
+        while True:
+            # number of error-free bases before the next error
+            gap = int(math.log(1.0 - rng.random()) / logkeep)
+            errpos = pos + gap
+            if errpos >= seqlen:
+                break
+            pieces.append(seq[pos:errpos])
+            quals.append(HIGHQUAL * gap)
+            kind = rng.random() * self.errrate
+            if kind < self.subrate:
+                pieces.append(rng.choice('ACGT'.replace(seq[errpos], '')))
+                quals.append(ERRQUAL)
+                pos = errpos + 1
+            elif kind < self.subrate + self.insrate:
+                pieces.append(rng.choice('ACGT'))
+                quals.append(ERRQUAL)
+                pos = errpos
+            else:
+                pos = errpos + 1
+        pieces.append(seq[pos:])
+        quals.append(HIGHQUAL * (seqlen - pos))
+        return ''.join(pieces), ''.join(quals)
+
+    def batch(self, size):
+        """
+        Returns a list of size reads as (oligo index, strand, seq, qual)
+        """
+        rng = self.rng
+        reads = []
+        while len(reads) < size:
+            idx = self.pick_oligo()
+            seq, qual = self.mutate(self.trim_adapters(self.orders[idx]))
+            reverse = rng.random() < self.revfrac
+            reads.append((idx, reverse, seq, qual))
+            while len(reads) < size and rng.random() < self.duprate:
+                reads.append((idx, reverse, seq, qual))
+
+        # reverse complement the reverse strand reads together
+        revidx = [i for i, read in enumerate(reads) if read[1]]
+        flipped = rev_comp_batch([reads[i][2] for i in revidx])
+        for i, seq in zip(revidx, flipped):
+            idx, reverse, fwd, qual = reads[i]
+            reads[i] = (idx, reverse, seq, qual[::-1])
+        return reads
+
+    def reads(self, count, batchsize=10000):
+        """
+        Generator that yields count reads as (header, seq, qual)
+        """
+        readnum = 0
+        while readnum < count:
+            for idx, reverse, seq, qual in self.batch(min(batchsize, count - readnum)):
+                strand = '-' if reverse else '+'
+                yield ("sim%d oligo=%d strand=%s" % (readnum, idx, strand), seq, qual)
+                readnum += 1
+
+def write_fastq(reads, outfile, compress=None, threaded=False, batchsize=10000):
+    """
+    Writes (header, seq, qual) reads to a FASTQ file, gzipped if outfile
+    ends in .gz. Returns the number of reads written.
+    """
+    out = open_output(outfile, compress, threaded=threaded)
+    try:
+        records = ("@%s\n%s\n+\n%s\n" % read for read in reads)
+        return write_batched(records, out, batchsize)
+    finally:
+        out.close()
+
+def main():
+
+    parser = ArgumentParser()
+
+    parser.add_argument("infile",metavar="in",help="chunker output file of oligos")
+    parser.add_argument("outfile",metavar="out",help="name of output FASTQ file (.gz to compress)")
+    parser.add_argument("--depth",type=float,default=100,help="mean reads per oligo")
+    parser.add_argument("--reads",type=int,help="total number of reads (overrides depth)")
+    parser.add_argument("--subrate",type=float,default=0.002,help="substitution rate per base")
+    parser.add_argument("--insrate",type=float,default=0.0005,help="insertion rate per base")
+    parser.add_argument("--delrate",type=float,default=0.0005,help="deletion rate per base")
+    parser.add_argument("--revfrac",type=float,default=0.5,help="fraction of reverse strand reads")
+    parser.add_argument("--remnant",type=float,default=0.3,help="fraction of reads with adapter remnants")
+    parser.add_argument("--duprate",type=float,default=0.05,help="probability of a duplicate read")
+    parser.add_argument("--sigma",type=float,default=0.5,help="log-normal spread of oligo abundance")
+    parser.add_argument("--seed",type=int,help="random seed for reproducible output")
+    parser.add_argument("--compress",choices=["gzip","bgzf"],help="output compression")
+    parser.add_argument("--threaded",action="store_true",help="compress in a background thread")
+
+    args = parser.parse_args()
+
+    with open(args.infile) as infile:
+        orders = read_orders(infile)
+
+    sim = ReadSimulator(orders, args.subrate, args.insrate, args.delrate,
+                        args.revfrac, args.remnant, args.duprate, args.sigma,
+                        args.seed)
+    count = args.reads
+    if count is None:
+        count = int(args.depth * len(orders))
+
+    written = write_fastq(sim.reads(count), args.outfile, args.compress, args.threaded)
+
+    print "Simulated %d reads from %d oligos in %s" % (written, len(orders), args.outfile)
+
+if __name__ == "__main__":
+    main()
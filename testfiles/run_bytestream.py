@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+"""
+Test script for the binary-safe byte stream codec
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Encodes files of random bytes, including every byte value, newlines and
+NULs, with both schemes and block sizes around the file size, and checks
+that they decode back byte for byte. A stream cut short before its end
+frame, or a frame missing bases, must raise IOError. Exits with status 1
+if any check fails.
+
+$ python testfiles/run_bytestream.py
+"""
+
+import os, sys, random, shutil, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ASCIIcodons import TextToDNA, DNAToText
+from binaryDNA import BinaryTextToDNA, DNAToBinaryText
+
+BLOCK = 100
+
+rand = random.Random(42)
+contents = ["", "\n", "\r\n  padded line  \r\n", "".join(map(chr, xrange(256)))]
+contents += ["".join(chr(rand.randrange(256)) for i in xrange(size))
+             for size in (BLOCK - 1, BLOCK, BLOCK + 1, 3 * BLOCK + 7)]
+
+codecs = [("codon", TextToDNA(), DNAToText()),
+          ("binary", BinaryTextToDNA(), DNAToBinaryText())]
+
+tmpdir = tempfile.mkdtemp()
+failed = False
+try:
+    original = os.path.join(tmpdir, "original.bin")
+    dna = os.path.join(tmpdir, "dna.txt")
+    copy = os.path.join(tmpdir, "copy.bin")
+    for scheme, encoder, decoder in codecs:
+        for data in contents:
+            with open(original, "wb") as out:
+                out.write(data)
+            encoded = encoder.translate_stream(original, dna, BLOCK)
+            decoded = decoder.translate_stream(dna, copy)
+            with open(copy, "rb") as result:
+                back = result.read()
+            if back != data or encoded != decoded != len(data):
+                print "FAILED: %s round trip of %d bytes gave %d bytes" % (scheme, len(data), len(back))
+                failed = True
+
+        with open(dna) as infile:
+            frames = infile.readlines()
+        for name, damaged in [("truncated", frames[:-1]),
+                              ("short frame", [frames[0][:-5] + "\n"] + frames[1:]),
+                              ("frame cut mid byte", [frames[0][:-6] + "\n"] + frames[1:]),
+                              ("empty frame", ["\n"] + frames)]:
+            with open(dna, "w") as out:
+                out.writelines(damaged)
+            try:
+                decoder.translate_stream(dna, copy)
+            except IOError:
+                pass
+            else:
+                print "FAILED: %s %s stream decoded without an error" % (scheme, name)
+                failed = True
+finally:
+    shutil.rmtree(tmpdir)
+
+if not failed:
+    print "Byte streams round tripped with both schemes, damaged streams rejected"
+
+sys.exit(1 if failed else 0)
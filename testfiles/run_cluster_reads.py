@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+"""
+Test script for joining reads to near-duplicate clusters
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Centroid A starts out more abundant than centroid B, two edits away, but
+B grows past A as reads one edit from it join. A later read one edit from
+both must join B, the more abundant of the two, and not found a cluster
+of its own. Exits with status 1 if any check fails.
+
+$ python testfiles/run_cluster_reads.py
+"""
+
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from read_clusters import cluster_reads
+
+RATIO = 2.0
+
+def substitute(seq, pos):
+    """
+    Returns seq with the base at pos changed
+    """
+    return seq[:pos] + {"A": "C", "C": "G", "G": "T", "T": "A"}[seq[pos]] + seq[pos + 1:]
+
+seqa = "ACGTTGCAAGTCTTGACCATGAGCTTACGGATCAGTTCAAGGCTGATCCTAGTTGCAGTA"
+seqx = substitute(seqa, 5)
+seqb = substitute(seqx, 30)
+member = substitute(seqb, 50)
+
+distinct = [[seqa, 100, "I" * len(seqa)],
+            [seqb, 90, "I" * len(seqb)],
+            [member, 40, "I" * len(member)],
+            [seqx, 10, "I" * len(seqx)]]
+
+failed = False
+
+clusters = dict((seq, reads) for seq, reads, qual in cluster_reads(distinct, ratio=RATIO))
+expected = {seqa: 100, seqb: 140}
+if clusters != expected:
+    print "FAILED: clusters of %s reads, expected %s" % (
+        sorted(clusters.values(), reverse=True), sorted(expected.values(), reverse=True))
+    failed = True
+else:
+    print "Read joined the grown centroid"
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+"""
+Test script for compression of profile text
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Runs the compression docstring example, then round trips profiles through
+every available method, and through zlib with a dictionary trained on
+them, which must also be smaller than zlib alone. Plain text must pass
+through decode_text unchanged. Data compressed with a dictionary must be
+rejected by decompress without it or with another one, and passed through
+by decode_text. A truncated deflate stream must decompress to a prefix
+of the profile. Exits with status 1 if any check fails.
+
+$ python testfiles/run_compression.py
+"""
+
+import os, sys, doctest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import compression
+from compression import (Compressor, methods, decompress, decode_text,
+                         train_dictionary)
+
+profiles = ["Person %d enjoys hiking, reading science fiction novels and "
+            "cooking Italian food on weekends with friends." % num for num in xrange(20)]
+profiles += ["", "x", "".join(map(chr, xrange(1, 256)))]
+
+failed = False
+
+if doctest.testmod(compression).failed:
+    print "FAILED: compression docstring example"
+    failed = True
+
+dictionary = train_dictionary(profiles[:20])
+compressors = [(method, Compressor(method)) for method in methods]
+compressors.append(("zlib+dict", Compressor("zlib", dictionary=dictionary)))
+for name, compressor in compressors:
+    for text in profiles:
+        data = compressor.compress(text)
+        if decompress(data, dictionary) != text or decode_text(data, dictionary) != text:
+            print "FAILED: %s round trip of %r" % (name, text[:20])
+            failed = True
+
+plain = sum(len(Compressor("zlib").compress(text)) for text in profiles[:20])
+primed = sum(len(compressors[-1][1].compress(text)) for text in profiles[:20])
+if primed >= plain:
+    print "FAILED: dictionary compressed to %d bytes, zlib alone to %d" % (primed, plain)
+    failed = True
+
+for text in profiles[:20]:
+    if decode_text(text) != text:
+        print "FAILED: plain text %r changed by decode_text" % text[:20]
+        failed = True
+
+data = compressors[-1][1].compress(profiles[0])
+for wrong in (None, dictionary[:-1] + "!"):
+    try:
+        decompress(data, wrong)
+    except ValueError:
+        pass
+    else:
+        print "FAILED: decompressed without the right dictionary"
+        failed = True
+    if decode_text(data, wrong) != data:
+        print "FAILED: decode_text changed data it could not decompress"
+        failed = True
+
+for name, compressor in [("zlib", Compressor("zlib")), compressors[-1]]:
+    data = compressor.compress(profiles[0])
+    for cut in (1, 5, len(data) // 2):
+        partial = decode_text(data[:-cut], dictionary)
+        if partial == data[:-cut] or not profiles[0].startswith(partial):
+            print "FAILED: %s stream cut by %d decoded to %r" % (name, cut, partial[:20])
+            failed = True
+
+if not failed:
+    print "Profiles round tripped with %s and a dictionary" % ", ".join(methods)
+sys.exit(1 if failed else 0)
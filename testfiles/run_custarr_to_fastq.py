@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+"""
+Test script for converting CustomArray orders to FASTQ
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Converts an order of a few hundred KB to plain, gzip and BGZF FASTQ,
+with and without the background compression thread, and reads each back
+with parse_fastq. BGZF output must also be a chain of gzip members of at
+most 64 KB, each recording its own size, ending in the empty EOF block.
+Exits with status 1 if any check fails.
+
+$ python testfiles/run_custarr_to_fastq.py
+"""
+
+import os, sys, gzip, random, shutil, struct, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from custarr_to_fastq import convert, BGZF_EOF
+from parse_fastq import readFastq
+
+rand = random.Random(30)
+oligos = ["".join(rand.choice("ACGT") for i in xrange(150)) for num in xrange(2000)]
+
+def bgzf_blocks(path):
+    """
+    Returns the sizes of the BGZF blocks of a file, or None if it is not
+    a valid chain of blocks
+    """
+    with open(path, "rb") as infile:
+        data = infile.read()
+    sizes = []
+    pos = 0
+    while pos < len(data):
+        header = data[pos:pos + 18]
+        if len(header) < 18 or header[:4] != "\x1f\x8b\x08\x04" or header[12:14] != "BC":
+            return None
+        bsize = struct.unpack("<H", header[16:18])[0] + 1
+        sizes.append(struct.unpack("<I", data[pos + bsize - 4:pos + bsize])[0])
+        pos += bsize
+    if pos != len(data) or not data.endswith(BGZF_EOF):
+        return None
+    return sizes
+
+tmpdir = tempfile.mkdtemp()
+failed = False
+try:
+    order = os.path.join(tmpdir, "order.txt")
+    with open(order, "w") as out:
+        out.write("\n".join(oligos) + "\n\n")
+
+    for name, compress, threaded in [("reads.fastq", None, False),
+                                     ("reads.fastq.gz", None, False),
+                                     ("reads.fastq.gz", None, True),
+                                     ("reads.bgzf.gz", "bgzf", False),
+                                     ("reads.bgzf.gz", "bgzf", True)]:
+        outfile = os.path.join(tmpdir, name)
+        convert(order, outfile, "F", compress, threaded=threaded, batchsize=333)
+        opener = gzip.open if name.endswith(".gz") else open
+        with opener(outfile) as infile:
+            records = list(readFastq(infile))
+        label = "%s%s" % (compress or name, " threaded" if threaded else "")
+        if [seq for header, seq, qual in records] != oligos:
+            print "FAILED: %s reads do not match the order" % label
+            failed = True
+        elif any(qual != "F" * len(seq) for header, seq, qual in records):
+            print "FAILED: %s quality strings are wrong" % label
+            failed = True
+        if compress == "bgzf":
+            sizes = bgzf_blocks(outfile)
+            if sizes is None or sizes[-1] != 0 or max(sizes) > 65536 or len(sizes) < 3:
+                print "FAILED: %s is not a chain of BGZF blocks" % label
+                failed = True
+        os.remove(outfile)
+finally:
+    shutil.rmtree(tmpdir)
+
+if not failed:
+    print "Plain, gzip and BGZF output read back, threaded and not"
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+"""
+Test script for indexed access to FASTA files
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Writes FASTA files with wrapped records and checks that every record
+and base range fetched through the .fai index matches the sequence
+written, with Unix and Windows line ends. A blank line between the lines
+of a record would shift the offsets of the rest of the file, so indexing
+it must raise ValueError. Exits with status 1 if any check fails.
+
+$ python testfiles/run_fasta_index.py
+"""
+
+import os, sys, random, shutil, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fasta_index import IndexedFasta, build_index
+
+rand = random.Random(28)
+records = [("person%d" % num, "".join(rand.choice("ACGT") for i in xrange(length)))
+           for num, length in enumerate([150, 60, 7, 0, 121])]
+
+def fasta_text(records, width, newline):
+    lines = []
+    for name, seq in records:
+        lines.append(">%s description" % name)
+        lines.extend(seq[i:i + width] for i in xrange(0, len(seq), width))
+    return newline.join(lines) + newline
+
+tmpdir = tempfile.mkdtemp()
+failed = False
+try:
+    for newline in ("\n", "\r\n"):
+        path = os.path.join(tmpdir, "infile.fasta")
+        with open(path, "wb") as out:
+            out.write(fasta_text(records, 60, newline))
+        with IndexedFasta(path) as fasta:
+            if fasta.names() != [name for name, seq in records]:
+                print "FAILED: record names %s" % fasta.names()
+                failed = True
+            for pos, (name, seq) in enumerate(records):
+                if fasta.fetch(name) != seq or fasta.fetch(pos) != seq:
+                    print "FAILED: record %s fetched wrong with %r line ends" % (name, newline)
+                    failed = True
+                for start, end in [(0, 1), (5, 65), (59, 61), (60, 120), (100, 1000)]:
+                    if fasta.fetch(name, start, end) != seq[start:end]:
+                        print "FAILED: bases %d to %d of %s fetched wrong" % (start, end, name)
+                        failed = True
+        os.remove(path + ".fai")
+
+    # blank lines after a record are harmless, inside one they are not
+    path = os.path.join(tmpdir, "trailing.fasta")
+    with open(path, "wb") as out:
+        out.write(fasta_text(records[:2], 60, "\n").replace(">person1", "\n\n>person1"))
+    entries = build_index(path)
+    if [e.length for e in entries] != [150, 60]:
+        print "FAILED: blank lines between records changed the index"
+        failed = True
+    path = os.path.join(tmpdir, "blank.fasta")
+    with open(path, "wb") as out:
+        lines = fasta_text(records[:2], 60, "\n").split("\n")
+        lines.insert(2, "")
+        out.write("\n".join(lines))
+    try:
+        build_index(path)
+    except ValueError:
+        pass
+    else:
+        print "FAILED: blank line inside a record was indexed"
+        failed = True
+finally:
+    shutil.rmtree(tmpdir)
+
+if not failed:
+    print "All records and ranges fetched, blank line inside a record rejected"
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+"""
+Test script for reading frame detection and partial codon trimming
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Runs the frame_detect docstring example, then checks that best_frame
+finds the frame of codon encoded text shifted by 0 to 3 bases and with 0
+to 3 extra bases at the end. Each shifted read is also sorted with
+get_unique_oligos.sort_oligos, cut 1 to 3 bases into its last codon, and
+the partial codon must be trimmed so that the rest of the read counts.
+Exits with status 1 if any check fails.
+
+$ python testfiles/run_frame_detect.py
+"""
+
+import os, sys, doctest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import frame_detect
+from frame_detect import best_frame
+from ASCIIcodons import TextToDNA, DNAToText
+from get_unique_oligos import sort_oligos
+
+text = "Enjoys hiking, 3 cats and reading about DNA storage."
+lead = ["", "T", "GA", "CAT"]
+tail = ["", "G", "TC", "AGT"]
+
+failed = False
+
+if doctest.testmod(frame_detect).failed:
+    print "FAILED: frame_detect docstring example"
+    failed = True
+
+dna = TextToDNA().text_to_dna(text)
+for frame in xrange(4):
+    for extra in tail:
+        found, decoded, score = best_frame(lead[frame] + dna + extra)
+        if (found, decoded) != (frame, text):
+            print "FAILED: frame %d with %d extra bases found frame %d: %r" % (
+                frame, len(extra), found, decoded)
+            failed = True
+
+tag = "#01$002"
+message = "Tagged read of any length"
+oligo = TextToDNA().text_to_dna(tag + message)
+tfunc = DNAToText().dna_to_text
+taglen = 4 * len(tag)
+for frame in xrange(1, 4):
+    for cut in xrange(1, 4):
+        read = lead[frame] + oligo[:-cut]
+        ramdict = sort_oligos([("@read", read, "I" * len(read))], tfunc, maxlen=len(read))
+        counters = ramdict.get("01", {}).get("002", [])
+        consensus = "".join(counter.argMax() for counter in counters)
+        if len(consensus) % 4 or tfunc(consensus) != message[:-1]:
+            print "FAILED: read shifted %d bases and cut %d bases counted %d bases: %r" % (
+                frame, cut, len(consensus), tfunc(consensus[:len(consensus) - len(consensus) % 4]))
+            failed = True
+
+if not failed:
+    print "Frames found at every offset, partial codons trimmed from sorted reads"
+sys.exit(1 if failed else 0)
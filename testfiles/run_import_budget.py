@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+"""
+Test script to check import times and side-effect-free translators
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Each module is imported in a fresh interpreter several times, alternating
+with a baseline import of the json package, and the fastest import of
+each is kept. Imports are timed in CPU time, which other processes on a
+loaded machine do not add to, and the module's import time must stay
+within its budget, a multiple of the baseline, so that the check also
+holds on slow machines. Constructing the translators must not write anything to
+stdout. Exits with status 1 if any check fails.
+
+$ python testfiles/run_import_budget.py
+"""
+
+import os, sys, subprocess
+
+REPEAT = 7
+BASELINE = "json"       # a small pure Python package from the standard library
+
+# import time budget of each module as a multiple of the baseline import
+budgets = [("ASCIIcodons",         5),
+           ("binaryDNA",           5),
+           ("parse_fastq",         6),
+           ("oligo_decode",       15),
+           ("get_unique_oligos",  45)]
+
+timing = "import sys, time; t = time.clock(); import %s; sys.stdout.write(repr(time.clock() - t))"
+
+construct = ("import ASCIIcodons, binaryDNA\n"
+             "ASCIIcodons.TextToDNA(); ASCIIcodons.DNAToText()\n"
+             "binaryDNA.BinaryTextToDNA(); binaryDNA.DNAToBinaryText()\n")
+
+# run from the top of the repository so the modules can be imported
+topdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run(code):
+    return subprocess.check_output([sys.executable, "-c", code], cwd=topdir)
+
+def best_imports(module):
+    """
+    Returns the fastest import times in ms of module and of the baseline,
+    measured in turn so that both see the same load
+    """
+    times = []
+    for i in xrange(REPEAT):
+        times.append((float(run(timing % module)), float(run(timing % BASELINE))))
+    return min(t for t, base in times) * 1000, min(base for t, base in times) * 1000
+
+failed = False
+
+for module, budget in budgets:
+    best, base = best_imports(module)
+    ratio = best / base
+    status = "ok" if ratio <= budget else "OVER BUDGET"
+    print "%-20s %6.1f ms, %4.1fx %s at %.1f ms (budget %dx) %s" % (
+        module, best, ratio, BASELINE, base, budget, status)
+    failed = failed or ratio > budget
+
+output = run(construct)
+if output:
+    print "Translator construction wrote to stdout: %r" % output
+    failed = True
+else:
+    print "Translator construction is silent"
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+"""
+Test script for the Bloom filter screen against the oligo library
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Fills Bloom filters of several sizes with random 16-mers. Every item added
+must be found, and the false positive rate on other random 16-mers must be
+within half again of the requested rate. Then screens reads of a small
+codon order, on both strands and with extra bases at either end, mixed
+with random reads. Every library read must pass and almost every random
+read must be dropped, with the reads counted in the metrics. Exits with
+status 1 if any check fails.
+
+$ python testfiles/run_library_screen.py
+"""
+
+import os, sys, random, shutil, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from library_screen import BloomFilter, build_filter, screen_reads
+from order_pipeline import build_order
+from get_unique_oligos import rev_comp_batch
+from pipeline_metrics import PipelineMetrics
+
+rand = random.Random(46)
+TRIALS = 50000
+
+def junk(length):
+    return "".join(rand.choice("ACGT") for i in xrange(length))
+
+failed = False
+
+for capacity, fprate in [(20000, 0.01), (20000, 0.001), (2000, 0.05)]:
+    bloom = BloomFilter(capacity, fprate)
+    items = set()
+    while len(items) < capacity:
+        items.add(junk(16))
+    for item in items:
+        bloom.add(item)
+    if not all(item in bloom for item in items):
+        print "FAILED: filter for %d items at %g lost an item" % (capacity, fprate)
+        failed = True
+    falsehits = trials = 0
+    while trials < TRIALS:
+        item = junk(16)
+        if item not in items:
+            trials += 1
+            falsehits += item in bloom
+    if falsehits > 1.5 * fprate * TRIALS:
+        print "FAILED: filter for %d items at %g had false positive rate %g" % (
+            capacity, fprate, float(falsehits) / TRIALS)
+        failed = True
+
+profiles = [("person%d" % num, "Profile %d: enjoys hiking and DNA storage. " % num * 4)
+            for num in xrange(3)]
+tmpdir = tempfile.mkdtemp()
+try:
+    order = os.path.join(tmpdir, "order.txt")
+    build_order(profiles, order, "codon")
+    with open(order) as infile:
+        oligos = [line.strip() for line in infile if line.strip()]
+    bloom = build_filter(order)
+
+    library = [junk(rand.randint(0, 5)) + oligo + junk(rand.randint(0, 5)) for oligo in oligos]
+    library += rev_comp_batch(library)
+    offtarget = [junk(150) for i in xrange(1000)]
+    records = [("read%d" % num, seq, "I" * len(seq))
+               for num, seq in enumerate(library + offtarget)]
+    rand.shuffle(records)
+
+    metrics = PipelineMetrics()
+    kept = set(rec[1] for rec in screen_reads(records, bloom, metrics=metrics))
+    if not kept.issuperset(library):
+        print "FAILED: %d of %d library reads dropped" % (len(set(library) - kept), len(library))
+        failed = True
+    if len(kept & set(offtarget)) > 10:
+        print "FAILED: %d of %d random reads kept" % (len(kept & set(offtarget)), len(offtarget))
+        failed = True
+    if metrics.stages["library screen"]["reads"] != len(records) or \
+            metrics.rejected["library screen"].get("off library") != len(records) - len(kept):
+        print "FAILED: screen counted %r and rejected %r" % (
+            metrics.stages["library screen"], metrics.rejected["library screen"])
+        failed = True
+finally:
+    shutil.rmtree(tmpdir)
+
+if not failed:
+    print "Bloom filters held their false positive rates, off library reads screened out"
+sys.exit(1 if failed else 0)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+"""
+Test script for stopping live decoding with Ctrl-C
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Live decoding is interrupted with KeyboardInterrupt partway through a
+poll, and partway through sorting a batch of a growing FASTQ file and of
+a directory of chunks. follow must stop cleanly, read the rest of the
+source in a final pass without reading any record twice, and decode the
+profile. Only the batch being sorted at the interrupt may be lost. Exits
+with status 1 if any check fails.
+
+$ python testfiles/run_live_decode.py
+"""
+
+import os, sys, shutil, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from live_decode import LiveDecoder, FastqTail, ChunkDirectory, follow
+from ASCIIcodons import TextToDNA
+
+THRESHOLD = 10
+COPIES = 20
+BATCH = 5
+
+encode = TextToDNA().text_to_dna
+chunks = ["Person 0 likes ", "long walks and ", "DNA storage"]
+reads = []
+for oid, chunk in enumerate(chunks):
+    seq = encode("#00$%03d" % oid) + encode(chunk)
+    reads += [("read%d" % len(reads), seq, "I" * len(seq)) for copy in xrange(COPIES)]
+
+class InterruptedSource:
+    """
+    Yields some reads, then raises KeyboardInterrupt until the final poll,
+    which yields the rest
+    """
+
+    def __init__(self, reads, stop):
+        self.reads = reads
+        self.stop = stop
+
+    def poll(self, final=False):
+        if not final:
+            for rec in self.reads[:self.stop]:
+                yield rec
+            raise KeyboardInterrupt
+        for rec in self.reads[self.stop:]:
+            yield rec
+
+class InterruptedDecoder(LiveDecoder):
+    """
+    Raises KeyboardInterrupt instead of sorting its third batch
+    """
+
+    def add_reads(self, records):
+        self.calls = getattr(self, "calls", 0) + 1
+        if self.calls == 3:
+            raise KeyboardInterrupt
+        LiveDecoder.add_reads(self, records)
+
+def check(name, source, decoder, expected):
+    try:
+        follow(source, decoder, interval=0, batchsize=BATCH)
+    except KeyboardInterrupt:
+        print "FAILED: %s: KeyboardInterrupt was not caught" % name
+        return False
+    if decoder.reads != expected:
+        print "FAILED: %s: sorted %d reads, expected %d" % (name, decoder.reads, expected)
+        return False
+    if decoder.decodable() != ["00"] or decoder.text("00") != "".join(chunks):
+        print "FAILED: %s: profile decoded as %r" % (name, decoder.text("00"))
+        return False
+    return True
+
+failed = False
+lengths = {"00": len(chunks)}
+
+# interrupted while reading the middle of a batch
+source = InterruptedSource(reads, THRESHOLD + 2)
+if not check("interrupted poll", source, LiveDecoder(threshold=THRESHOLD, lengths=lengths),
+             len(reads)):
+    failed = True
+
+tmpdir = tempfile.mkdtemp()
+try:
+    fastq = "".join("@%s\n%s\n+\n%s\n" % rec for rec in reads)
+    path = os.path.join(tmpdir, "merged.fastq")
+    with open(path, "w") as out:
+        out.write(fastq)
+    tail = FastqTail(path)
+    if not check("growing file", tail, InterruptedDecoder(threshold=THRESHOLD, lengths=lengths),
+                 len(reads) - BATCH):
+        failed = True
+    tail.close()
+
+    chunkdir = os.path.join(tmpdir, "chunks")
+    os.mkdir(chunkdir)
+    with open(os.path.join(chunkdir, "chunk0.fastq"), "w") as out:
+        out.write(fastq)
+    source = ChunkDirectory(chunkdir)
+    list(source.poll())         # first sight of the chunk, to see its size
+    if not check("chunk directory", source, InterruptedDecoder(threshold=THRESHOLD, lengths=lengths),
+                 len(reads) - BATCH):
+        failed = True
+finally:
+    shutil.rmtree(tmpdir)
+
+if not failed:
+    print "Interrupted polls and batches stopped cleanly and the profile decoded"
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+"""
+Test script for merging read pairs whose sequence repeats
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+R1 ends and R2 starts with the same repeated word, so a short exact
+overlap of just that word fits as well as the true overlap, which spans
+both copies and the bases between them. merge_pair must pick the true
+overlap and rebuild the fragment. Exits with status 1 if any check fails.
+
+$ python testfiles/run_merge_pairs.py
+"""
+
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parse_fastq import find_overlap, merge_pair, complement
+
+WORD = "ACGTTGCAAGTC"
+BEFORE = "TTGACCATGAGCTTACGGATCAGTTCAAGGCT"
+BETWEEN = "GATCCTAGTTGCAGTACCGA"
+AFTER = "CCTAGGAATTCGTCAGGTTAACGGTACATGCA"
+
+fragment = BEFORE + WORD + BETWEEN + WORD + AFTER
+readlen = len(BEFORE) + 2 * len(WORD) + len(BETWEEN)
+seq1 = fragment[:readlen]
+seq2 = fragment[-readlen:]
+truth = len(fragment) - readlen
+
+rec1 = ("pair/1", seq1, "I" * readlen)
+rec2 = ("pair/2", seq2.translate(complement)[::-1], "I" * readlen)
+
+failed = False
+
+found = find_overlap(seq1, seq2)
+if found != (truth, 0):
+    print "FAILED: overlap found at %r, expected offset %d" % (found, truth)
+    failed = True
+else:
+    print "Overlap found at offset %d" % truth
+
+merged = merge_pair(rec1, rec2)
+if merged is None or merged[1] != fragment:
+    print "FAILED: merged read does not match the fragment"
+    failed = True
+else:
+    print "Merged read matches the fragment"
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+"""
+Test script for adapter-aware decoding of orders and reads
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Builds a codon and a binary order in a temporary directory and decodes it
+with decode_file, both as the order file and as FASTQ reads that carry
+extra bases outside the adapters. Each decoded line must start with the
+tag of its person and oligo, and the chunks of each person must rebuild
+the profile. Reads without a tag must be skipped. Exits with status 1 if
+any check fails.
+
+$ python testfiles/run_oligo_decode.py
+"""
+
+import os, sys, random, shutil, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from order_pipeline import build_order
+from oligo_decode import decode_file
+
+profiles = [("person0", "Person 0 likes long walks and DNA storage, " * 3),
+            ("person1", "Short profile"),
+            ("person2", "Tabs\tand punctuation: 1+1=2; done.")]
+
+rand = random.Random(29)
+
+def junk(length):
+    return "".join(rand.choice("ACGT") for i in xrange(length))
+
+def check(outfile, scheme, source):
+    """
+    Returns True if the decoded lines rebuild every profile
+    """
+    with open(outfile) as infile:
+        lines = [line.rstrip("\n") for line in infile]
+    texts = {}
+    for line in lines:
+        pid = int(line[1:3])
+        if line[:4] != "#%02d$" % pid or int(line[4:7]) != len(texts.get(pid, [])):
+            print "FAILED: %s %s line out of order: %r" % (scheme, source, line[:7])
+            return False
+        texts.setdefault(pid, []).append(line[7:])
+    for pid, (name, text) in enumerate(profiles):
+        if not "".join(texts.get(pid, [])).startswith(text):
+            print "FAILED: %s %s did not rebuild %s" % (scheme, source, name)
+            return False
+    return True
+
+tmpdir = tempfile.mkdtemp()
+failed = False
+try:
+    for scheme in ("codon", "binary"):
+        order = os.path.join(tmpdir, scheme + ".txt")
+        outfile = os.path.join(tmpdir, scheme + "_decoded.txt")
+        build_order(profiles, order, scheme)
+        with open(order) as infile:
+            oligos = [line.strip() for line in infile if line.strip()]
+
+        decoded, skipped = decode_file(order, outfile, scheme)
+        if (decoded, skipped) != (len(oligos), 0):
+            print "FAILED: %s order decoded %d and skipped %d" % (scheme, decoded, skipped)
+            failed = True
+        elif not check(outfile, scheme, "order"):
+            failed = True
+
+        fastq = os.path.join(tmpdir, scheme + ".fastq")
+        with open(fastq, "w") as out:
+            for num, oligo in enumerate(oligos + [junk(150)]):
+                read = junk(num % 5) + oligo + junk(3)
+                out.write("@read%d\n%s\n+\n%s\n" % (num, read, "I" * len(read)))
+        decoded, skipped = decode_file(fastq, outfile, scheme, fastq=True)
+        if (decoded, skipped) != (len(oligos), 1):
+            print "FAILED: %s reads decoded %d and skipped %d" % (scheme, decoded, skipped)
+            failed = True
+        elif not check(outfile, scheme, "reads"):
+            failed = True
+finally:
+    shutil.rmtree(tmpdir)
+
+if not failed:
+    print "Codon and binary orders and reads decoded"
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+"""
+Test script for the oligo library quality checks
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Builds a small library of random oligos in the chunker layout, with one
+oligo of each kind of fault: low GC content, a long homopolymer, a tag
+used twice and a payload copied from another oligo. check_library must
+flag exactly those, and must not flag the bases each chunk repeats from
+the chunk before it, or the stuffer padding. Exits with status 1 if any
+check fails.
+
+$ python testfiles/run_oligo_qc.py
+"""
+
+import os, sys, random, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from oligo_qc import check_library
+
+TAGLEN = 28
+OVERLAP = 30
+STUFFER = "TGAC"
+K = 16
+MAXSHARED = 0.1        # below the share of repeated or padded k-mers
+
+rand = random.Random(4)
+
+def bases(length):
+    """
+    Returns a random sequence with balanced GC content
+    """
+    return "".join(rand.choice("ACGT") for i in xrange(length))
+
+universalA = bases(22)
+tailB = bases(22) + "AA"
+
+def oligo(tag, payload):
+    return universalA + tag + payload + tailB
+
+tags = [bases(TAGLEN) for i in xrange(13)]
+chunks = [bases(100)]
+for num in xrange(6):
+    # consecutive chunks repeat OVERLAP bases, the last is padded
+    chunks.append(chunks[-1][-OVERLAP:] + bases(100 - OVERLAP))
+chunks[-1] = chunks[-1][:40] + STUFFER * 15
+# a second person, whose last chunk is padded with the same stuffer
+chunks.append(bases(100))
+chunks.append(chunks[-1][-OVERLAP:] + bases(6) + STUFFER * 16)
+
+library = [oligo(tag, chunk) for tag, chunk in zip(tags, chunks)]
+faults = {}
+faults[len(library)] = "gc="
+library.append(oligo(tags[9], "AT" * 50))
+faults[len(library)] = "homopolymer="
+library.append(oligo(tags[10], bases(40) + "G" * 9 + bases(51)))
+faults[len(library)] = "duplicate tag"
+library.append(oligo(tags[0], bases(100)))
+faults[0] = "duplicate tag"
+faults[len(library)] = "payload kmers shared="
+library.append(oligo(tags[11], chunks[2][:10] + bases(20) + chunks[3][-70:]))
+faults[3] = "payload kmers shared="
+
+handle, path = tempfile.mkstemp(suffix=".txt")
+with os.fdopen(handle, "w") as out:
+    out.write("\n".join(library) + "\n")
+
+failed = False
+try:
+    summary, violations = check_library(path, TAGLEN, K, maxshared=MAXSHARED,
+                                        overlap=OVERLAP, stuffer=STUFFER)
+finally:
+    os.remove(path)
+
+found = dict((lineno, failed) for lineno, seq, failed in violations)
+for lineno in sorted(set(found) | set(faults)):
+    checks = found.get(lineno, [])
+    if lineno not in faults:
+        print "FAILED: oligo %d flagged for %s" % (lineno, ", ".join(checks))
+        failed = True
+    elif not any(check.startswith(faults[lineno]) for check in checks):
+        print "FAILED: oligo %d not flagged for %s" % (lineno, faults[lineno])
+        failed = True
+if summary['oligos'] != len(library):
+    print "FAILED: checked %d oligos of %d" % (summary['oligos'], len(library))
+    failed = True
+if not failed:
+    print "Flagged exactly the %d faulty oligos" % len(faults)
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+"""
+Test script for the in-process encode, chunk and verify pipeline
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Builds codon and binary orders from text, from already encoded FASTA and
+with outer code parity oligos. Every record must round trip, the order
+file must hold as many oligos as reported, and the check file must hold
+the tagged text of each data oligo. Exits with status 1 if any check
+fails.
+
+$ python testfiles/run_order_pipeline.py
+"""
+
+import os, sys, shutil, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from order_pipeline import build_order, get_encoder, read_text_records, read_fasta_records
+
+profiles = ["Person 0 likes long walks and DNA storage, " * 4,
+            "Short profile",
+            "Tabs\tand punctuation: 1+1=2; done."]
+
+tmpdir = tempfile.mkdtemp()
+failed = False
+try:
+    textfile = os.path.join(tmpdir, "profiles.txt")
+    with open(textfile, "w") as out:
+        out.write("\n".join(profiles) + "\n")
+
+    for scheme in ("codon", "binary"):
+        encode = get_encoder(scheme)
+        fastafile = os.path.join(tmpdir, scheme + ".fasta")
+        with open(fastafile, "w") as out:
+            for num, text in enumerate(profiles):
+                out.write(">person%d\n%s\n" % (num, encode(text)))
+
+        for label, records, options in [("text", read_text_records(textfile), {}),
+                                        ("fasta", read_fasta_records(fastafile), {'encoded': True}),
+                                        ("parity", read_text_records(textfile), {'parity': 2})]:
+            order = os.path.join(tmpdir, "order.txt")
+            checkfile = os.path.join(tmpdir, "check.txt")
+            report = build_order(records, order, scheme, checkfile=checkfile, **options)
+            with open(order) as infile:
+                oligos = [line for line in infile if line.strip()]
+            with open(checkfile) as infile:
+                decoded = [line.rstrip("\n") for line in infile]
+            name = "%s %s" % (scheme, label)
+            if report['mismatches'] or report['records'] != len(profiles):
+                print "FAILED: %s round trip of %s" % (name, report)
+                failed = True
+            if report['oligos'] != len(oligos):
+                print "FAILED: %s reported %d oligos and wrote %d" % (name, report['oligos'], len(oligos))
+                failed = True
+            parity = options.get('parity', 0) * len(profiles)
+            if len(decoded) != len(oligos) - parity:
+                print "FAILED: %s check file has %d lines" % (name, len(decoded))
+                failed = True
+            for pid, text in enumerate(profiles):
+                lines = [line for line in decoded if line.startswith("#%02d$" % pid)]
+                if not "".join(line[7:] for line in lines).startswith(text):
+                    print "FAILED: %s check file does not rebuild person %d" % (name, pid)
+                    failed = True
+finally:
+    shutil.rmtree(tmpdir)
+
+if not failed:
+    print "Text, FASTA and parity orders round tripped for both schemes"
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+"""
+Test script for the Reed-Solomon outer code across each person's oligos
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Checks that any k of k data and nparity parity payloads recover the data,
+and that fewer do not. Builds codon and binary orders with parity oligos,
+takes the oligos as a consensus, drops as many data oligos as there are
+parity oligos and adds a spurious oligo ID: recover_oligos must return
+exactly the data oligos and condense must rebuild every profile. Without
+the outer code, condense must leave out the parity oligos. Finally the
+chunkers are run with --parity, then again with --records, and the
+manifest must keep the persons that were not chunked again. Exits with
+status 1 if any check fails.
+
+$ python testfiles/run_outer_code.py
+"""
+
+import os, sys, random, shutil, tempfile, subprocess
+from itertools import combinations
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from outer_code import (encode_parity, recover, parity_x, read_manifest,
+                        recover_oligos, MANIFEST_SUFFIX)
+from order_pipeline import build_order, get_encoder
+from oligo_decode import schemes, get_translator, frame_payload
+from get_unique_oligos import condense
+from pipeline_metrics import PipelineMetrics
+
+rand = random.Random(49)
+NPARITY = 3
+chunkers = {'codon': ("arraychunker.py", "76", "76", "TGAC"),
+            'binary': ("binarraychunker.py", "48", "48", "ACGACTGT")}
+
+profiles = [("person%d" % num, "Profile %d: enjoys hiking, chess and DNA storage. " % num * (num + 2))
+            for num in xrange(3)]
+
+failed = False
+
+# any k of the k + nparity payloads recover the data
+data = ["".join(chr(rand.randint(0, 255)) for i in xrange(19)) for j in xrange(6)]
+parity = encode_parity(data, NPARITY)
+points = dict(enumerate(data))
+points.update((parity_x(index), payload) for index, payload in enumerate(parity))
+for known in combinations(sorted(points), len(data)):
+    if recover(dict((x, points[x]) for x in known), len(data)) != data:
+        print "FAILED: recovery from oligos %r" % (known,)
+        failed = True
+        break
+if recover(dict((x, points[x]) for x in sorted(points)[:len(data) - 1]), len(data)) is not None:
+    print "FAILED: recovered with fewer than k payloads"
+    failed = True
+
+def read_consensus(orderfile, scheme):
+    """
+    Returns the oligos of an order as a get_consensus result
+    """
+    tfunc = get_translator(scheme)
+    taglen = schemes[scheme]['taglen']
+    chunksize = int(chunkers[scheme][2])
+    consensus = {}
+    with open(orderfile) as infile:
+        for line in infile:
+            payload = frame_payload(line.strip(), scheme)
+            tag = tfunc(payload[:taglen])
+            consensus.setdefault(tag[1:3], {})[tag[4:7]] = payload[taglen:taglen + chunksize]
+    return consensus
+
+tmpdir = tempfile.mkdtemp()
+try:
+    for scheme in ("codon", "binary"):
+        tfunc = get_translator(scheme)
+        order = os.path.join(tmpdir, scheme + ".txt")
+        build_order(profiles, order, scheme, parity=NPARITY)
+        manifest = read_manifest(order + MANIFEST_SUFFIX)
+        consensus = read_consensus(order, scheme)
+        dataoids = dict((pid, ["%03d" % x for x in xrange(k)])
+                        for pid, k in manifest['persons'].items())
+
+        # without the outer code, parity oligos are not part of the profile
+        condensed = condense(consensus, tfunc, os.path.join(tmpdir, scheme + "_plain"))
+        for pid, oids in dataoids.items():
+            if condensed.get(pid) != "".join(consensus[pid][oid] for oid in oids):
+                print "FAILED: %s condense of person %s kept more than its data oligos" % (scheme, pid)
+                failed = True
+
+        for pid, oids in dataoids.items():
+            for oid in rand.sample(oids, min(NPARITY, len(oids))):
+                del consensus[pid][oid]
+            consensus[pid]["%03d" % (len(oids) + 40)] = consensus[pid].values()[0]
+        metrics = PipelineMetrics()
+        recover_oligos(consensus, manifest, metrics)
+        for pid, oids in dataoids.items():
+            if sorted(consensus[pid]) != oids:
+                print "FAILED: %s person %s left oligos %r" % (scheme, pid, sorted(consensus[pid]))
+                failed = True
+        condensed = condense(consensus, tfunc, os.path.join(tmpdir, scheme + "_recovered"))
+        for pid, (name, text) in enumerate(profiles):
+            if not tfunc(condensed.get("%02d" % pid, "")).startswith(text):
+                print "FAILED: %s %s not rebuilt from recovered oligos" % (scheme, name)
+                failed = True
+
+        # one more missing oligo than there are parity oligos
+        consensus = read_consensus(order, scheme)
+        for oid in dataoids["02"][:NPARITY + 1]:
+            del consensus["02"][oid]
+        metrics = PipelineMetrics()
+        recover_oligos(consensus, manifest, metrics)
+        if metrics.rejected["outer code"] != {"unrecoverable": 1}:
+            print "FAILED: %s rejected %r" % (scheme, metrics.rejected["outer code"])
+            failed = True
+
+        # chunking selected records again merges them into the manifest
+        fasta = os.path.join(tmpdir, scheme + ".fasta")
+        encode = get_encoder(scheme)
+        with open(fasta, "w") as out:
+            for name, text in profiles:
+                out.write(">%s\n%s\n" % (name, encode(text)))
+        chunker, step, chunk, stuffer = chunkers[scheme]
+        outfile = os.path.join(tmpdir, scheme + "_chunked.txt")
+        command = [sys.executable, os.path.join(REPO, chunker), fasta, outfile,
+                   step, chunk, stuffer, "--parity", str(NPARITY)]
+        devnull = open(os.devnull, "w")
+        subprocess.check_call(command, stdout=devnull)
+        full = read_manifest(outfile + MANIFEST_SUFFIX)
+        subprocess.check_call(command + ["--records", "person1"], stdout=devnull)
+        devnull.close()
+        if read_manifest(outfile + MANIFEST_SUFFIX) != full or sorted(full['persons']) != ["00", "01", "02"]:
+            print "FAILED: %s manifest after --records is %r" % (
+                scheme, read_manifest(outfile + MANIFEST_SUFFIX)['persons'])
+            failed = True
+finally:
+    shutil.rmtree(tmpdir)
+
+if not failed:
+    print "Outer code recovered missing oligos and kept only the data oligos"
+sys.exit(1 if failed else 0)
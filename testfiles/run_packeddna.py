@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+"""
+Test script for the 2-bit packed DNA format
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Packs records of every length modulo 4, with and without characters
+other than ACGT, and reads them back by name, by position, by base range
+and in batches. Plain ACGT must take a quarter of a byte per base. Exits
+with status 1 if any check fails.
+
+$ python testfiles/run_packeddna.py
+"""
+
+import os, sys, random, shutil, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from packeddna import PackedDNAReader, write_packed, read_sequences, pack, unpack
+
+rand = random.Random(37)
+
+def bases(length):
+    return "".join(rand.choice("ACGT") for i in xrange(length))
+
+records = [("empty", ""), ("A", "A"), ("leadingA", "AAAAAAAC"), ("T", "TTTTTTTTT")]
+records += [("plain%d" % num, bases(num)) for num in xrange(1, 40)]
+records += [("masked", "NN" + bases(30) + "acgt" + bases(5) + "N-N"),
+            ("allN", "N" * 11),
+            ("long", bases(10000))]
+
+tmpdir = tempfile.mkdtemp()
+failed = False
+try:
+    path = os.path.join(tmpdir, "seqs.pdna")
+    write_packed(path, records)
+    with PackedDNAReader(path) as reader:
+        if reader.names() != [name for name, seq in records] or list(reader) != [seq for name, seq in records]:
+            print "FAILED: records read back in order do not match"
+            failed = True
+        for pos, (name, seq) in enumerate(records):
+            if reader[name] != seq or reader[pos] != seq:
+                print "FAILED: record %s fetched wrong" % name
+                failed = True
+            for start in xrange(0, min(len(seq), 9)):
+                for end in (start + 1, start + 5, len(seq) - 1, len(seq) + 3):
+                    if reader.fetch(name, start, end) != seq[start:end]:
+                        print "FAILED: bases %d to %d of %s fetched wrong" % (start, end, name)
+                        failed = True
+        names = [name for name, seq in records if name.startswith("plain")]
+        if reader.fetch_batch(names) != [seq for name, seq in records if name.startswith("plain")]:
+            print "FAILED: batch of plain records fetched wrong"
+            failed = True
+        if reader.fetch_batch(["masked", "long"]) != [records[-3][1], records[-1][1]]:
+            print "FAILED: batch with a masked record fetched wrong"
+            failed = True
+
+    seq = bases(4000)
+    if unpack(pack(seq), len(seq)) != seq or len(pack(seq)) != 1000:
+        print "FAILED: 4000 bases did not pack to 1000 bytes and back"
+        failed = True
+
+    plain = os.path.join(tmpdir, "seqs.txt")
+    with open(plain, "w") as out:
+        out.write("ACGT\nTTGA\n")
+    if list(read_sequences(plain)) != ["ACGT\n", "TTGA\n"]:
+        print "FAILED: plain DNA file not read line by line"
+        failed = True
+finally:
+    shutil.rmtree(tmpdir)
+
+if not failed:
+    print "Packed records, ranges and batches read back unchanged"
+
+sys.exit(1 if failed else 0)
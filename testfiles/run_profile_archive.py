@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""
+Test script for the indexed archive of decoded profiles
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Condenses the oligos of a few persons, one of them compressed, into a
+profiles.pdna archive and reads them back with ProfileArchive: the list
+of persons and oligos, whole profiles, ranges of oligos and the
+condensed DNA. Exits with status 1 if any check fails.
+
+$ python testfiles/run_profile_archive.py
+"""
+
+import os, sys, shutil, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from get_unique_oligos import condense
+from profile_archive import ProfileArchive, ARCHIVE_NAME
+from compression import Compressor
+from ASCIIcodons import TextToDNA, DNAToText
+
+OLIGOLEN = 19           # characters per oligo, 76 bases
+
+encode = TextToDNA().text_to_dna
+tfunc = DNAToText().dna_to_text
+
+dictionary = "likes long walks on the beach and "
+profiles = {"00": "Person 0 likes long walks and DNA storage, " * 3,
+            "01": "Short profile",
+            "02": Compressor("zlib", dictionary=dictionary).compress(
+                "Person 2 likes long walks on the beach and sunsets")}
+
+ramdict = {}
+for pid, text in profiles.items():
+    chunks = [text[i:i + OLIGOLEN] for i in xrange(0, len(text), OLIGOLEN)]
+    ramdict[pid] = dict(("%03d" % oid, encode(chunk)) for oid, chunk in enumerate(chunks))
+
+tmpdir = tempfile.mkdtemp()
+failed = False
+try:
+    condense(ramdict, tfunc, tmpdir, fmt="archive")
+    if os.listdir(tmpdir) != [ARCHIVE_NAME]:
+        print "FAILED: condense wrote %s" % ", ".join(os.listdir(tmpdir))
+        failed = True
+    with ProfileArchive(os.path.join(tmpdir, ARCHIVE_NAME), "codon", dictionary) as archive:
+        if archive.persons() != sorted(profiles):
+            print "FAILED: persons %s" % archive.persons()
+            failed = True
+        for pid in ("00", "01"):
+            text = profiles[pid]
+            if archive.oligos(pid) != range(len(ramdict[pid])):
+                print "FAILED: oligos of %s are %s" % (pid, archive.oligos(pid))
+                failed = True
+            if archive.text(pid) != text:
+                print "FAILED: profile %s read back as %r" % (pid, archive.text(pid))
+                failed = True
+            if archive.dna(pid) != encode(text):
+                print "FAILED: condensed DNA of %s differs" % pid
+                failed = True
+        if archive.text("00", 2, 4) != profiles["00"][2 * OLIGOLEN:5 * OLIGOLEN]:
+            print "FAILED: oligos 2 to 4 of 00 read back as %r" % archive.text("00", 2, 4)
+            failed = True
+        if archive.text("02") != "Person 2 likes long walks on the beach and sunsets":
+            print "FAILED: compressed profile read back as %r" % archive.text("02")
+            failed = True
+        try:
+            archive.dna("03")
+        except KeyError:
+            pass
+        else:
+            print "FAILED: a missing person did not raise KeyError"
+            failed = True
+finally:
+    shutil.rmtree(tmpdir)
+
+if not failed:
+    print "Archived profiles and oligo ranges read back"
+
+sys.exit(1 if failed else 0)
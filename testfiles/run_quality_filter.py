@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+"""
+Test script for the FASTQ quality filter
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Filters random reads, including reads with an empty quality string, with
+parse_fastq.quality_filter given as a list and as a generator, in batches
+that do and do not divide the number of reads. The reads passed on, the
+rejection counts by reason and the metrics must match a check of each
+read on its own. Exits with status 1 if any check fails.
+
+$ python testfiles/run_quality_filter.py
+"""
+
+import os, sys, random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parse_fastq import quality_filter, PHRED_OFFSET
+from pipeline_metrics import PipelineMetrics
+
+rand = random.Random(45)
+
+def random_read(num):
+    length = rand.choice([0, 1, 50, 150])
+    best = rand.randint(20, 40)
+    quals = [rand.randint(max(best - 25, 0), best) for i in xrange(length)]
+    seq = "".join(rand.choice("ACGT") for i in xrange(length))
+    return ("read%d" % num, seq, "".join(chr(q + PHRED_OFFSET) for q in quals))
+
+def expected(records, minmean, minqual):
+    """
+    Returns the kept records and rejection counts, checking one read at a time
+    """
+    kept, rejected = [], {}
+    for rec in records:
+        quals = [ord(char) - PHRED_OFFSET for char in rec[2]]
+        if minmean is not None and quals and sum(quals) < minmean * len(quals):
+            reason = "low mean quality"
+        elif minqual is not None and quals and min(quals) < minqual:
+            reason = "low base quality"
+        else:
+            kept.append(rec)
+            continue
+        rejected[reason] = rejected.get(reason, 0) + 1
+    return kept, rejected
+
+records = [random_read(num) for num in xrange(1000)]
+bases = sum(len(rec[1]) for rec in records)
+
+failed = False
+for minmean, minqual in [(None, None), (25, None), (None, 10), (15, 10), (30, 30)]:
+    kept, rejected = expected(records, minmean, minqual)
+    for source in ("list", "generator"):
+        for batchsize in (7, 1000, 5000):
+            label = "minmean %s minqual %s %s batch %d" % (minmean, minqual, source, batchsize)
+            metrics = PipelineMetrics()
+            reads = records if source == "list" else (rec for rec in records)
+            got = list(quality_filter(reads, minmean, minqual, metrics, batchsize))
+            if got != kept:
+                print "FAILED: %s kept %d reads, expected %d" % (label, len(got), len(kept))
+                failed = True
+                continue
+            stage = metrics.stages["quality filter"]
+            removed = metrics.stages["quality filter removed"]
+            removedbases = bases - sum(len(rec[1]) for rec in kept)
+            if metrics.rejected["quality filter"] != rejected:
+                print "FAILED: %s rejected %r, expected %r" % (
+                    label, metrics.rejected["quality filter"], rejected)
+                failed = True
+            if (stage['reads'], stage['bases']) != (len(records), bases) or \
+                    (removed['reads'], removed['bases']) != (len(records) - len(kept), removedbases):
+                print "FAILED: %s counted %r and removed %r" % (label, stage, removed)
+                failed = True
+
+if not failed:
+    print "Quality filter matched the per-read check for lists and generators"
+sys.exit(1 if failed else 0)
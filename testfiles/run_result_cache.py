@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+"""
+Test script for the content-addressed result cache
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Stores results under stage keys and checks that they are read back, that
+a changed input file or parameter misses, that a cached file stage is
+not run again and writes the same output, and that the least recently
+used results are evicted past the size limit. Exits with status 1 if any
+check fails.
+
+$ python testfiles/run_result_cache.py
+"""
+
+import os, sys, time, shutil, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from result_cache import ResultCache, stage_key, cached_file_stage
+
+tmpdir = tempfile.mkdtemp()
+failed = False
+try:
+    cache = ResultCache(os.path.join(tmpdir, "cache"))
+    infile = os.path.join(tmpdir, "reads.txt")
+    with open(infile, "w") as out:
+        out.write("ACGT\n")
+
+    sortkey = stage_key("sort", cache.digest(infile), "codon")
+    cache.put(sortkey, {"00": {"000": "ACGT"}})
+    if cache.get(sortkey) != (True, {"00": {"000": "ACGT"}}):
+        print "FAILED: stored result not read back"
+        failed = True
+    if cache.get(stage_key("consensus", sortkey, 100))[0]:
+        print "FAILED: a stage never stored was found"
+        failed = True
+    if stage_key("sort", cache.digest(infile), "binary") == sortkey:
+        print "FAILED: a new parameter gave the same key"
+        failed = True
+    time.sleep(0.01)
+    with open(infile, "a") as out:
+        out.write("TTGA\n")
+    if stage_key("sort", cache.digest(infile), "codon") == sortkey:
+        print "FAILED: a changed input gave the same key"
+        failed = True
+
+    runs = []
+    def upper(infile, outfile, suffix):
+        runs.append(infile)
+        with open(infile) as source:
+            with open(outfile, "w") as out:
+                out.write(source.read().upper() + suffix)
+        return len(runs)
+    outfile = os.path.join(tmpdir, "out.txt")
+    results = [cached_file_stage(cache, "upper", upper, infile, outfile, "!") for run in xrange(3)]
+    with open(outfile) as result:
+        output = result.read()
+    if results != [1, 1, 1] or len(runs) != 1 or output != "ACGT\nTTGA\n!":
+        print "FAILED: file stage ran %d times and wrote %r" % (len(runs), output)
+        failed = True
+
+    small = ResultCache(os.path.join(tmpdir, "small"), maxbytes=2500)
+    keys = [stage_key("block", num) for num in xrange(3)]
+    small.put(keys[0], "x" * 1000)
+    small.put(keys[1], "x" * 1000)
+    # modification times record use, keep them apart: 0 is used after 1
+    os.utime(small.path(keys[1]), (10, 10))
+    if not small.get(keys[0])[0]:
+        print "FAILED: result evicted below the size limit"
+        failed = True
+    os.utime(small.path(keys[0]), (20, 20))
+    small.put(keys[2], "x" * 1000)
+    kept = [os.path.exists(small.path(key)) for key in keys]
+    if kept != [True, False, True]:
+        print "FAILED: eviction kept %s, expected the least recently used to go" % kept
+        failed = True
+    if small.size() > 2500:
+        print "FAILED: cache of %d bytes is over its limit" % small.size()
+        failed = True
+finally:
+    shutil.rmtree(tmpdir)
+
+if not failed:
+    print "Cached results, file stages and eviction behaved"
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+"""
+Test script for the simulated MiSeq reads
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+Without errors, every simulated read must be its oligo with the adapters
+trimmed, or the reverse complement of that for reverse strand reads, and
+the same seed must give the same reads. With errors, the share of bases
+marked with the error quality must be close to the error rate, and
+substitution-only reads must keep their length. Exits with status 1 if
+any check fails.
+
+$ python testfiles/run_simulate_reads.py
+"""
+
+import os, sys, random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulate_reads import ReadSimulator, ADAPTLEN, TAILLEN, ERRQUAL
+from get_unique_oligos import rev_comp_batch
+
+rand = random.Random(31)
+orders = ["".join(rand.choice("ACGT") for i in xrange(200)) for num in xrange(50)]
+
+def parse(header):
+    """
+    Returns the oligo index and strand of a simulated read header
+    """
+    fields = dict(field.split("=") for field in header.split()[1:])
+    return int(fields["oligo"]), fields["strand"]
+
+failed = False
+
+clean = ReadSimulator(orders, 0.0, 0.0, 0.0, remnant=0.0, seed=1)
+reads = list(clean.reads(2000, batchsize=300))
+reverse = 0
+for header, seq, qual in reads:
+    idx, strand = parse(header)
+    expected = orders[idx][ADAPTLEN:-TAILLEN]
+    if strand == "-":
+        expected = rev_comp_batch([expected])[0]
+        reverse += 1
+    if seq != expected or qual != "I" * len(seq):
+        print "FAILED: error-free read %s does not match its oligo" % header
+        failed = True
+        break
+if len(reads) != 2000 or not 800 < reverse < 1200:
+    print "FAILED: %d reads, %d from the reverse strand" % (len(reads), reverse)
+    failed = True
+if list(ReadSimulator(orders, 0.0, 0.0, 0.0, remnant=0.0, seed=1).reads(2000, batchsize=300)) != reads:
+    print "FAILED: the same seed gave different reads"
+    failed = True
+
+for subrate, insrate, delrate in [(0.01, 0.0, 0.0), (0.005, 0.003, 0.002)]:
+    noisy = ReadSimulator(orders, subrate, insrate, delrate, remnant=0.0, duprate=0.0, seed=2)
+    readlen = len(orders[0]) - ADAPTLEN - TAILLEN
+    errors = 0
+    for header, seq, qual in noisy.reads(5000):
+        # deletions leave no base behind to mark
+        errors += qual.count(ERRQUAL)
+        if not insrate and not delrate and len(seq) != readlen:
+            print "FAILED: a substitution changed the read length"
+            failed = True
+            break
+    expected = (subrate + insrate) * readlen * 5000
+    if abs(errors - expected) > 0.1 * expected:
+        print "FAILED: %d bases marked as errors, expected about %d" % (errors, expected)
+        failed = True
+
+if not failed:
+    print "Simulated reads match their oligos and error rates"
+
+sys.exit(1 if failed else 0)
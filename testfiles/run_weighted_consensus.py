@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+"""
+Test script for the quality-weighted consensus at high read depth
+
+Released under the BSD 2-clause license. See LICENSE.
+http://opensource.org/licenses/BSD-2-Clause
+
+At a depth of 1000 reads, two Q40 reads with a miscalled tag make a
+spurious oligo that reaches the fixed minimum weight. get_consensus must
+drop it once the threshold scales with the depth, and keep every real
+oligo, including the least covered one. Exits with status 1 if any check
+fails.
+
+$ python testfiles/run_weighted_consensus.py
+"""
+
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from get_unique_oligos import (sort_oligos, get_consensus, MIN_WEIGHT,
+                               MIN_CONFIDENCE, MIN_DEPTH_SHARE)
+from ASCIIcodons import TextToDNA, DNAToText
+
+encode = TextToDNA().text_to_dna
+tfunc = DNAToText().dna_to_text
+
+def read(pid, oid, message, copies):
+    """
+    Returns copies of an error-free Q40 read of a tagged oligo
+    """
+    seq = encode("#%02d$%03d" % (pid, oid)) + encode(message)
+    return [("read", seq, "I" * len(seq))] * copies
+
+reads = []
+for oid in xrange(18):
+    # depth varies between oligos, the least covered has 300 reads
+    reads += read(0, oid, "chunk %02d of a profile" % oid, 300 + 50 * oid)
+reads += read(0, 18, "miscalled tag, not data", 2)
+
+failed = False
+
+fixed = get_consensus(sort_oligos(reads, tfunc, weighted=True), None,
+                      MIN_WEIGHT, MIN_CONFIDENCE)
+if "018" not in fixed["00"]:
+    print "Spurious oligo did not reach the fixed minimum weight, test is not exercised"
+    failed = True
+
+scaled = get_consensus(sort_oligos(reads, tfunc, weighted=True), None,
+                       MIN_WEIGHT, MIN_CONFIDENCE, MIN_DEPTH_SHARE)
+if "018" in scaled["00"]:
+    print "FAILED: spurious oligo 018 passed the depth-scaled threshold"
+    failed = True
+else:
+    print "Spurious oligo 018 dropped"
+missing = ["%03d" % oid for oid in xrange(18) if "%03d" % oid not in scaled["00"]]
+if missing:
+    print "FAILED: real oligos dropped: %s" % " ".join(missing)
+    failed = True
+else:
+    print "All 18 real oligos kept"
+
+sys.exit(1 if failed else 0)